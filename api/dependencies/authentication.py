@@ -1,4 +1,11 @@
 """Functions for authentication"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -16,6 +23,11 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 EMAIL_VERIFICATION_TOKEN_EXPIRE_HOURS = 24
 DRONE_TOKEN_EXPIRE_WEEKS = 420
 
+# bcrypt takes ~250 ms per hash, so it runs in worker processes instead of the event loop.
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+# hashes that are submitted to the workers at once, further requests wait for a free slot.
+PASSWORD_HASH_CONCURRENCY = int(os.getenv('PASSWORD_HASH_CONCURRENCY', str(2 * PASSWORD_HASH_WORKERS)))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
@@ -45,6 +57,134 @@ def get_password_hash(password):
     """
     return pwd_context.hash(password)
 
+
+class PasswordHasher:
+    """runs verify_password and get_password_hash on a bounded process pool.
+    The pool is started with the first hash and the number of submitted hashes is limited,
+    so a burst of logins queues here instead of blocking the event loop.
+
+    Args:
+        workers (int): number of worker processes.
+        concurrency (int): maximum number of hashes submitted to the pool at once.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, concurrency: int = PASSWORD_HASH_CONCURRENCY):
+        self.workers = workers
+        self.concurrency = concurrency
+        self._lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+        # the semaphore and the event loop it belongs to.
+        self._semaphore: tuple[asyncio.AbstractEventLoop, asyncio.Semaphore] | None = None
+        self._stats = {'hashes': 0, 'verifications': 0, 'failures': 0,
+                       'wait_time': 0.0, 'hash_time': 0.0, 'waiting': 0, 'in_flight': 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """the process pool, created on first use."""
+        with self._lock:
+            if self._executor is None:
+                # forked workers would inherit the threads, locks and pooled sqlite
+                # connections of the server, forkserver and spawn start a clean process.
+                method = ('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+                          else 'spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context(method))
+            return self._executor
+
+    def _get_semaphore(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        """the semaphore of the event loop, a new loop (e.g. a restart or a test) gets a new one."""
+        if self._semaphore is None or self._semaphore[0] is not loop:
+            self._semaphore = (loop, asyncio.Semaphore(self.concurrency))
+        return self._semaphore[1]
+
+    async def _run(self, func, *args):
+        """waits for a free slot and runs func on the process pool.
+
+        Args:
+            func (Callable): verify_password or get_password_hash.
+            *args: the arguments of func.
+
+        Returns:
+            the result of func.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._get_semaphore(loop)
+        started = time.monotonic()
+        self._stats['waiting'] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._stats['waiting'] -= 1
+
+        hash_started = time.monotonic()
+        self._stats['wait_time'] += hash_started - started
+        self._stats['in_flight'] += 1
+        try:
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        except BrokenProcessPool:
+            # a worker died, the next hash starts a new pool.
+            self._stats['failures'] += 1
+            with self._lock:
+                self._executor = None
+            raise
+        finally:
+            self._stats['in_flight'] -= 1
+            self._stats['hash_time'] += time.monotonic() - hash_started
+            semaphore.release()
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """awaitable version of verify_password.
+
+        Returns:
+            bool: see verify_password.
+        """
+        self._stats['verifications'] += 1
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        """awaitable version of get_password_hash.
+
+        Returns:
+            str: see get_password_hash.
+        """
+        self._stats['hashes'] += 1
+        return await self._run(get_password_hash, password)
+
+    def stats(self) -> dict:
+        """metrics of the hasher.
+
+        Returns:
+            dict: hashes, verifications and failures since the start, the summed wait and hash
+            times in seconds and the current number of waiting and running hashes.
+        """
+        return dict(self._stats)
+
+    def close(self) -> None:
+        """stops the worker processes, should be called on shutdown."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        self._semaphore = None
+
+
+password_hasher = PasswordHasher()
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """awaitable version of verify_password, runs on the process pool of password_hasher.
+
+    Returns:
+        bool: see verify_password.
+    """
+    return await password_hasher.verify(plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """awaitable version of get_password_hash, runs on the process pool of password_hasher.
+
+    Returns:
+        str: see get_password_hash.
+    """
+    return await password_hasher.hash(password)
+
 def create_access_token(data: dict, expires_delta: timedelta):
     """Creates an access token with an expiration time
 
@@ -3,6 +3,7 @@ import datetime
 from typing import List
 from enum import Enum
 from datetime import datetime
+import msgspec
 from pydantic import BaseModel
 
 class Token(BaseModel):
@@ -126,6 +127,28 @@ class DroneUpdate(BaseModel):
     flight_time: float | None = None
     zone_id :int| None = None
 
+class DroneUpdateItem(msgspec.Struct):
+    """ One update of a batch sent to /drones/send-updates/.
+    msgspec Struct, so big batches are decoded without pydantic validation per item."""
+    timestamp: datetime
+    lon: float
+    lat: float
+    flight_range: float | None = None
+    flight_time: float | None = None
+
+class RouteSimplification(BaseModel):
+    """Simplification of the routes of /drones/route/, every field is optional.
+    The route keeps its newest and oldest point.
+
+    Args:
+        bucket_seconds (int): keeps the newest point of every time bucket of this many seconds.
+        tolerance (float): Douglas-Peucker tolerance in degrees.
+        max_points (int): maximum number of points, the smallest tolerance that is sufficient is used.
+    """
+    bucket_seconds: int | None = None
+    tolerance: float | None = None
+    max_points: int | None = None
+
 class DroneUpdateWithRoute(DroneUpdate):
     """ DroneUpdate including its route.
 
@@ -161,6 +184,29 @@ class DroneEvent(BaseModel):
     csv_file_path :str| None = None
     zone_id :int| None = None
 
+class Detail(str, Enum):
+    """Level of detail of the geo_json of zones and territories.
+    full: stored geometry,
+    medium: simplified for district wide maps,
+    low: simplified for state wide maps."""
+    FULL = 'full'
+    MEDIUM = 'medium'
+    LOW = 'low'
+
+class ExportTable(str, Enum):
+    """Table that is exported by /drones/export/.
+    updates: telemetry of the drones,
+    events: smoke and fire events."""
+    UPDATES = 'updates'
+    EVENTS = 'events'
+
+class ExportFormat(str, Enum):
+    """File format of /drones/export/.
+    ndjson: one json object per line,
+    csv: comma separated values with a header line."""
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+
 class Zone(BaseModel):
     """ Zone class. Contains all the information about a zone. """
     id: int | None = None
@@ -213,3 +259,78 @@ class DroneForSimulation(BaseModel):
     direction: tuple[float,float] #vector with length 1
     lat: float
     lon: float
+
+
+# msgspec mirrors of the response classes of the list endpoints.
+# They have the same fields and defaults, but are neither validated nor converted,
+# see api.dependencies.responses.MsgspecResponse.
+# Timestamps are already formatted like FastAPI does, see database.row_decoding.to_isoformat.
+
+class DroneEventStruct(msgspec.Struct):
+    """msgspec mirror of DroneEvent."""
+    id :int | None = None
+    drone_id :int | None = None
+    timestamp :str | None = None
+    lon :float | None = None
+    lat :float | None = None
+    event_type: EventType | None = None
+    confidence: int | None = None
+    picture_path :str| None = None
+    csv_file_path :str| None = None
+    zone_id :int| None = None
+
+class DroneUpdateStruct(msgspec.Struct):
+    """msgspec mirror of DroneUpdate."""
+    id: int | None = None
+    drone_id :int | None = None
+    timestamp :str | None = None
+    lon :float | None = None
+    lat:float | None = None
+    flight_range: float | None = None
+    flight_time: float | None = None
+    zone_id :int| None = None
+
+class DroneUpdateWithRouteStruct(DroneUpdateStruct):
+    """msgspec mirror of DroneUpdateWithRoute."""
+    geojson : dict | None = None
+
+class IncidentStruct(msgspec.Struct):
+    """msgspec mirror of Incident."""
+    id:int | None = None
+    drone_name: str | None = None
+    location: str | None = None
+    alarm_type: str | None = None
+    notes: str | None = None
+    timestamp :str | None = None
+
+class ZoneStruct(msgspec.Struct):
+    """msgspec mirror of Zone."""
+    id: int | None = None
+    name: str | None = None
+    federal_state: str | None = None
+    district: str | None = None
+    events: List[DroneEventStruct] | None = None
+    dwd_fire_risk: FireRisk | None = None
+    ai_fire_risk: FireRisk | None = None
+    ai_fire_detection: FireRisk | None = None
+    ai_smoke_detection: FireRisk | None = None
+    geo_json: dict | None = None
+    lon :float | None = None
+    lat :float | None = None
+    drone_count: int | None = None
+    last_update: str | None = None
+
+class TerritoryWithZonesStruct(msgspec.Struct):
+    """msgspec mirror of TerritoryWithZones."""
+    id: int | None = None
+    name: str | None = None
+    orga_id :int | None = None
+    description: str | None = None
+    dwd_fire_risk: FireRisk | None = None
+    ai_fire_risk: FireRisk | None = None
+    drone_count: int | None = None
+    last_update: str | None = None
+    zone_count: int | None = None
+    geo_json: dict | None = None
+    lon : float | None = None
+    lat : float | None = None
@@ -2,11 +2,19 @@
 from datetime import datetime, timedelta
 from typing import List
 from fastapi import HTTPException, status
-from api.dependencies.classes import Drone, DroneEvent, DroneUpdate, DroneUpdateWithRoute
+from api.dependencies.classes import (Drone,
+                                     DroneEvent,
+                                     DroneEventStruct,
+                                     DroneUpdate,
+                                     DroneUpdateItem,
+                                     DroneUpdateWithRouteStruct,
+                                     RouteSimplification)
 from database import (drones_table,
                       drone_events_table,
-                      drone_updates_table as drone_data_table, zones_table)
-from database.territory_zones_table import get_orgazone_by_id
+                      drone_updates_table as drone_data_table,
+                      zones_table)
+from database.territory_zones_table import get_orgazone_by_id_async
+from database.zone_locator import zone_locator
 from .authentication import create_access_token, DRONE_TOKEN_EXPIRE_WEEKS, get_email_from_token
 
 
@@ -18,10 +26,10 @@ async def get_all_drones(orga_id:int):
     """
     drones = []
 
-    drones = drones_table.get_drones(orga_id)
+    drones = await drones_table.get_drones_async(orga_id)
 
     for drone in drones:
-        drone_upate = drone_data_table.get_latest_update(drone.id)
+        drone_upate = await drone_data_table.get_latest_update_async(drone.id)
         if drone_upate is not None:
             await set_update_and_zone(drone,drone_upate)
 
@@ -47,10 +55,10 @@ async def get_drone(drone_id: int,orga_id:int):
     Returns:
         Drone: the requestesd drone
     """
-    drone = drones_table.get_drone(drone_id,orga_id)
+    drone = await drones_table.get_drone_async(drone_id,orga_id)
     if drone is None:
         return None
-    drone_upate = drone_data_table.get_latest_update(drone_id)
+    drone_upate = await drone_data_table.get_latest_update_async(drone_id)
     if drone_upate:
         await set_update_and_zone(drone,drone_upate)
 
@@ -63,10 +71,10 @@ async def get_drone_by_id(drone_id: int):
         Drone: the requestesd drone
     """
 
-    drone = drones_table.get_drone_id(drone_id)
+    drone = await drones_table.get_drone_id_async(drone_id)
     if drone is None:
         return None
-    drone_upate = drone_data_table.get_latest_update(drone.id)
+    drone_upate = await drone_data_table.get_latest_update_async(drone.id)
     if drone_upate:
         await set_update_and_zone(drone,drone_upate)
 
@@ -133,10 +141,100 @@ async def get_drone_events(orga_id:int,
         None: if no drone events are found.
     """
 
-    return drone_events_table.get_drone_event(zone_id=zone_id,org_id=orga_id, drone_id=drone_id,after=timestamp)
+    return await drone_events_table.get_drone_event_async(zone_id=zone_id,
+                                                          org_id=orga_id,
+                                                          drone_id=drone_id,
+                                                          after=timestamp)
 
+async def get_drone_events_page(orga_id:int,
+                                timestamp: datetime,
+                                limit:int,
+                                before_key:tuple[str, int] = None,
+                                drone_id:int =None,
+                                zone_id:int=None) -> tuple[List[DroneEventStruct] | None,
+                                                           tuple[str, int] | None]:
+    """get one page of the drone events in a zone or the whole orga area after a timestamp.
+
+    Args:
+        orga_id (int): id of the orga.
+        timestamp (datetime): timestamp after which the events should be returned.
+        limit (int): maximum number of events.
+        before_key (tuple[str, int], optional): key of the previous page, see decode_cursor.
+        Defaults to None.
+        drone_id (int, optional): id of the drone. Defaults to None.
+        zone_id (int, optional): id of the zone. Defaults to None.
+
+    Returns:
+        tuple[List[DroneEventStruct] | None, tuple[str, int] | None]: the events
+        and the key of the next page.
+    """
+    return await drone_events_table.get_drone_event_page_async(zone_id=zone_id,
+                                                               org_id=orga_id,
+                                                               drone_id=drone_id,
+                                                               after=timestamp,
+                                                               as_struct=True,
+                                                               limit=limit,
+                                                               before_key=before_key)
 
 
+
+def is_valid_position(lon: float, lat: float) -> bool:
+    """checks that the coordinate is a valid WGS 84 position.
+
+    Args:
+        lon (float): longitude.
+        lat (float): latitude.
+
+    Returns:
+        bool: True if the position can be stored.
+    """
+    return -180 <= lon <= 180 and -90 <= lat <= 90
+
+def is_valid_update(update: DroneUpdateItem) -> bool:
+    """checks that the coordinate of an update is a valid WGS 84 position.
+
+    Args:
+        update (DroneUpdateItem): the update.
+
+    Returns:
+        bool: True if the update can be stored.
+    """
+    return is_valid_position(update.lon, update.lat)
+
+async def store_drone_updates(drone_id: int, updates: List[DroneUpdateItem]) -> List[dict]:
+    """stores a batch of updates of one drone in one transaction
+    and sets the last_update of every affected zone once, to its newest timestamp.
+
+    Args:
+        drone_id (int): id of the drone.
+        updates (List[DroneUpdateItem]): the updates in the order they were sent.
+
+    Returns:
+        List[dict]: status per update, 'stored', 'invalid' or 'error',
+        and the zone id of stored updates.
+    """
+    results = [{'status': 'invalid', 'zone_id': None} for _ in updates]
+    valid_indices = [index for index, update in enumerate(updates) if is_valid_update(update)]
+    to_db = [(updates[index].timestamp,
+              updates[index].lon,
+              updates[index].lat,
+              updates[index].flight_range,
+              updates[index].flight_time) for index in valid_indices]
+
+    zone_ids = await drone_data_table.create_drone_updates_async(drone_id, to_db)
+    if zone_ids is None:
+        for index in valid_indices:
+            results[index]['status'] = 'error'
+        return results
+
+    for index, zone_id in zip(valid_indices, zone_ids):
+        results[index]['status'] = 'stored'
+        results[index]['zone_id'] = zone_id
+
+    last_updates = zones_table.get_last_updates([update[0] for update in to_db], zone_ids)
+    await zones_table.set_update_for_zones_async(last_updates)
+    return results
+
 async def set_update_and_zone(drone:Drone,drone_upate:DroneUpdate):
     """gets the id of the zone, the drone is in.
 
@@ -145,37 +243,75 @@ async def set_update_and_zone(drone:Drone,drone_upate:DroneUpdate):
         drone_upate (DroneUpdate): _description_
     """
     drone.last_update = drone_upate.timestamp
-    current_zone = zones_table.get_zone_of_coordinate(
-                                drone_upate.lon,
-                                drone_upate.lat)
-    if current_zone is not None:
-        drone.zone_id = current_zone.id
-
-async def get_drone_with_route( orga_id:int,
-                                timestamp:datetime,
-                                drone_id:int =None,
-                                zone_id:int=None,
-                                )-> List[DroneUpdateWithRoute] | None:
-    """get all drone updates in a zone or the whole orga area after a timestamp.
+    drone.zone_id = await zone_locator.locate_async(drone_upate.lon, drone_upate.lat)
+
+async def get_drone_route_page(orga_id:int,
+                               timestamp:datetime,
+                               limit:int,
+                               before_key:tuple[str, int] = None,
+                               drone_id:int =None,
+                               zone_id:int=None,
+                               simplification:RouteSimplification=None
+                               )-> tuple[List[DroneUpdateWithRouteStruct] | None,
+                                         tuple[str, int] | None]:
+    """get the routes of one page of drone updates in a zone or the whole orga area
+    after a timestamp. A route that continues on the next page is split between the pages.
 
     Args:
         orga_id (int): id of the orga.
-        timestamp (datetime): timestamp after which the events should be returned.
+        timestamp (datetime): timestamp after which the updates should be returned.
+        limit (int): maximum number of updates.
+        before_key (tuple[str, int], optional): key of the previous page, see decode_cursor.
+        Defaults to None.
         drone_id (int, optional): id of the drone. Defaults to None.
         zone_id (int, optional): id of the zone. Defaults to None.
+        simplification (RouteSimplification, optional): simplifies the routes,
+        see get_route_simplification. Defaults to None.
+
+    Returns:
+        tuple[List[DroneUpdateWithRouteStruct] | None, tuple[str, int] | None]: one route per drone
+        and the key of the next page.
+    """
+    return await drone_data_table.get_drone_updates_page_async(drone_id=drone_id,
+                                                               orga_id=orga_id,
+                                                               zone_id=zone_id,
+                                                               after=timestamp,
+                                                               get_coords_only=True,
+                                                               as_struct=True,
+                                                               limit=limit,
+                                                               before_key=before_key,
+                                                               simplification=simplification)
+
+def get_route_simplification(max_points:int = None,
+                             tolerance:float = None,
+                             bucket_seconds:int = None) -> RouteSimplification | None:
+    """checks the requested simplification of the routes.
+
+    Args:
+        max_points (int, optional): maximum number of points per route. Defaults to None.
+        tolerance (float, optional): Douglas-Peucker tolerance in degrees. Defaults to None.
+        bucket_seconds (int, optional): one point per bucket of this many seconds. Defaults to None.
 
     Raises:
-        HTTPException: if the zone id is invalid.
+        HTTPException: if a value is out of range.
 
     Returns:
-        DroneUpdateWithRoute | None: list of drone updates filtered by the given parameters.
+        RouteSimplification | None: None if the routes shouldnt be simplified.
     """
+    if max_points is None and tolerance is None and bucket_seconds is None:
+        return None
+
+    # each requested value against its minimum.
+    for value, minimum in ((max_points, 2), (tolerance, 0), (bucket_seconds, 1)):
+        if value is not None and value < minimum:
+            raise HTTPException(
+                status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                detail="max_points must be at least 2, tolerance at least 0 and bucket_seconds at least 1.",
+            )
 
-    return drone_data_table.get_drone_updates(drone_id=drone_id,
-                                              orga_id=orga_id,
-                                              zone_id=zone_id,
-                                              after=timestamp,
-                                              get_coords_only=True)
+    return RouteSimplification(max_points=max_points,
+                               tolerance=tolerance,
+                               bucket_seconds=bucket_seconds)
 
 async def get_drone_count(zone_id:int,orga_id:int):
     """Returns the amount of drones
@@ -184,7 +320,7 @@ async def get_drone_count(zone_id:int,orga_id:int):
         int: amount of drones
     """
 
-    zone = get_orgazone_by_id(zone_id,orga_id)
+    zone = await get_orgazone_by_id_async(zone_id,orga_id)
     if zone is not None:
         return zone.drone_count
 
@@ -0,0 +1,166 @@
+"""Streaming exports of drone updates and events.
+
+The rows are read batch by batch with fetchmany (see database.database.fetch_batches)
+and every batch is encoded to NDJSON or CSV and sent, before the next one is read.
+So the memory of an export doesnt depend on the number of exported rows.
+An export keeps its pooled connection until it is done, so at most EXPORT_CONCURRENCY
+exports run at once and the others wait, the remaining connections stay free for the api.
+"""
+import asyncio
+import csv
+import io
+import os
+import weakref
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List
+import msgspec
+from fastapi.responses import StreamingResponse
+from api.dependencies.classes import ExportFormat, ExportTable
+from database import drone_events_table, drone_updates_table
+import database.database as db
+from database.row_decoding import to_timezone
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: 'application/x-ndjson',
+    ExportFormat.CSV: 'text/csv',
+}
+
+# index of the timestamp in the exported rows, see EXPORT_COLUMNS of the table modules.
+TIMESTAMP_INDEX = 2
+
+# at least one connection of the pool is never used by exports.
+EXPORT_CONCURRENCY = max(1, min(int(os.getenv('EXPORT_CONCURRENCY', '2')), db.POOL_SIZE - 1))
+
+# semaphore per event loop, see get_export_semaphore.
+export_semaphores: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = \
+    weakref.WeakKeyDictionary()
+
+
+def convert_rows(rows: List[tuple]) -> List[tuple]:
+    """converts the timestamps of the rows to TIMEZONE, like the api does.
+
+    Args:
+        rows (List[tuple]): fetched rows.
+
+    Returns:
+        List[tuple]: the rows with timezone aware timestamps.
+    """
+    converted = []
+    for row in rows:
+        timestamp = row[TIMESTAMP_INDEX]
+        if isinstance(timestamp, (datetime, int)):
+            row = (*row[:TIMESTAMP_INDEX],
+                   to_timezone(timestamp),
+                   *row[TIMESTAMP_INDEX + 1:])
+        converted.append(row)
+    return converted
+
+def encode_ndjson(columns: List[str], batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """encodes every batch to one chunk of NDJSON.
+
+    Args:
+        columns (List[str]): names of the columns, the keys of the json objects.
+        batches (Iterator[List[tuple]]): batches of rows.
+
+    Yields:
+        bytes: one json object per row and line.
+    """
+    encoder = msgspec.json.Encoder()
+    for rows in batches:
+        yield encoder.encode_lines([dict(zip(columns, row)) for row in convert_rows(rows)])
+
+def encode_csv(columns: List[str], batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """encodes every batch to one chunk of CSV, the first chunk is the header.
+
+    Args:
+        columns (List[str]): names of the columns.
+        batches (Iterator[List[tuple]]): batches of rows.
+
+    Yields:
+        bytes: the header line, then the lines of one batch.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(
+            [(*row[:TIMESTAMP_INDEX], row[TIMESTAMP_INDEX].isoformat(), *row[TIMESTAMP_INDEX + 1:])
+             if isinstance(row[TIMESTAMP_INDEX], datetime) else row
+             for row in convert_rows(rows)])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell() > 0:
+        # no rows, only the header.
+        yield buffer.getvalue().encode('utf-8')
+
+def get_export_semaphore() -> asyncio.Semaphore:
+    """the semaphore of the running event loop, a new loop (e.g. a restart or a test) gets a new one.
+
+    Returns:
+        asyncio.Semaphore: limits the running exports to EXPORT_CONCURRENCY.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = export_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(EXPORT_CONCURRENCY)
+        export_semaphores[loop] = semaphore
+    return semaphore
+
+async def iterate_async(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """awaitable version of the iterator, every chunk is read on the database executor.
+    Waits for a free export slot before the first chunk checks out a database connection.
+    The iterator is closed at the end or if the client disconnects,
+    which returns its database connection to the pool.
+
+    Args:
+        chunks (Iterator[bytes]): the encoded chunks.
+
+    Yields:
+        bytes: the next chunk.
+    """
+    async with get_export_semaphore():
+        try:
+            while True:
+                chunk = await db.run_async(next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            await db.run_async(chunks.close)
+
+def export_drone_data(orga_id: int,
+                      table: ExportTable,
+                      export_format: ExportFormat,
+                      drone_id: int = None,
+                      after: datetime = None,
+                      before: datetime = None) -> StreamingResponse:
+    """creates the streaming response of an export.
+
+    Args:
+        orga_id (int): id of the organization.
+        table (ExportTable): updates or events.
+        export_format (ExportFormat): ndjson or csv.
+        drone_id (int, optional): id of the drone. Defaults to None, all drones.
+        after (datetime, optional): exports everything after this date (not included)
+        before (datetime, optional): exports everything before this date (not included)
+
+    Returns:
+        StreamingResponse: the export, newest rows first.
+    """
+    if table == ExportTable.EVENTS:
+        columns = drone_events_table.EXPORT_COLUMNS
+        batches = drone_events_table.export_drone_events(orga_id, drone_id, after, before)
+    else:
+        columns = drone_updates_table.EXPORT_COLUMNS
+        batches = drone_updates_table.export_drone_updates(orga_id, drone_id, after, before)
+
+    if export_format == ExportFormat.CSV:
+        chunks = encode_csv(columns, batches)
+    else:
+        chunks = encode_ndjson(columns, batches)
+
+    filename = f'drone_{table.value}.{export_format.value}'
+    return StreamingResponse(iterate_async(chunks),
+                             media_type=MEDIA_TYPES[export_format],
+                             headers={'Content-Disposition': f'attachment; filename="{filename}"'})
@@ -0,0 +1,193 @@
+"""Write-behind buffer for drone updates.
+
+If INGEST_BUFFER is 'True', /drones/send-update/ only queues the update and returns.
+A background task writes the queued updates in group commits,
+every INGEST_BATCH_SIZE updates or after INGEST_FLUSH_MS milliseconds,
+and sets the last_update of every affected zone once per commit.
+The queue holds at most INGEST_QUEUE_SIZE updates, if it is full the requests wait.
+Updates are checked before they are queued. If a group commit fails, e.g. because of an
+unknown drone_id, its updates are written one by one, so only the broken updates are lost.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+from api.dependencies.drones import is_valid_position
+from database import drone_updates_table, zones_table
+
+INGEST_BUFFER = os.getenv('INGEST_BUFFER', 'False') == 'True'
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '1000'))
+INGEST_FLUSH_MS = float(os.getenv('INGEST_FLUSH_MS', '50'))
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', '50000'))
+
+
+class IngestBuffer:
+    """bounded queue of drone updates with a background writer.
+
+    Args:
+        batch_size (int): maximum number of updates per commit.
+        flush_ms (float): maximum time in milliseconds an update waits for its commit.
+        queue_size (int): maximum number of queued updates.
+    """
+
+    def __init__(self,
+                 batch_size: int = INGEST_BATCH_SIZE,
+                 flush_ms: float = INGEST_FLUSH_MS,
+                 queue_size: int = INGEST_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.queue_size = queue_size
+        self._queue: asyncio.Queue | None = None
+        self._writer: asyncio.Task | None = None
+        self._stats = {
+            'queued': 0,
+            'invalid': 0,
+            'written': 0,
+            'failed': 0,
+            'commits': 0,
+            'commit_time': 0.0,
+            'max_commit_time': 0.0,
+            'max_queue_depth': 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        """wether the background writer is running."""
+        return self._writer is not None and not self._writer.done()
+
+    async def start(self) -> None:
+        """creates the queue and starts the background writer."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._writer = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """writes all queued updates and stops the background writer."""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._writer
+        self._writer = None
+
+    async def put(self,
+                  drone_id: int,
+                  timestamp: datetime,
+                  lon: float,
+                  lat: float,
+                  flight_range: float | None,
+                  flight_time: float | None) -> bool:
+        """checks and queues an update. Waits while the queue is full.
+        The timestamp is stored in naive UTC like on the direct path, see drone_updates_table.create_drone_update_rows.
+
+        Args:
+            drone_id (int): id of the drone.
+            timestamp (datetime): timestamp of the update.
+            lon (float): longitude of the update's location.
+            lat (float): latitude of the update's location.
+            flight_range (float | None): flight range left in [km].
+            flight_time (float | None): flight time left in [minutes].
+
+        Returns:
+            bool: False if the update is invalid and wasnt queued.
+        """
+        if not isinstance(timestamp, datetime) or not is_valid_position(lon, lat):
+            self._stats['invalid'] += 1
+            return False
+        await self._queue.put((drone_id, timestamp, lon, lat, flight_range, flight_time))
+        self._stats['queued'] += 1
+        depth = self._queue.qsize()
+        if depth > self._stats['max_queue_depth']:
+            self._stats['max_queue_depth'] = depth
+        return True
+
+    def stats(self) -> dict:
+        """metrics of the buffer.
+
+        Returns:
+            dict: current queue depth and the counters since the start,
+            commit times are in milliseconds.
+        """
+        stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize() if self._queue is not None else 0
+        stats['avg_commit_time'] = (stats['commit_time'] / stats['commits']
+                                    if stats['commits'] > 0 else 0.0)
+        return stats
+
+    async def _run(self) -> None:
+        """collects batches from the queue and writes them, until None is queued."""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.flush_ms / 1000
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                await self._write(batch)
+            except Exception as exception: # pylint: disable=broad-exception-caught
+                # the writer has to keep running, otherwise the queued updates are lost.
+                print(f'ingest batch of {len(batch)} updates failed: {exception}')
+                self._stats['failed'] += len(batch)
+
+    async def _write(self, batch: list[tuple]) -> None:
+        """stores the batch in one transaction and sets the last_update of the affected zones.
+        If the transaction fails, the updates are stored one by one.
+
+        Args:
+            batch (list[tuple]): the queued updates.
+        """
+        started = time.monotonic()
+        zone_ids = await drone_updates_table.create_drone_update_rows_async(batch)
+        if zone_ids is None:
+            batch, zone_ids = await self._write_rows(batch)
+
+        last_updates = zones_table.get_last_updates([update[1] for update in batch], zone_ids)
+        await zones_table.set_update_for_zones_async(last_updates)
+
+        commit_time = (time.monotonic() - started) * 1000
+        self._stats['written'] += len(batch)
+        self._stats['commits'] += 1
+        self._stats['commit_time'] += commit_time
+        if commit_time > self._stats['max_commit_time']:
+            self._stats['max_commit_time'] = commit_time
+
+    async def _write_rows(self, batch: list[tuple]) -> tuple[list[tuple], list[int | None]]:
+        """stores the updates of a failed batch one by one.
+
+        Args:
+            batch (list[tuple]): the queued updates.
+
+        Returns:
+            tuple[list[tuple], list[int | None]]: the stored updates and their zone ids.
+        """
+        stored, zone_ids = [], []
+        for update in batch:
+            row_zone_ids = await drone_updates_table.create_drone_update_rows_async([update])
+            if row_zone_ids is None:
+                self._stats['failed'] += 1
+                continue
+            stored.append(update)
+            zone_ids.extend(row_zone_ids)
+        return stored, zone_ids
+
+
+ingest_buffer = IngestBuffer()
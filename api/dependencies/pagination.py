@@ -0,0 +1,88 @@
+"""Keyset pagination of list endpoints.
+
+A page is ordered newest first by (timestamp, id). If more rows exist, the response has the header
+X-Next-Cursor, its value is passed as cursor to get the next page.
+The cursor is an opaque token of the (timestamp, id) key of the last row of the page.
+"""
+import base64
+import binascii
+import os
+import msgspec
+from fastapi import HTTPException, status
+
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', '500'))
+PAGE_SIZE_MAX = int(os.getenv('PAGE_SIZE_MAX', '5000'))
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def get_page_size(limit: int | None) -> int:
+    """checks the requested page size.
+
+    Args:
+        limit (int | None): requested number of rows, None for the default PAGE_SIZE.
+
+    Raises:
+        HTTPException: if the limit is not between 1 and PAGE_SIZE_MAX.
+
+    Returns:
+        int: the page size.
+    """
+    if limit is None:
+        return PAGE_SIZE
+    if limit < 1 or limit > PAGE_SIZE_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=f"limit must be between 1 and {PAGE_SIZE_MAX}",
+        )
+    return limit
+
+def encode_cursor(key: tuple[str, int] | None) -> str | None:
+    """creates the cursor of the next page.
+
+    Args:
+        key (tuple[str, int] | None): (timestamp, id) key of the last row of the page.
+
+    Returns:
+        str | None: the cursor, None if there is no next page.
+    """
+    if key is None:
+        return None
+    return base64.urlsafe_b64encode(msgspec.json.encode(key)).decode('ascii')
+
+def decode_cursor(cursor: str | None) -> tuple[str, int] | None:
+    """reads the key from a cursor.
+
+    Args:
+        cursor (str | None): the cursor from X-Next-Cursor, None for the first page.
+
+    Raises:
+        HTTPException: if the cursor is invalid.
+
+    Returns:
+        tuple[str, int] | None: (timestamp, id) key of the last row of the previous page.
+    """
+    if cursor is None:
+        return None
+    try:
+        return msgspec.json.decode(base64.urlsafe_b64decode(cursor.encode('ascii')),
+                                   type=tuple[str, int])
+    except (binascii.Error, UnicodeEncodeError, ValueError, msgspec.DecodeError) as exception:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Invalid cursor",
+        ) from exception
+
+def get_page_headers(key: tuple[str, int] | None) -> dict[str, str] | None:
+    """headers of a page.
+
+    Args:
+        key (tuple[str, int] | None): key of the next page, see encode_cursor.
+
+    Returns:
+        dict[str, str] | None: X-Next-Cursor if there is a next page.
+    """
+    cursor = encode_cursor(key)
+    if cursor is None:
+        return None
+    return {NEXT_CURSOR_HEADER: cursor}
@@ -0,0 +1,17 @@
+"""Response classes of the api."""
+from typing import Any
+import msgspec
+from fastapi.responses import JSONResponse
+
+
+class MsgspecResponse(JSONResponse):
+    """JSON response, that is encoded by msgspec.
+    Returned by the list endpoints together with the msgspec mirrors of the response classes
+    (ZoneStruct, DroneEventStruct, ...), so FastAPI neither validates nor converts the content.
+    The response_model of the endpoint is only used for the OpenAPI schema.
+    Timestamps have to be strings already, msgspec would write UTC as 'Z' instead of '+00:00',
+    see database.row_decoding.to_isoformat.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return msgspec.json.encode(content)
@@ -1,33 +1,40 @@
 """File containing all the dependencies for the territories."""
 
 from typing import List
-from api.dependencies.classes import TerritoryWithZones
+from api.dependencies.classes import Detail, TerritoryWithZones
 from database import territories_table
 
 
-async def get_territories(orga_id) -> List[TerritoryWithZones]:
+async def get_territories(orga_id,
+                          detail: Detail = Detail.FULL,
+                          as_struct: bool = False) -> List[TerritoryWithZones]:
     """get all territories linked to an organization.
 
     Args:
         orga_id (int): id of the organization.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to Detail.FULL.
+        as_struct (bool, optional): return the msgspec mirrors, see MsgspecResponse. Defaults to False.
 
     Returns:
         list: list of all territories.
     """
 
-    return territories_table.get_territories(orga_id)
+    return await territories_table.get_territories_async(orga_id, detail, as_struct)
 
-async def get_territory_by_id(territory_id:int, orga_id:int) -> TerritoryWithZones | None:
+async def get_territory_by_id(territory_id:int,
+                              orga_id:int,
+                              detail: Detail = Detail.FULL) -> TerritoryWithZones | None:
     """get a territory by id. The territory has to be linked to the orga.
 
     Args:
         territory_id (int): the id of the territory to fetch.
         orga_id (int): id of the organization that the territory belongs to.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to Detail.FULL.
 
     Returns:
         Territory: the territory object.
     """
-    territory = territories_table.get_territory(territory_id)
+    territory = await territories_table.get_territory_async(territory_id, detail)
     if territory is None or territory.orga_id != orga_id:
         return None
     return territory
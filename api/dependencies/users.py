@@ -11,7 +11,7 @@ from validation import (validate_email,
                         validate_password,
                         validate_permission)
 from .classes import DroneEvent, Permission, User, UserWithSensitiveInfo, Alert
-from .authentication import get_password_hash, oauth2_scheme, verify_password, get_email_from_token
+from .authentication import get_password_hash_async, oauth2_scheme, verify_password_async, get_email_from_token
 
 def get_user(email: str) -> UserWithSensitiveInfo | None:
     """Creates a user object from the information in the db
@@ -51,8 +51,9 @@ def get_user_by_id(user_id: int) -> UserWithSensitiveInfo | None:
 
     return users_table.get_user_by_id(user_id)
 
-def authenticate_user(email: str, password: str):
-    """Returns user object if the given password matches the users password
+async def authenticate_user(email: str, password: str):
+    """Returns user object if the given password matches the users password.
+    The password is verified on the process pool of authentication.password_hasher.
 
     Args:
         email (str): Email of the user
@@ -62,8 +63,8 @@ def authenticate_user(email: str, password: str):
         User: Authenticated user
         None: If user does not exists or the passowrd is wrong
     """
-    user = get_user(email)
-    if user is not None and verify_password(password, user.hashed_password):
+    user = await users_table.get_user_async(email)
+    if user is not None and await verify_password_async(password, user.hashed_password):
         return user
     return None
 
@@ -96,7 +97,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserWithSensi
     #     detail="Email is not verified",
     # )
     email = await get_email_from_token(token)
-    user = get_user(email)
+    # cached for USER_CACHE_SECONDS, changes of the user invalidate it, see users_table.UserCache.
+    user = await users_table.user_cache.get_user_async(email)
     if user is None:
         raise credentials_exception
     if user.disabled:
@@ -185,14 +187,14 @@ async def update_user(user_to_update:User,
     errors = []
     update_sql_dictr = {}
     if email and email != user_to_update.email:
-        if get_user(email):
+        if await users_table.get_user_async(email):
             errors.extend("This email is already assosiated with an existing account")
         else:
             errors.extend(validate_email(email))
             update_sql_dictr[users_table.UsrAttributes.EMAIL] = email
     if password:
         errors.extend(validate_password(password))
-        hashed_pw = get_password_hash(password)
+        hashed_pw = await get_password_hash_async(password)
         update_sql_dictr[users_table.UsrAttributes.PASSWORD] = hashed_pw
     if first_name and first_name != user_to_update.first_name:
         errors.extend(validate_first_name(first_name))
@@ -202,7 +204,7 @@ async def update_user(user_to_update:User,
         update_sql_dictr[users_table.UsrAttributes.LAST_NAME] = last_name
     if organization_name and organization_name != user_to_update.organization.name:
         errors.extend(validate_organization(organization_name))
-        organization_obj = organizations_table.get_orga(organization_name)
+        organization_obj = await organizations_table.get_orga_async(organization_name)
         if not organization_obj:
             errors.append('orga doesnt exist.')
         else:
@@ -234,7 +236,7 @@ async def update_user(user_to_update:User,
         valarr.append(value)
     set_sql = set_sql[:-1]
 
-    success = users_table.update_user_withsql(user_to_update.id,set_sql,valarr)
+    success = await users_table.update_user_withsql_async(user_to_update.id,set_sql,valarr)
 
     if not success:
         raise HTTPException(
@@ -1,16 +1,42 @@
 """functions for api zones."""
 from database import territory_zones_table
+from .classes import Detail
 
-async def get_all_zones(orga_id:int):
+# lowest zoom level of the web map that gets the geometries in this detail.
+ZOOM_FULL = 13
+ZOOM_MEDIUM = 10
+
+def detail_from_zoom(detail: Detail | None = None, zoom: int | None = None) -> Detail:
+    """level of detail for the geometries of a map request.
+    An explicit detail wins over the zoom level, without both the full geometry is returned.
+
+    Args:
+        detail (Detail | None, optional): requested level of detail. Defaults to None.
+        zoom (int | None, optional): zoom level of the web map. Defaults to None.
+
+    Returns:
+        Detail: the level of detail.
+    """
+    if detail is not None:
+        return detail
+    if zoom is None or zoom >= ZOOM_FULL:
+        return Detail.FULL
+    if zoom >= ZOOM_MEDIUM:
+        return Detail.MEDIUM
+    return Detail.LOW
+
+async def get_all_zones(orga_id:int, detail:Detail = Detail.FULL, as_struct:bool = False):
     """Returns all zones from the db
 
     Args:
         orga_id (int): _description_
+        detail (Detail, optional): level of detail of the geo_json. Defaults to Detail.FULL.
+        as_struct (bool, optional): return the msgspec mirrors, see MsgspecResponse. Defaults to False.
 
     Returns:
         Zone[]: List of zones
     """
-    return territory_zones_table.get_zones_by_orga(orga_id)
+    return await territory_zones_table.get_zones_by_orga_async(orga_id, detail, as_struct)
 
 
 async def get_zone_by_name(name: str, orga_id:int):
@@ -24,19 +50,20 @@ async def get_zone_by_name(name: str, orga_id:int):
         Zone | None: zone object.
     """
 
-    return territory_zones_table.get_orgazones_by_name(name,orga_id)
+    return await territory_zones_table.get_orgazones_by_name_async(name,orga_id)
 
-async def get_zone_by_id(zone_id: int, orga_id:int):
+async def get_zone_by_id(zone_id: int, orga_id:int, detail:Detail = Detail.FULL):
     """Returns a specific zone from the db
 
     Args:
         zone_id (_type_): id of the zone.
         orga_id (_type_): id of the orga that want to access this zones data.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to Detail.FULL.
 
     Returns:
         Zone | None: zone object.
     """
-    return territory_zones_table.get_orgazone_by_id(zone_id,orga_id)
+    return await territory_zones_table.get_orgazone_by_id_async(zone_id,orga_id,detail)
 
 async def get_zone_count(orga_id:int):
     """Returns the amount of zones of this organization.
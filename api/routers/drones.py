@@ -2,20 +2,28 @@
 import os
 from datetime import datetime
 from typing import List
-from fastapi import Depends, APIRouter, HTTPException, status, UploadFile, File
-from fastapi.responses import FileResponse
-from database.drones_table import create_drone
-from database.drone_updates_table import create_drone_update
-from database.drone_events_table import create_drone_event_entry, get_event_by_id
-from database.zones_table import set_update_for_coordinate
+import msgspec
+from fastapi import Depends, APIRouter, HTTPException, Request, status, UploadFile, File
+from fastapi.responses import FileResponse, StreamingResponse
+from database.drones_table import create_drone_async
+from database.drone_updates_table import create_drone_update_async
+from database.drone_events_table import create_drone_event_entry_async, get_event_by_id_async
+from database.zones_table import set_update_for_coordinate_async
 from .users import get_current_user, is_admin
 from ..dependencies import drones
-from ..dependencies.drones import generate_drone_token, validate_token
-from ..dependencies.classes import Drone, DroneEvent, DroneUpdateWithRoute, User
+from ..dependencies.drones import generate_drone_token, store_drone_updates, validate_token
+from ..dependencies.ingest import ingest_buffer
+from ..dependencies.classes import (Drone, DroneEvent, DroneUpdateItem, DroneUpdateWithRoute,
+                                   ExportFormat, ExportTable, User)
+from ..dependencies.exports import export_drone_data
+from ..dependencies.pagination import decode_cursor, get_page_headers, get_page_size
+from ..dependencies.responses import MsgspecResponse
 from ..dependencies.zones import get_zone_by_id
 
 router = APIRouter()
 
+MSGPACK_CONTENT_TYPES = ('application/msgpack', 'application/x-msgpack')
+
 @router.get("/drones/", status_code=status.HTTP_200_OK, response_model=Drone)
 async def read_drone(drone_id: int, current_user: User = Depends(get_current_user)):
     """API call to get a specific drone
@@ -38,15 +46,19 @@ async def read_drone(drone_id: int, current_user: User = Depends(get_current_use
 
 @router.get("/drones/events/",
             status_code=status.HTTP_200_OK,
-            response_model=List[DroneEvent]
+            response_model=List[DroneEvent],
+            response_class=MsgspecResponse
             )
 async def read_drone_events(drone_id: int=None,
                             zone_id:int =None,
                             days:int =0,
                             hours:int =0,
                             minutes:int =0,
-                            current_user: User = Depends(get_current_user)):
-    """API call to get all events of a drone
+                            current_user: User = Depends(get_current_user),
+                            limit:int =None,
+                            cursor:str =None):
+    """API call to get all events of a drone, newest first.
+    If there are more events than limit, the header X-Next-Cursor contains the cursor of the next page.
 
     Args:
         drone_id (int, optional): id of the drone. Defaults to None.
@@ -55,34 +67,49 @@ async def read_drone_events(drone_id: int=None,
         hours (int, optional): hours before now. Defaults to 0.
         minutes (int, optional): minutes before now. Defaults to 0.
         current_user (User, optional): User. Defaults to User that is logged in.
+        limit (int, optional): maximum number of events. Defaults to None, PAGE_SIZE.
+        cursor (str, optional): X-Next-Cursor of the previous page. Defaults to None, the first page.
 
     Returns:
         List[DroneEvent]: List of drone events.
     """
 
     timestamp = drones.timestamp_helper(days,hours,minutes)
-    fetched_drone_events = await drones.get_drone_events(orga_id=current_user.organization.id,
+    fetched_drone_events, next_key = await drones.get_drone_events_page(
+                                           orga_id=current_user.organization.id,
                                            timestamp=timestamp,
+                                           limit=get_page_size(limit),
+                                           before_key=decode_cursor(cursor),
                                            drone_id=drone_id,
                                            zone_id=zone_id)
 
     if fetched_drone_events is None:
         return []
 
-    return fetched_drone_events
+    return MsgspecResponse(fetched_drone_events, headers=get_page_headers(next_key))
 
 @router.get("/drones/route/",
             status_code=status.HTTP_200_OK,
-            response_model=List[DroneUpdateWithRoute]
+            response_model=List[DroneUpdateWithRoute],
+            response_class=MsgspecResponse
             )
 async def read_drone_route( drone_id: int=None,
                             zone_id:int =None,
                             days:int =0,
                             hours:int =0,
                             minutes:int =0,
-                            current_user: User = Depends(get_current_user)):
+                            current_user: User = Depends(get_current_user),
+                            limit:int =None,
+                            cursor:str =None,
+                            max_points:int =None,
+                            tolerance:float =None,
+                            bucket_seconds:int =None):
     """API call to get the route of a drone in a specific time frame and/or zone.
     Returns the last update and the route, the drone took to get to the last update.
+    The routes are built from the newest limit updates, if there are more updates
+    the header X-Next-Cursor contains the cursor of the next, older part of the routes.
+    The routes can be simplified, the properties of each geojson contain the number of points
+    of the route (vertices) and of the simplified route (simplified_vertices).
 
     Args:
         drone_id (int, optional): id of the drone. Defaults to None.
@@ -91,20 +118,61 @@ async def read_drone_route( drone_id: int=None,
         hours (int, optional): hours before now. Defaults to 0.
         minutes (int, optional): minutes before now. Defaults to 0.
         current_user (User, optional): User. Defaults to User that is logged in.
+        limit (int, optional): maximum number of updates. Defaults to None, PAGE_SIZE.
+        cursor (str, optional): X-Next-Cursor of the previous page. Defaults to None, the first page.
+        max_points (int, optional): maximum number of points per route. Defaults to None.
+        tolerance (float, optional): Douglas-Peucker tolerance in degrees. Defaults to None.
+        bucket_seconds (int, optional): keeps one point per bucket of this many seconds. Defaults to None.
 
     Returns:
         List[DroneUpdateWithRoute]: List of drones updates with their route.
     """
 
     timestamp = drones.timestamp_helper(days,hours,minutes)
-    drone_updates = await drones.get_drone_with_route(orga_id=current_user.organization.id,
-                                            zone_id=zone_id,
+    drone_updates, next_key = await drones.get_drone_route_page(
+                                           orga_id=current_user.organization.id,
                                            timestamp=timestamp,
-                                           drone_id=drone_id)
+                                           limit=get_page_size(limit),
+                                           before_key=decode_cursor(cursor),
+                                           drone_id=drone_id,
+                                           zone_id=zone_id,
+                                           simplification=drones.get_route_simplification(
+                                               max_points, tolerance, bucket_seconds))
     if drone_updates is None:
         return []
 
-    return drone_updates
+    return MsgspecResponse(drone_updates, headers=get_page_headers(next_key))
+
+@router.get("/drones/export/",
+            status_code=status.HTTP_200_OK,
+            response_class=StreamingResponse
+            )
+async def export_drones(table: ExportTable = ExportTable.UPDATES,
+                        export_format: ExportFormat = ExportFormat.NDJSON,
+                        drone_id: int = None,
+                        after: datetime = None,
+                        before: datetime = None,
+                        current_user: User = Depends(get_current_user)):
+    """API call to export the updates or events of the drones of the organization, newest first.
+    The rows are streamed, so the export can be as large as needed.
+
+    Args:
+        table (ExportTable, optional): updates or events. Defaults to updates.
+        export_format (ExportFormat, optional): ndjson or csv. Defaults to ndjson.
+        drone_id (int, optional): id of the drone. Defaults to None, all drones.
+        after (datetime, optional): exports everything after this date. Defaults to None.
+        before (datetime, optional): exports everything before this date. Defaults to None.
+        current_user (User, optional): User. Defaults to User that is logged in.
+
+    Returns:
+        StreamingResponse: the exported rows.
+    """
+    return export_drone_data(orga_id=current_user.organization.id,
+                             table=table,
+                             export_format=export_format,
+                             drone_id=drone_id,
+                             after=after,
+                             before=before)
 
 @router.get("/drones/all/",
             status_code=status.HTTP_200_OK,
@@ -163,8 +231,13 @@ async def drone_update(drone_id:int,
             detail="Invalid drone",
         )
 
+    if ingest_buffer.running:
+        if await ingest_buffer.put(drone_id, timestamp, lon, lat, flight_range, flight_time):
+            return {"message": "queued"}
+        return {"message": "invalid"}
+
     #timestamp = datetime.fromtimestamp(unixtimestamp)
-    success = create_drone_update(
+    success = await create_drone_update_async(
         drone_id,
         timestamp,
         lon,
@@ -173,12 +246,55 @@ async def drone_update(drone_id:int,
         flight_time
     )
     if success:
-        set_update_for_coordinate(lon, lat, timestamp)
+        await set_update_for_coordinate_async(lon, lat, timestamp)
         return {"message": "success"}
 
     return {"message": "error"}
 
 
+@router.post("/drones/send-updates/", status_code=status.HTTP_200_OK)
+async def drone_update_batch(drone_id:int,
+                             current_drone_token: str,
+                             request: Request):
+    """Api call to recieve many updates of one drone at once,
+    e.g. the positions it buffered while it was out of range.
+    The body is a JSON or msgpack (Content-Type: application/msgpack) encoded array of
+    {timestamp, lon, lat, flight_range, flight_time} objects.
+
+    Args:
+        drone_id (int): id of the drone.
+        current_drone_token (str): token of the drone.
+        request (Request): the request containing the encoded updates.
+
+    Returns:
+        dict: response with the number of stored updates and the status of every update.
+    """
+    if not await validate_token(current_drone_token) :
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Invalid drone",
+        )
+
+    body = await request.body()
+    content_type = request.headers.get('content-type', '').split(';')[0].strip()
+    try:
+        if content_type in MSGPACK_CONTENT_TYPES:
+            updates = msgspec.msgpack.decode(body, type=List[DroneUpdateItem])
+        else:
+            updates = msgspec.json.decode(body, type=List[DroneUpdateItem])
+    except (msgspec.DecodeError, msgspec.ValidationError) as err:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(err),
+        ) from err
+
+    results = await store_drone_updates(drone_id, updates)
+    stored = sum(1 for result in results if result['status'] == 'stored')
+    if stored == 0 and len(results) > 0:
+        return {"message": "error", "stored": stored, "results": results}
+
+    return {"message": "success", "stored": stored, "results": results}
+
 @router.post("/drones/send-event/")
 async def drone_event(
     drone_id: int,
@@ -229,14 +345,14 @@ async def drone_event(
     with open(predicted_file_location, "wb+") as file_object:
         file_object.write(file_predicted.file.read())
 
-    create_drone_event_entry(drone_id,
-                            timestamp,
-                            lon,
-                            lat,
-                            event_type,
-                            confidence,
-                            sub_path,
-                            csv_file_path)
+    await create_drone_event_entry_async(drone_id,
+                                         timestamp,
+                                         lon,
+                                         lat,
+                                         event_type,
+                                         confidence,
+                                         sub_path,
+                                         csv_file_path)
 
     return {"location": sub_path}
 
@@ -287,14 +403,14 @@ async def drone_events(events: List[DroneEvent], files: UploadFile, token: str):
         with open(predicted_file_location, "wb+") as file_object:
             file_object.write(file_predicted.file.read())
 
-        create_drone_event_entry(event.drone_id,
-                                event.timestamp,
-                                event.lon,
-                                event.lat,
-                                event.event_type,
-                                event.confidence,
-                                sub_path,
-                                event.csv_file_path)
+        await create_drone_event_entry_async(event.drone_id,
+                                             event.timestamp,
+                                             event.lon,
+                                             event.lat,
+                                             event.event_type,
+                                             event.confidence,
+                                             sub_path,
+                                             event.csv_file_path)
 
     return {"location": sub_path}
 
@@ -369,7 +485,7 @@ async def drone_signup(name: str,
         dict: {drone, token}
     """
     if await is_admin(current_user):
-        drone = create_drone(name,drone_type,flight_range,cc_range,flight_time)
+        drone = await create_drone_async(name,drone_type,flight_range,cc_range,flight_time)
         return {"drone": drone, "token": await generate_drone_token(drone)}
 
 
@@ -385,7 +501,7 @@ async def get_image_raw(event_id: int,
     Returns:
         FileResponse: image
     """
-    curr_drone_event = get_event_by_id(event_id)
+    curr_drone_event = await get_event_by_id_async(event_id)
     print(curr_drone_event)
     if curr_drone_event is None:
         raise HTTPException(
@@ -424,7 +540,7 @@ async def get_image_predicted(event_id: int,
         FileResponse: image
     """
 
-    curr_drone_event = get_event_by_id(event_id)
+    curr_drone_event = await get_event_by_id_async(event_id)
     print(curr_drone_event)
     if curr_drone_event is None:
         raise HTTPException(
@@ -2,9 +2,11 @@
 
 from datetime import datetime
 from fastapi import status, APIRouter, Depends, HTTPException
-from database.incidents import create_incident, get_last_incidents, get_all_incidents
+from database.incidents import create_incident_async, get_last_incidents_async, get_incidents_page_async
 from ..dependencies.users import get_current_user
 from ..dependencies.classes import User
+from ..dependencies.pagination import decode_cursor, get_page_headers, get_page_size
+from ..dependencies.responses import MsgspecResponse
 
 router = APIRouter()
 
@@ -32,7 +34,7 @@ async def alarm_team(drone_name: str,
             detail="Invalid user",
         )
 
-    incident = create_incident(drone_name, location, alarm_type, notes, datetime.now())
+    incident = await create_incident_async(drone_name, location, alarm_type, notes, datetime.now())
     if incident is None:
         raise HTTPException(
             status_code=status.HTTP_406_NOT_ACCEPTABLE,
@@ -41,7 +43,7 @@ async def alarm_team(drone_name: str,
     return {"message:": "success"}
 
 
-@router.get("/incidents/get/", status_code=status.HTTP_200_OK)
+@router.get("/incidents/get/", status_code=status.HTTP_200_OK, response_class=MsgspecResponse)
 async def get_incidents(amount: int, current_user: User = Depends(get_current_user)):
     """API call to get the last x incidents
 
@@ -65,25 +67,31 @@ async def get_incidents(amount: int, current_user: User = Depends(get_current_us
                 detail="Amount must be >= 0",
             )
 
-        alarms = get_last_incidents(amount)
-        return alarms
+        alarms = await get_last_incidents_async(amount, as_struct=True)
+        return MsgspecResponse(alarms)
     except Exception as err:
         raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="API call was recieved but something went wrong internally",
             ) from err
 
-@router.get("/incidents/get-all/", status_code=status.HTTP_200_OK)
-async def all_incidents(current_user: User = Depends(get_current_user)):
-    """API call to get all incidents
+@router.get("/incidents/get-all/", status_code=status.HTTP_200_OK, response_class=MsgspecResponse)
+async def all_incidents(current_user: User = Depends(get_current_user),
+                        limit: int = None,
+                        cursor: str = None):
+    """API call to get all incidents, newest first.
+    If there are more incidents than limit, the header X-Next-Cursor contains the cursor of the next page.
 
     Args:
-        amount (int): amount to get
         current_user (User, optional): current user. Defaults to Depends(get_current_user).
+        limit (int, optional): maximum number of incidents. Defaults to None, PAGE_SIZE.
+        cursor (str, optional): X-Next-Cursor of the previous page. Defaults to None, the first page.
 
     Returns:
         Incident[]: list of incidents
     """
+    page_size = get_page_size(limit)
+    before_key = decode_cursor(cursor)
     try:
         if not current_user:
             raise HTTPException(
@@ -91,7 +99,10 @@ async def all_incidents(current_user: User = Depends(get_current_user)):
                 detail="Invalid user",
             )
 
-        return get_all_incidents()
+        incidents, next_key = await get_incidents_page_async(page_size, before_key, as_struct=True)
+        if incidents is None:
+            return []
+        return MsgspecResponse(incidents, headers=get_page_headers(next_key))
     except Exception as err:
         raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -3,40 +3,60 @@ from typing import List
 from fastapi import Depends, APIRouter, HTTPException, status
 
 from api.dependencies.territories import get_territories, get_territory_by_id
+from api.dependencies.zones import detail_from_zoom
 from .users import get_current_user
-from ..dependencies.classes import TerritoryWithZones, User
+from ..dependencies.classes import Detail, TerritoryWithZones, User
+from ..dependencies.responses import MsgspecResponse
 router = APIRouter()
 
 
-@router.get("/territories/all/", status_code=status.HTTP_200_OK, response_model=List[TerritoryWithZones])
-async def read_territories(current_user: User = Depends(get_current_user)):
+@router.get("/territories/all/",
+            status_code=status.HTTP_200_OK,
+            response_model=List[TerritoryWithZones],
+            response_class=MsgspecResponse)
+async def read_territories(current_user: User = Depends(get_current_user),
+                           detail: Detail = None,
+                           zoom: int = None):
     """API call to get the all territories, linked with current_user's orga.
 
     Args:
         current_user (User, optional): User. Defaults to User that is logged in.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to None.
+        zoom (int, optional): zoom level of the map, selects the detail if none is given.
+        Defaults to None, the full geometry.
 
     Returns:
         List[TerritoryWithZones]: List of territories linked to the current_user's orga.
     """
 
-    territores = await get_territories(current_user.organization.id)
+    territores = await get_territories(current_user.organization.id,
+                                       detail_from_zoom(detail, zoom),
+                                       as_struct=True)
     if territores is None or len(territores) == 0:
         return []
-    return territores
+    return MsgspecResponse(territores)
 
 @router.get("/territories/", status_code=status.HTTP_200_OK, response_model=TerritoryWithZones)
-async def read_territory(territory_id: int, current_user: User = Depends(get_current_user)):
+async def read_territory(territory_id: int,
+                         current_user: User = Depends(get_current_user),
+                         detail: Detail = None,
+                         zoom: int = None):
     """API call to get a specific territory. current_user's orga has to be linked to the territory.
 
     Args:
         territory_id (int): id of the territory.
         current_user (User, optional): User. Defaults to User that is logged in.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to None.
+        zoom (int, optional): zoom level of the map, selects the detail if none is given.
+        Defaults to None, the full geometry.
 
     Returns:
         TerritoryWithZones: territory with its zones.
     """
 
-    territory = await get_territory_by_id(territory_id, current_user.organization.id)
+    territory = await get_territory_by_id(territory_id,
+                                          current_user.organization.id,
+                                          detail_from_zoom(detail, zoom))
     if territory is None:
         raise HTTPException(
             status_code=status.HTTP_406_NOT_ACCEPTABLE,
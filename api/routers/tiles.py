@@ -0,0 +1,35 @@
+"""Api calls for vector tiles."""
+from fastapi import Depends, APIRouter, HTTPException, Response, status
+from database.vector_tiles import is_valid_tile, tile_cache
+from .users import get_current_user
+from ..dependencies.classes import User
+from ..dependencies.zones import detail_from_zoom
+router = APIRouter()
+
+MVT_MEDIA_TYPE = 'application/vnd.mapbox-vector-tile'
+
+
+@router.get("/tiles/{z}/{x}/{y}.mvt", status_code=status.HTTP_200_OK, response_class=Response)
+async def read_tile(z: int, x: int, y: int, current_user: User = Depends(get_current_user)):
+    """API call to get a mapbox vector tile with the zones, territories and drones
+    of the current_user's orga. The tile has the layers 'zones', 'territories' and 'drones'.
+
+    Args:
+        z (int): zoom level.
+        x (int): column of the tile.
+        y (int): row of the tile, 0 is the northmost row.
+        current_user (User): User. Defaults to User that is logged in.
+
+    Returns:
+        Response: the encoded tile, empty if there is nothing in the tile.
+    """
+    if not is_valid_tile(z, x, y):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tile does not exist.",
+        )
+
+    tile = await tile_cache.get_tile_async(current_user.organization.id,
+                                           z, x, y,
+                                           detail_from_zoom(zoom=z))
+    return Response(content=tile, media_type=MVT_MEDIA_TYPE)
@@ -14,18 +14,15 @@ from api.dependencies.classes import Token,User,UserWithSensitiveInfo
 
 from ..dependencies.authentication import (
     create_access_token,
-    get_password_hash,
+    get_password_hash_async,
     ACCESS_TOKEN_EXPIRE_MINUTES
     )
 from ..dependencies.users import (
-    get_all_users,
-    get_user_by_id,
     is_admin,
     update_user as update_user_func,
     get_current_user,
     authenticate_user,
-    get_user_alerts,
-    get_user
+    get_user_alerts
     )
 
 from ..dependencies.emails import (
@@ -63,7 +60,7 @@ async def delete_users( user_id:int,
     """
 
     await is_admin(current_user)
-    if users_table.delete_user(user_id):
+    if await users_table.delete_user_async(user_id):
         return {"message": "success"}
 
     return {"message": "couldnt create user."}
@@ -91,7 +88,7 @@ async def read_users(current_user: User = Depends(get_current_user)):
         List[User]: List of users
     """
     await is_admin(current_user)
-    return get_all_users(current_user.organization.id)
+    return await users_table.get_all_users_async(current_user.organization.id)
 
 @router.post("/users/login/", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
@@ -108,7 +105,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     """
 
     #note: username is the reserved name for the login name, must be used even if we are using email
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -160,20 +157,20 @@ async def register( email: str = Form(),
             status_code=status.HTTP_406_NOT_ACCEPTABLE,
             detail=errors,
         )
-    if get_user(email):
+    if await users_table.get_user_async(email):
         raise HTTPException(
             status_code=status.HTTP_406_NOT_ACCEPTABLE,
             detail="This email is already assosiated with an existing account",
         )
 
-    organization_obj = organizations_table.get_orga(organization)
+    organization_obj = await organizations_table.get_orga_async(organization)
     if organization_obj is None:
         raise HTTPException(
             status_code=status.HTTP_406_NOT_ACCEPTABLE,
             detail="Organization doesnt exist.",
         )
 
-    hashed_pw = get_password_hash(password)
+    hashed_pw = await get_password_hash_async(password)
     user = UserWithSensitiveInfo(   email=email,
                                     first_name=first_name,
                                     last_name=last_name,
@@ -183,7 +180,7 @@ async def register( email: str = Form(),
                                     disabled=0,
                                     email_verified=0)
 
-    if users_table.create_user(user):
+    if await users_table.create_user_async(user):
         await send_token_email(email)
         return {"message": "success"}
 
@@ -244,7 +241,7 @@ async def admin_update_user_info(
         bool: if the update was successful.
     """
     await is_admin(current_user)
-    user_to_update = get_user_by_id(update_user_id)
+    user_to_update = await users_table.get_user_by_id_async(update_user_id)
 
     #check if the user is in the organization of the admin.
     if user_to_update.organization.id != current_user.organization.id:
@@ -1,24 +1,33 @@
 """Api calls for Zones."""
 from fastapi import Depends, APIRouter, HTTPException, status
-from  ..dependencies.zones import get_all_zones, get_zone_by_id, get_zone_count
+from  ..dependencies.zones import detail_from_zoom, get_all_zones, get_zone_by_id, get_zone_count
 from .users import get_current_user
-from ..dependencies.classes import User, Zone
+from ..dependencies.classes import Detail, User, Zone
+from ..dependencies.responses import MsgspecResponse
 router = APIRouter()
 
 
 @router.get("/zones/", status_code=status.HTTP_200_OK, response_model=Zone)
-async def read_zone(zone_id: int, current_user: User = Depends(get_current_user)):
+async def read_zone(zone_id: int,
+                    current_user: User = Depends(get_current_user),
+                    detail: Detail = None,
+                    zoom: int = None):
     """API call to get a specific zone. The zone has to be linked to the current_user's orga.
 
     Args:
         zone_id (int): id of the zone.
         current_user (User): User. Defaults to User that is logged in.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to None.
+        zoom (int, optional): zoom level of the map, selects the detail if none is given.
+        Defaults to None, the full geometry.
 
     Returns:
         Zone: zone
     """
 
-    zone = await get_zone_by_id(zone_id, current_user.organization.id)
+    zone = await get_zone_by_id(zone_id,
+                                current_user.organization.id,
+                                detail_from_zoom(detail, zoom))
     if not zone:
         raise HTTPException(
             status_code=status.HTTP_406_NOT_ACCEPTABLE,
@@ -26,23 +35,33 @@ async def read_zone(zone_id: int, current_user: User = Depends(get_current_user)
         )
     return zone
 
-@router.get("/zones/all/", status_code=status.HTTP_200_OK, response_model=list[Zone])
-async def read_zones_all(current_user: User = Depends(get_current_user)):
+@router.get("/zones/all/",
+            status_code=status.HTTP_200_OK,
+            response_model=list[Zone],
+            response_class=MsgspecResponse)
+async def read_zones_all(current_user: User = Depends(get_current_user),
+                         detail: Detail = None,
+                         zoom: int = None):
     """API call to get the all zones, linked with current_user's orga.
 
     Args:
         current_user (User): User. Defaults to User that is logged in.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to None.
+        zoom (int, optional): zoom level of the map, selects the detail if none is given.
+        Defaults to None, the full geometry.
 
     Returns:
         Zone[]: List of Zones.
     """
-    zones = await get_all_zones(current_user.organization.id)
+    zones = await get_all_zones(current_user.organization.id,
+                                detail_from_zoom(detail, zoom),
+                                as_struct=True)
     if not zones:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Your Organization has no zones linked to it",
         )
-    return zones
+    return MsgspecResponse(zones)
 
 @router.get("/zones/count/", status_code=status.HTTP_200_OK, response_model=dict)
 async def read_zones_count(current_user: User = Depends(get_current_user)):
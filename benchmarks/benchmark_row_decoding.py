@@ -0,0 +1,71 @@
+"""Benchmark of the row decoding, run with python -m benchmarks.benchmark_row_decoding [rows].
+
+Compares the former per row decoding (validated pydantic objects, timezone created per row)
+with the shared decoders of database.row_decoding on synthetic rows.
+"""
+import datetime
+import sys
+import time
+import pytz
+from api.dependencies.classes import DroneEvent, DroneUpdate, EventType
+from database.database import TIMEZONE
+from database.drone_events_table import EVENT_DECODER
+from database.drone_updates_table import UPDATE_DECODER
+
+ROWS = 1_000_000
+
+
+def legacy_update(row) -> DroneUpdate:
+    """the decoding of drone_updates_table before the shared decoders."""
+    longitude, latitude = float(row[5]), float(row[6])
+    timestamp = row[2]
+    if timestamp is not None:
+        timestamp = timestamp.astimezone(pytz.timezone(TIMEZONE))
+    return DroneUpdate(id=row[0], drone_id=row[1], timestamp=timestamp, lon=longitude, lat=latitude,
+                       flight_range=row[3], flight_time=row[4], zone_id=row[7])
+
+def legacy_event(row) -> DroneEvent:
+    """the decoding of drone_events_table before the shared decoders."""
+    longitude, latitude = float(row[3]), float(row[4])
+    try:
+        event_type = EventType(row[5])
+    except ValueError:
+        event_type = None
+    timestamp = row[2]
+    if timestamp is not None:
+        timestamp = timestamp.astimezone(pytz.timezone(TIMEZONE))
+    return DroneEvent(id=row[0], drone_id=row[1], timestamp=timestamp, lon=longitude, lat=latitude,
+                      event_type=event_type, confidence=row[6], picture_path=row[7],
+                      csv_file_path=row[8], zone_id=row[9])
+
+def create_rows(count: int) -> tuple[list, list]:
+    """synthetic rows in the shape of the selects of the table modules."""
+    start = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+    updates, events = [], []
+    for i in range(count):
+        timestamp = start + datetime.timedelta(seconds=i)
+        lon, lat = 8.0 + i % 1000 / 1000, 50.0 + i % 777 / 1000
+        updates.append((i, i % 50, timestamp, 1.5, 2.5, lon, lat, i % 20))
+        events.append((i, i % 50, timestamp, lon, lat, i % 3 + 1, i % 100,
+                       'picture.jpg', 'data.csv', i % 20))
+    return updates, events
+
+def measure(name: str, decode, rows: list) -> None:
+    """decodes all rows and prints the rows per second."""
+    begin = time.perf_counter()
+    decode(rows)
+    seconds = time.perf_counter() - begin
+    print(f'{name:<32} {len(rows) / seconds:>12,.0f} rows/s')
+
+def main(count: int = ROWS) -> None:
+    """runs the benchmark."""
+    updates, events = create_rows(count)
+    measure('updates before', lambda rows: [legacy_update(row) for row in rows], updates)
+    measure('updates pydantic', UPDATE_DECODER.decode_all, updates)
+    measure('updates struct', lambda rows: UPDATE_DECODER.decode_all(rows, True), updates)
+    measure('events before', lambda rows: [legacy_event(row) for row in rows], events)
+    measure('events pydantic', EVENT_DECODER.decode_all, events)
+    measure('events struct', lambda rows: EVENT_DECODER.decode_all(rows, True), events)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS)
@@ -0,0 +1,174 @@
+"""Cache for the unioned areas of territories and organizations.
+
+The union of all zones of a territory (and of all territories of an organization)
+only changes if zones are linked or unlinked, so it is computed once and stored
+together with its geojson, centroid and bounding box.
+Linking or unlinking zones recomputes the entries of the territory and its organization.
+Reads only check for missing entries (e.g. after a migration) and compute them if needed,
+so a read doesnt write if all areas are cached.
+"""
+import sqlite3
+from api.dependencies.classes import Detail
+import database.database as db
+from database.spatia import simplified_geojson_sql
+
+TERRITORY = 'territory'
+ORGA = 'orga'
+
+CREATE_AREA_CACHE_TABLE = '''CREATE TABLE IF NOT EXISTS area_cache
+(
+kind        text NOT NULL ,
+owner_id    integer NOT NULL ,
+geojson     text,
+geojson_medium text,
+geojson_low text,
+lon         real,
+lat         real,
+min_lon     real,
+min_lat     real,
+max_lon     real,
+max_lat     real,
+PRIMARY KEY (kind, owner_id)
+);
+SELECT AddGeometryColumn('area_cache', 'area', 4326, 'MULTIPOLYGON', 'XY')
+WHERE NOT EXISTS (SELECT 1 FROM geometry_columns
+                  WHERE f_table_name = 'area_cache' AND f_geometry_column = 'area');'''
+
+# the union is computed once per owner, the other columns are derived from the stored area.
+FILL_TERRITORY_AREAS = f'''INSERT OR REPLACE INTO area_cache (kind, owner_id, area)
+                SELECT '{TERRITORY}', territory_zones.territory_id, CastToMultiPolygon(GUnion(zones.area))
+                FROM territory_zones
+                JOIN zones ON zones.id = territory_zones.zone_id
+                WHERE territory_zones.territory_id NOT IN (
+                    SELECT owner_id FROM area_cache WHERE kind = '{TERRITORY}')
+                GROUP BY territory_zones.territory_id;'''
+
+FILL_ORGA_AREAS = f'''INSERT OR REPLACE INTO area_cache (kind, owner_id, area)
+                SELECT '{ORGA}', territories.orga_id, CastToMultiPolygon(GUnion(zones.area))
+                FROM territories
+                JOIN territory_zones ON territory_zones.territory_id = territories.id
+                JOIN zones ON zones.id = territory_zones.zone_id
+                WHERE territories.orga_id NOT IN (
+                    SELECT owner_id FROM area_cache WHERE kind = '{ORGA}')
+                GROUP BY territories.orga_id;'''
+
+FILL_ATTRIBUTES = f'''UPDATE area_cache SET
+                geojson = AsGeoJSON(area),
+                geojson_medium = {simplified_geojson_sql('area', Detail.MEDIUM)},
+                geojson_low = {simplified_geojson_sql('area', Detail.LOW)},
+                lon = X(ST_Centroid(area)),
+                lat = Y(ST_Centroid(area)),
+                min_lon = MbrMinX(area),
+                min_lat = MbrMinY(area),
+                max_lon = MbrMaxX(area),
+                max_lat = MbrMaxY(area)
+                WHERE geojson IS NULL AND area IS NOT NULL;'''
+
+# territories with zones, whose area or whose organization's area isnt cached,
+# or entries whose attributes werent derived yet.
+HAS_MISSING_AREAS = f'''SELECT EXISTS (SELECT 1 FROM territories
+                    WHERE EXISTS (SELECT 1 FROM territory_zones
+                                  WHERE territory_zones.territory_id = territories.id)
+                    AND (NOT EXISTS (SELECT 1 FROM area_cache
+                                     WHERE kind = '{TERRITORY}' AND owner_id = territories.id)
+                         OR NOT EXISTS (SELECT 1 FROM area_cache
+                                        WHERE kind = '{ORGA}' AND owner_id = territories.orga_id)))
+                OR EXISTS (SELECT 1 FROM area_cache WHERE geojson IS NULL AND area IS NOT NULL);'''
+
+DELETE_TERRITORY = f'''DELETE FROM area_cache
+                WHERE (kind = '{TERRITORY}' AND owner_id = ?)
+                OR (kind = '{ORGA}' AND owner_id IN (SELECT orga_id FROM territories WHERE id = ?));'''
+
+# geojson column of area_cache per level of detail.
+GEOJSON_DETAIL = {
+    Detail.FULL: 'area_cache.geojson',
+    Detail.MEDIUM: 'IFNULL(area_cache.geojson_medium, area_cache.geojson)',
+    Detail.LOW: 'IFNULL(area_cache.geojson_low, area_cache.geojson)',
+}
+
+GET_AREA = 'SELECT geojson FROM area_cache WHERE kind = ? AND owner_id = ?;'
+
+GET_BBOX = 'SELECT min_lon, min_lat, max_lon, max_lat FROM area_cache WHERE kind = ? AND owner_id = ?;'
+
+
+def fill_areas(conn: sqlite3.Connection) -> None:
+    """computes the missing areas of all territories and organizations, without committing.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+    """
+    conn.execute(FILL_TERRITORY_AREAS)
+    conn.execute(FILL_ORGA_AREAS)
+    conn.execute(FILL_ATTRIBUTES)
+
+def fill() -> bool:
+    """computes the missing areas of all territories and organizations in one transaction.
+    Only reads if all areas are cached.
+
+    Returns:
+        bool: True if successful.
+    """
+    fetched = db.fetch_one(HAS_MISSING_AREAS)
+    if fetched is not None and not fetched[0]:
+        return True
+    try:
+        with db.database_connection() as conn:
+            fill_areas(conn)
+            conn.commit()
+            return True
+    except sqlite3.Error as exception:
+        print(exception)
+    return False
+
+def refresh_territory(territory_id: int) -> bool:
+    """recomputes the cached area of the territory and of its organization in one transaction.
+    Has to be called whenever zones are linked or unlinked.
+
+    Args:
+        territory_id (int): id of the territory.
+
+    Returns:
+        bool: True if successful.
+    """
+    try:
+        with db.database_connection() as conn:
+            conn.execute(DELETE_TERRITORY, (territory_id, territory_id))
+            fill_areas(conn)
+            conn.commit()
+            return True
+    except sqlite3.Error as exception:
+        print(exception)
+    return False
+
+def get_area(kind: str, owner_id: int) -> str | None:
+    """get the unioned area of a territory or an organization.
+
+    Args:
+        kind (str): TERRITORY or ORGA.
+        owner_id (int): id of the territory or the organization.
+
+    Returns:
+        str | None: the area as geojson str, None if no zones are linked.
+    """
+    fill()
+    fetched = db.fetch_one(GET_AREA, (kind, owner_id))
+    if fetched is None:
+        return None
+    return fetched[0]
+
+def get_bbox(kind: str, owner_id: int) -> tuple[float, float, float, float] | None:
+    """get the bounding box of the area of a territory or an organization.
+
+    Args:
+        kind (str): TERRITORY or ORGA.
+        owner_id (int): id of the territory or the organization.
+
+    Returns:
+        tuple[float, float, float, float] | None: (min_lon, min_lat, max_lon, max_lat),
+        None if no zones are linked.
+    """
+    fill()
+    fetched = db.fetch_one(GET_BBOX, (kind, owner_id))
+    if fetched is None or fetched[0] is None:
+        return None
+    return tuple(fetched)
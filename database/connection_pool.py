@@ -0,0 +1,204 @@
+"""Bounded pool of sqlite3 connections.
+
+Every read and write of the database layer checks out a connection from a pool,
+so connections (and the loaded mod_spatialite extension) are reused across
+requests and threads, and the number of connections in flight is limited.
+"""
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Raised if no connection could be checked out within the timeout."""
+
+
+class PoolClosedError(sqlite3.OperationalError):
+    """Raised if a connection is requested from a pool that was closed."""
+
+
+class ConnectionPool:
+    """Thread safe, bounded pool of initialised sqlite3 connections.
+
+    Args:
+        factory (Callable[[], sqlite3.Connection]): creates a new, fully initialised connection.
+        size (int): maximum number of connections (idle and in use).
+        timeout (float | None): seconds to wait for a free connection, None waits forever.
+    """
+
+    def __init__(self,
+                 factory: Callable[[], sqlite3.Connection],
+                 size: int = 5,
+                 timeout: float | None = 30.0):
+        if size < 1:
+            raise ValueError('pool size has to be at least 1.')
+
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self._idle = deque()
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+        # counters since the pool was created, in_use is the number of checked out connections.
+        self._stats = {
+            'in_use': 0,
+            'checkouts': 0,
+            'creations': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'discarded': 0,
+        }
+
+    def acquire(self, timeout: float | None = -1) -> sqlite3.Connection:
+        """check out a connection. Blocks if all connections are in use.
+
+        Args:
+            timeout (float | None, optional): seconds to wait, None waits forever.
+                Defaults to the timeout of the pool.
+
+        Raises:
+            PoolTimeoutError: if no connection got free within the timeout.
+            PoolClosedError: if the pool was closed.
+            sqlite3.Error: if a new connection could not be created.
+
+        Returns:
+            sqlite3.Connection: the checked out connection.
+        """
+        if timeout == -1:
+            timeout = self.timeout
+
+        with self._cond:
+            if self._closed:
+                raise PoolClosedError('connection pool is closed.')
+
+            if not self._idle and self._stats['in_use'] >= self.size:
+                self._stats['waits'] += 1
+                started = time.monotonic()
+                got_free = self._cond.wait_for(
+                    lambda: self._closed or self._idle or self._stats['in_use'] < self.size,
+                    timeout)
+                self._stats['wait_time'] += time.monotonic() - started
+                if not got_free:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f'no free database connection after {timeout} seconds.')
+                if self._closed:
+                    raise PoolClosedError('connection pool is closed.')
+
+            self._stats['in_use'] += 1
+            self._stats['checkouts'] += 1
+            if self._idle:
+                return self._idle.pop()
+
+        # create new connections outside of the lock,
+        # loading the extension takes a while.
+        try:
+            conn = self.factory()
+            if conn is None:
+                raise sqlite3.OperationalError('could not open a database connection.')
+        except BaseException:
+            with self._cond:
+                self._stats['in_use'] -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._stats['creations'] += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """return a connection to the pool.
+        Open transactions are rolled back and broken connections are discarded.
+
+        Args:
+            conn (sqlite3.Connection): connection that was checked out before.
+        """
+        healthy = self._validate(conn)
+
+        with self._cond:
+            self._stats['in_use'] -= 1
+            if healthy and not self._closed:
+                self._idle.append(conn)
+                conn = None
+            else:
+                self._stats['discarded'] += 1
+            self._cond.notify()
+
+        if conn is not None:
+            try:
+                conn.close()
+            except sqlite3.Error as exception:
+                print(exception)
+
+    @contextmanager
+    def connection(self, timeout: float | None = -1):
+        """check out a connection for the duration of the with block.
+
+        Args:
+            timeout (float | None, optional): seconds to wait, see acquire.
+
+        Yields:
+            sqlite3.Connection: the checked out connection.
+        """
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        """close all idle connections and refuse new checkouts.
+        Connections still in use are closed as soon as they are returned.
+        """
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+        for conn in idle:
+            try:
+                conn.close()
+            except sqlite3.Error as exception:
+                print(exception)
+
+    @property
+    def closed(self) -> bool:
+        """wether the pool was closed."""
+        return self._closed
+
+    def stats(self) -> dict:
+        """statistics of this pool.
+
+        Returns:
+            dict: checkouts, creations, waits, wait_time, timeouts and discarded
+            since the pool was created, plus the current number of idle and used connections.
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['idle'] = len(self._idle)
+        return stats
+
+    @staticmethod
+    def _validate(conn: sqlite3.Connection) -> bool:
+        """checks that the connection can be reused.
+
+        Args:
+            conn (sqlite3.Connection): the connection to check.
+
+        Returns:
+            bool: True if the connection is usable.
+        """
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute('SELECT 1;').fetchone()
+            return True
+        except sqlite3.Error as exception:
+            print(exception)
+            return False
@@ -1,9 +1,16 @@
 """Tests for the database func"""
+import asyncio
+import datetime
+import functools
 import os
+import re
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import List
+from typing import Iterator, List
 from pydantic import BaseModel
+from database.connection_pool import ConnectionPool
 
 DATABASE_PATH = os.getenv('DB_PATH')
 BACKUP_PATH = os.getenv('DB_BACKUP_PATH')
@@ -19,19 +26,101 @@ SPARTIALITE_PATH = os.path.join(file_path,SPARTIALITE_PATH)
 # e.g. spatialite_path  = 'C:/Users/pedro/Documents/mod_spatialite-NG-win-amd64
 os.environ['PATH'] = SPARTIALITE_PATH + ';' + os.environ['PATH']
 
-conections = []
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+
+EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', str(POOL_SIZE)))
+
+# rows per fetchmany of fetch_batches.
+FETCH_SIZE = int(os.getenv('DB_FETCH_SIZE', '1000'))
+
+# connection profile, applied once to every new connection of the pool.
+CONNECTION_PRAGMAS = {
+    'journal_mode': os.getenv('DB_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('DB_SYNCHRONOUS', 'NORMAL'),
+    'cache_size': os.getenv('DB_CACHE_SIZE', '-65536'),
+    'mmap_size': os.getenv('DB_MMAP_SIZE', '268435456'),
+    'temp_store': os.getenv('DB_TEMP_STORE', 'MEMORY'),
+    'busy_timeout': os.getenv('DB_BUSY_TIMEOUT', '5000'),
+    # OFF like before the pool, ON rejects e.g. updates of unknown drones and deleting users with settings.
+    'foreign_keys': os.getenv('DB_FOREIGN_KEYS', 'OFF'),
+}
+PRAGMA_VALUE_REGEX = r"^-?\w+$"
+
+pools:dict[str,ConnectionPool] = {}
+pools_lock = threading.Lock()
+
+# dedicated threads for the awaitable api, so sqlite never runs on the event loop
+# and doesnt compete with the default executor of the event loop.
+# holds at most one executor, created on demand so run_async works again after close_pools.
+executors:list[ThreadPoolExecutor] = []
+executors_lock = threading.Lock()
 
 def create_backup():
     """Creates a backup in the path specified in the env variable.
     """
     with database_connection() as database_conn:
-        with database_connection(BACKUP_PATH) as backup_conn:
+        backup_conn = sqlite3.connect(BACKUP_PATH)
+        try:
             database_conn.backup(backup_conn)
+        finally:
+            backup_conn.close()
+
+
+def get_pool(path=DATABASE_PATH) -> ConnectionPool:
+    """returns the connection pool of the database at path, creates it if needed.
+
+    Args:
+        path (str, optional): path to db. Defaults to DATABASE_PATH.
+
+    Returns:
+        ConnectionPool: the pool for this database.
+    """
+    with pools_lock:
+        pool = pools.get(path)
+        if pool is None or pool.closed:
+            pool = ConnectionPool(lambda: connect(path), POOL_SIZE, POOL_TIMEOUT)
+            pools[path] = pool
+        return pool
+
+def get_executor() -> ThreadPoolExecutor:
+    """returns the database executor, creates it if needed.
+
+    Returns:
+        ThreadPoolExecutor: the executor of run_async.
+    """
+    with executors_lock:
+        if not executors:
+            executors.append(ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix='database'))
+        return executors[0]
+
+def close_pools() -> None:
+    """closes all connection pools and stops the database executor, should be called on shutdown.
+    Both are created again by the next database access.
+    """
+    with executors_lock:
+        stopped = list(executors)
+        executors.clear()
+    for executor in stopped:
+        executor.shutdown(wait=True)
+    with pools_lock:
+        for pool in pools.values():
+            pool.close()
+        pools.clear()
+
+def get_pool_stats() -> dict[str,dict]:
+    """statistics of all connection pools.
+
+    Returns:
+        dict[str,dict]: the stats of each pool, keyed by the database path.
+    """
+    with pools_lock:
+        return {path: pool.stats() for path, pool in pools.items()}
 
 
 @contextmanager
 def database_connection(path=DATABASE_PATH):
-    """returns a db connection, can be used like this:\n
+    """checks out a connection from the pool, can be used like this:\n
     with database_connection() as conn:
         do stuff here
 
@@ -41,48 +130,73 @@ def database_connection(path=DATABASE_PATH):
     Yields:
         sqlite3.Connection: connection to the db.
     """
-    conn = connect(path)
-    try:
+    with get_pool(path).connection() as conn:
         yield conn
-    finally:
-        close_connection(conn)
 
 
 def connect(path=DATABASE_PATH) -> sqlite3.Connection | None:
-    """creates a connection to the database specified in the congig.ini.
+    """creates a new connection to the database and loads mod_spatialite.
+    Use database_connection() to get a pooled connection instead.
 
     Returns:
         sqlite3.Connection: Connection to the sqlite database or None.
     """
-    #threading mode     threadsafety attribute
-    #single-thread 	    0
-    #multi-thread 	    1
-    #serialized 	    3
-
-    if len(conections)>0:
-        return conections.pop()
-
-    if sqlite3.threadsafety == 3:
-        check_same_thread = False
-    else:
-        check_same_thread = True
-
+    # the pool hands a connection to one thread at a time, but not always the same thread
+    # (startup on the main thread, requests on the executor), so the thread check is disabled.
+    # sqlite3 is built in the multi-thread or serialized mode, both allow this.
     conn = None
     try:
         conn = sqlite3.connect(path,
-                               check_same_thread=check_same_thread,
+                               check_same_thread=False,
                                detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
         conn.enable_load_extension(True)
         if os.name == 'nt':
             conn.load_extension("mod_spatialite") # windows
         else:
             conn.load_extension("mod_spatialite.so.7.1.0") # fix for docker image
+        apply_connection_profile(conn)
 
     except sqlite3.Error as error:
         print(error)
 
     return conn
 
+def apply_connection_profile(conn:sqlite3.Connection) -> None:
+    """sets the PRAGMAs of CONNECTION_PRAGMAS on the connection.
+    Empty values keep the sqlite default.
+
+    Args:
+        conn (sqlite3.Connection): Connection to a sqlite database.
+
+    Raises:
+        ValueError: if a configured value is not a plain word or number.
+    """
+    for pragma, value in CONNECTION_PRAGMAS.items():
+        if not value:
+            continue
+        if not re.match(PRAGMA_VALUE_REGEX, value):
+            raise ValueError(f'invalid value for PRAGMA {pragma}: {value}')
+        conn.execute(f'PRAGMA {pragma} = {value};').fetchall()
+
+def get_connection_profile(path=DATABASE_PATH) -> dict:
+    """reads the PRAGMAs of CONNECTION_PRAGMAS back from a pooled connection.
+
+    Args:
+        path (str, optional): path to db. Defaults to DATABASE_PATH.
+
+    Returns:
+        dict: the active value of each PRAGMA.
+    """
+    profile = {}
+    try:
+        with database_connection(path) as conn:
+            for pragma in CONNECTION_PRAGMAS:
+                fetched = conn.execute(f'PRAGMA {pragma};').fetchone()
+                profile[pragma] = fetched[0] if fetched else None
+    except sqlite3.Error as exception:
+        print(exception)
+    return profile
+
 def close_connection(conn:sqlite3.Connection)->None:
     """closes active sqlite3 connection.
 
@@ -90,11 +204,7 @@ def close_connection(conn:sqlite3.Connection)->None:
         conn (sqlite3.Connection): Connection to a sqlite database.
     """
     try:
-        if len(conections)>3:
-            conn.close()
-        else:
-            conections.append(conn)
-
+        conn.close()
     except sqlite3.Error as exception:
         print(exception)
 
@@ -216,6 +326,27 @@ def update(update_sql:str,update_tuple=None) -> bool:
         print(exception)
     return False
 
+def updatemany(update_sql:str,update_tuples) -> bool:
+    """runs the update for every tuple in one transaction.
+
+    Args:
+        update_sql (str): the sql used to update.
+        update_tuples (List[tuple]): one tuple with data per update.
+
+    Returns:
+        bool: True if all updates were successful.
+    """
+    try:
+        with database_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(update_sql,update_tuples)
+            conn.commit()
+            cursor.close()
+            return True
+    except sqlite3.Error as exception:
+        print(exception)
+    return False
+
 def fetch_one(fetch_sql:str,fetch_tuple=None):
     """fetches one result.
 
@@ -266,6 +397,36 @@ def fetch_all(fetch_sql:str,fetch_tuple=None):
 
     return None
 
+def fetch_batches(fetch_sql:str,fetch_tuple=None,size:int=FETCH_SIZE) -> Iterator[List[tuple]]:
+    """fetches the results batch by batch with fetchmany, so only one batch is in memory.
+    The connection stays checked out until the generator is exhausted or closed.
+
+    Args:
+        fetch_sql (str): sql to get the desired data.
+        fetch_tuple (tuple): the tuple with the data that should be fetched.
+        size (int, optional): rows per batch. Defaults to FETCH_SIZE.
+
+    Yields:
+        List[tuple]: the next batch of rows, never empty.
+    """
+    try:
+        with database_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if fetch_tuple:
+                    cursor.execute(fetch_sql,fetch_tuple)
+                else:
+                    cursor.execute(fetch_sql)
+                while True:
+                    batch = cursor.fetchmany(size)
+                    if len(batch) == 0:
+                        break
+                    yield batch
+            finally:
+                cursor.close()
+    except sqlite3.Error as exception:
+        print(exception)
+
 def check_fetch(fetch_sql:str,fetch_tuple=None):
     """checks wrther tuple exists in db.
 
@@ -326,6 +487,54 @@ def create_where_clause_statement(clmname:str,eqator:str='',questionmark:str='?'
     """
     return f'{clmname} {eqator} {questionmark}'
 
+def create_spatial_index_clause(table:str,
+                                column:str,
+                                search_frame:str='GeomFromGeoJSON(?)'):
+    """creates sql that prefilters the rows of table through the R*Tree spatial index of column.
+    Only the bounding boxes are compared, combine it with an intersection clause.
+
+    Args:
+        table (str): name of the table with the spatial index.
+        column (str): name of the indexed geometry column.
+        search_frame (str, optional): the geometry to search for. Defaults to 'GeomFromGeoJSON(?)'.
+
+    Returns:
+        str: the sql clause.
+    """
+    return f'''{table}.ROWID IN (SELECT ROWID FROM SpatialIndex
+                WHERE f_table_name = '{table}'
+                AND f_geometry_column = '{column}'
+                AND search_frame = {search_frame})'''
+
+def create_keyset_clause(timestamp_column:str, id_column:str) -> str:
+    """creates sql that only selects rows older than the given (timestamp, id) key.
+    Used for keyset pagination of queries ordered by timestamp DESC, id DESC, see get_keyset.
+
+    Args:
+        timestamp_column (str): the timestamp column.
+        id_column (str): the id column, that breaks ties between equal timestamps.
+
+    Returns:
+        str: the sql clause, takes the timestamp and the id as parameters.
+    """
+    return f'({timestamp_column}, {id_column}) < (?, ?)'
+
+def get_keyset(timestamp:datetime.datetime | int | str, row_id:int) -> tuple[str, int]:
+    """key of a fetched row for keyset pagination, see create_keyset_clause.
+    The timestamp is formatted like sqlite3 stores datetimes, so it compares as stored.
+    Epoch milliseconds (see database.epoch_timestamps) are compared as integers by sqlite.
+
+    Args:
+        timestamp (datetime.datetime | int | str): the fetched timestamp.
+        row_id (int): the fetched id.
+
+    Returns:
+        tuple[str, int]: the key.
+    """
+    if isinstance(timestamp, datetime.datetime):
+        timestamp = timestamp.isoformat(' ')
+    return (str(timestamp), row_id)
+
 def create_intersection_clause(first_geom:str,second_geom:str='GeomFromGeoJSON(?)'):
     """creates sql that checks for an intersection of the given geoms.
 
@@ -337,3 +546,101 @@ def create_intersection_clause(first_geom:str,second_geom:str='GeomFromGeoJSON(?
         _type_: _description_
     """
     return f'ST_Intersects({first_geom},{second_geom})'
+
+async def run_async(func, *args, **kwargs):
+    """runs a blocking database function on the database executor and awaits its result.
+
+    Args:
+        func (Callable): the function to run.
+        *args: positional arguments for func.
+        **kwargs: keyword arguments for func.
+
+    Returns:
+        the return value of func.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+async def insert_async(insert_sql:str,insert_tuple=None) -> int | None:
+    """awaitable version of insert.
+
+    Args:
+        insert_sql (str): the sql used to insert.
+        insert_tuple (tuple): the tuple with the data that should be inserted.
+
+    Returns:
+        int | None: the id of the inserted item.
+    """
+    return await run_async(insert, insert_sql, insert_tuple)
+
+async def insertmany_async(insert_sql:str,insert_tuple=None) -> int | None:
+    """awaitable version of insertmany.
+
+    Args:
+        insert_sql (str): the sql used to insert.
+        insert_tuple (tuple): the tuple with the data that should be inserted.
+
+    Returns:
+        int | None: number of inserted rows.
+    """
+    return await run_async(insertmany, insert_sql, insert_tuple)
+
+async def update_async(update_sql:str,update_tuple=None) -> bool:
+    """awaitable version of update.
+
+    Args:
+        update_sql (str): the sql used to update.
+        update_tuple (tuple): the tuple with the data that should be updated.
+
+    Returns:
+        bool: True if update was successful.
+    """
+    return await run_async(update, update_sql, update_tuple)
+
+async def updatemany_async(update_sql:str,update_tuples) -> bool:
+    """awaitable version of updatemany.
+
+    Args:
+        update_sql (str): the sql used to update.
+        update_tuples (List[tuple]): one tuple with data per update.
+
+    Returns:
+        bool: True if all updates were successful.
+    """
+    return await run_async(updatemany, update_sql, update_tuples)
+
+async def fetch_one_async(fetch_sql:str,fetch_tuple=None):
+    """awaitable version of fetch_one.
+
+    Args:
+        fetch_sql (str): sql to get the desired data.
+        fetch_tuple (tuple): the tuple with the data that should be fetched.
+
+    Returns:
+        List[T]: list with all fetched attributes.
+    """
+    return await run_async(fetch_one, fetch_sql, fetch_tuple)
+
+async def fetch_all_async(fetch_sql:str,fetch_tuple=None):
+    """awaitable version of fetch_all.
+
+    Args:
+        fetch_sql (str): sql to get the desired data.
+        fetch_tuple (tuple): the tuple with the data that should be fetched.
+
+    Returns:
+        List[List[T]]: list with all fetched attributes.
+    """
+    return await run_async(fetch_all, fetch_sql, fetch_tuple)
+
+async def check_fetch_async(fetch_sql:str,fetch_tuple=None):
+    """awaitable version of check_fetch.
+
+    Args:
+        fetch_sql (str): sql to get the desired data.
+        fetch_tuple (tuple): the tuple with the data that should be fetched.
+
+    Returns:
+        bool: True if a row exists.
+    """
+    return await run_async(check_fetch, fetch_sql, fetch_tuple)
@@ -1,12 +1,14 @@
 """funcs to read and write on the drone_event table in database."""
 import datetime
-from typing import List
+import json
+from typing import Iterator, List
 
-import pytz
-from api.dependencies.classes import DroneEvent, EventType, FireRisk
-from database.database import TIMEZONE, fetched_match_class
+from api.dependencies.classes import DroneEvent, DroneEventStruct, EventType, FireRisk
 import database.database as db
-from database import drone_updates_table
+from database import drone_updates_table, zone_risk_table
+from database.epoch_timestamps import SELECT_TIMESTAMP, TIMESTAMP_COLUMN, to_epoch_ms, to_stored
+from database.row_decoding import RowDecoder, to_enum, to_isoformat, to_timezone
+from database.zone_locator import zone_locator
 
 EVENT_ID = 'id'
 DRONE_ID = 'drone_id'
@@ -16,6 +18,7 @@ CONFIDENCE = 'confidence'
 PICTURE_PATH='picture_path'
 CSV_FILE_PATH= 'csv_file_path'
 COORDINATES= 'coordinates'
+ZONE_ID = 'zone_id'
 
 CREATE_DRONE_EVENT_TABLE = f'''CREATE TABLE drone_event
 (
@@ -26,38 +29,79 @@ CREATE_DRONE_EVENT_TABLE = f'''CREATE TABLE drone_event
 {CONFIDENCE}   integer NOT NULL,
 {PICTURE_PATH}   text,
 {CSV_FILE_PATH}  text ,
+{ZONE_ID}      integer,
+ts             integer,
 PRIMARY KEY ({EVENT_ID}),
-FOREIGN KEY ({DRONE_ID}) REFERENCES drones (id)
+FOREIGN KEY ({DRONE_ID}) REFERENCES drones (id),
+FOREIGN KEY ({ZONE_ID}) REFERENCES zones (id)
 );
 
 CREATE INDEX drone_event_FK_1 ON drone_event ({DRONE_ID});
+CREATE INDEX drone_event_FK_2 ON drone_event ({ZONE_ID});
 CREATE INDEX drone_event_AK_1 ON drone_event ({TIMESTAMP});
-SELECT AddGeometryColumn('drone_event', '{COORDINATES}', 4326, 'POINT', 'XY');'''
+CREATE INDEX drone_event_AK_2 ON drone_event ({DRONE_ID}, {TIMESTAMP});
+CREATE INDEX drone_event_AK_3 ON drone_event ({ZONE_ID}, {TIMESTAMP}, {EVENT_TYPE}, {CONFIDENCE});
+SELECT AddGeometryColumn('drone_event', '{COORDINATES}', 4326, 'POINT', 'XY');
+SELECT CreateSpatialIndex('drone_event', '{COORDINATES}');'''
 
+# ts is bound with the timestamp, see epoch_timestamps.to_epoch_ms.
 CREATE_ENTRY = '''
-INSERT INTO drone_event (drone_id,timestamp,coordinates,event_type,confidence,picture_path,csv_file_path) 
-VALUES (? ,?,MakePoint(?, ?, 4326)  ,? ,?,?,?);'''
-
-GET_ENTRY = '''
-SELECT drone_event.id, drone_id,timestamp, X(coordinates), Y(coordinates),event_type,confidence,picture_path,csv_file_path, zones.id
+INSERT INTO drone_event (drone_id,timestamp,ts,coordinates,event_type,confidence,picture_path,csv_file_path,zone_id)
+VALUES (? ,?,?,MakePoint(?, ?, 4326)  ,? ,?,?,?,?);'''
+
+# resolves the zone of events that were stored before their zone existed.
+ASSIGN_ZONE_IDS = '''
+UPDATE drone_event
+SET zone_id = (
+    SELECT zones.id FROM zones
+    WHERE ST_Intersects(zones.area, drone_event.coordinates)
+    AND zones.ROWID IN (
+        SELECT ROWID FROM SpatialIndex
+        WHERE f_table_name = 'zones' AND f_geometry_column = 'area'
+        AND search_frame = drone_event.coordinates)
+    LIMIT 1)
+WHERE zone_id IS NULL;'''
+
+# ORDER BY timestamp refers to the selected column, see epoch_timestamps.SELECT_TIMESTAMP.
+GET_ENTRY = f'''
+SELECT drone_event.id, drone_id,{SELECT_TIMESTAMP}, X(coordinates), Y(coordinates),event_type,confidence,picture_path,csv_file_path, drone_event.zone_id
 FROM drone_event
-LEFT JOIN zones ON ST_Intersects(zones.area, coordinates)
-JOIN territory_zones ON zones.id = territory_zones.zone_id
+JOIN territory_zones ON territory_zones.zone_id = drone_event.zone_id
 JOIN territories ON territories.id = territory_zones.territory_id
-{}
-ORDER BY timestamp DESC;'''
+{{}}
+ORDER BY timestamp DESC, drone_event.id DESC{{{{}}}};'''
+
+LIMIT_CLAUSE = ' LIMIT ?'
+
+# column names of the rows of GET_ENTRY, used by the exports.
+EXPORT_COLUMNS = ['id', 'drone_id', 'timestamp', 'lon', 'lat', 'event_type',
+                  'confidence', 'picture_path', 'csv_file_path', 'zone_id']
+
+# decodes the rows of all selects of events, they share the columns of GET_ENTRY.
+EVENT_DECODER = RowDecoder(DroneEvent,
+                           DroneEventStruct,
+                           EXPORT_COLUMNS,
+                           {'timestamp': to_timezone, 'event_type': to_enum(EventType)},
+                           {'timestamp': to_isoformat})
+
+GET_EVENT_IN_ZONE = f'''
+SELECT drone_event.id,drone_id,{SELECT_TIMESTAMP}, X(coordinates), Y(coordinates),event_type,confidence,picture_path,csv_file_path, drone_event.zone_id
+FROM drone_event
+WHERE drone_event.zone_id IS NOT NULL
+AND {TIMESTAMP_COLUMN} > ? AND {TIMESTAMP_COLUMN} < ?;'''
 
-GET_EVENT_IN_ZONE = '''
-SELECT drone_event.id,drone_id,timestamp, X(coordinates), Y(coordinates),event_type,confidence,picture_path,csv_file_path, zones.id
+# events of many zones at once, the zone ids are passed as json array.
+GET_EVENTS_OF_ZONES = f'''
+SELECT drone_event.id,drone_id,{SELECT_TIMESTAMP}, X(coordinates), Y(coordinates),event_type,confidence,picture_path,csv_file_path, drone_event.zone_id
 FROM drone_event
-JOIN zones ON ST_Intersects(zones.area, coordinates)
-AND timestamp > ? AND timestamp < ?;'''
+WHERE drone_event.zone_id IN (SELECT value FROM json_each(?))
+AND {TIMESTAMP_COLUMN} > ?
+ORDER BY timestamp DESC;'''
 
-GET_EVENT_BY_ID = '''
-SELECT drone_event.id,drone_id,timestamp, X(coordinates), Y(coordinates),event_type,confidence,picture_path,csv_file_path, zones.id
+GET_EVENT_BY_ID = f'''
+SELECT drone_event.id,drone_id,{SELECT_TIMESTAMP}, X(coordinates), Y(coordinates),event_type,confidence,picture_path,csv_file_path, drone_event.zone_id
 FROM drone_event
-JOIN zones ON ST_Intersects(zones.area, coordinates)
-AND drone_event.id = ?;'''
+WHERE drone_event.id = ?;'''
 
 
 def create_drone_event_entry(drone_id: int,
@@ -81,20 +125,32 @@ def create_drone_event_entry(drone_id: int,
     Returns:
         bool: True for success, False if something went wrong.
     """
-
+    zone_id = zone_locator.locate(longitude, latitude)
     inserted_id = db.insert(CREATE_ENTRY,
                             (drone_id,
                             timestamp,
+                            to_epoch_ms(timestamp),
                             longitude,
                             latitude,
                             event_type,
                             confidence,
                             picture_path,
-                            csv_file_path))
+                            csv_file_path,
+                            zone_id))
     if inserted_id is not None:
+        zone_risk_table.add_event(zone_id, event_type, confidence, timestamp)
         return True
     return False
 
+def assign_zone_ids() -> bool:
+    """sets the zone of all events, that dont have one yet.
+    Needed after zones were added.
+
+    Returns:
+        bool: True if the update was successful.
+    """
+    return db.update(ASSIGN_ZONE_IDS)
+
 
 def get_event_by_id(event_id: int) -> DroneEvent | None:
     """get the requested drone just by the id
@@ -113,81 +169,152 @@ def get_drone_event(drone_id: int = None,
                     org_id: int = None,
                     polygon: str=None,
                     after: datetime.datetime = None,
-                    before: datetime.datetime = None
-                    ) -> List[DroneEvent] | None:
+                    before: datetime.datetime = None,
+                    as_struct: bool = False
+                    ) -> List[DroneEvent] | List[DroneEventStruct] | None:
     """fetches all entrys that are within the choosen timeframe.
     If only drone_id is set, every entry will be fetched.
+    See get_drone_event_page to fetch them page by page.
 
     Args:
         drone_id (int): the id of the drone.
         after (datetime.datetime): fetches everything after this date (not included)
         before (datetime.datetime): fetches everything before this date (not included)
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
 
     Returns:
         List[DroneData]: List with the fetched data.
     """
-    sql_arr, tuple_arr = drone_updates_table.gernerate_drone_sql(polygon,org_id ,zone_id,drone_id, after, before)
+    return get_drone_event_page(drone_id=drone_id,
+                                zone_id=zone_id,
+                                org_id=org_id,
+                                polygon=polygon,
+                                after=after,
+                                before=before,
+                                as_struct=as_struct)[0]
+
+def get_drone_event_page(drone_id: int = None,
+                         zone_id: int = None,
+                         org_id: int = None,
+                         polygon: str=None,
+                         after: datetime.datetime = None,
+                         before: datetime.datetime = None,
+                         as_struct: bool = False,
+                         limit: int = None,
+                         before_key: tuple[str, int] = None
+                         ) -> tuple[List[DroneEvent] | List[DroneEventStruct] | None,
+                                    tuple[str, int] | None]:
+    """fetches one page of the events, newest first.
+    Takes the same filters as get_drone_event.
+
+    Args:
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
+        limit (int, optional): maximum number of events. Defaults to None, all events.
+        before_key (tuple[str, int], optional): key of the last event of the previous page.
+        Defaults to None, the first page.
+
+    Returns:
+        tuple[List | None, tuple[str, int] | None]: the events (None if no data was found)
+        and the key of the next page (None if this is the last page).
+    """
+    sql_arr, tuple_arr = drone_updates_table.gernerate_drone_sql(polygon,
+                                                                 org_id,
+                                                                 zone_id,
+                                                                 drone_id,
+                                                                 after,
+                                                                 before,
+                                                                 'drone_event',
+                                                                 before_key)
 
     sql = db.add_where_clause(GET_ENTRY, sql_arr)
+    if limit is None:
+        sql = sql.format('')
+    else:
+        sql = sql.format(LIMIT_CLAUSE)
+        tuple_arr.append(limit)
 
     fetched_data = db.fetch_all(
         sql, tuple(tuple_arr)
         )
 
     if fetched_data is None:
-        return None
+        return None, None
+
+    next_key = None
+    if limit is not None and len(fetched_data) == limit:
+        next_key = db.get_keyset(fetched_data[-1][2], fetched_data[-1][0])
+
+    return EVENT_DECODER.decode_all(fetched_data, as_struct), next_key
+
+def export_drone_events(org_id: int,
+                        drone_id: int = None,
+                        after: datetime.datetime = None,
+                        before: datetime.datetime = None) -> Iterator[List[tuple]]:
+    """streams the raw rows of the events of an organization, newest first.
+    The rows are fetched batch by batch (see db.fetch_batches), without building DroneEvents.
+
+    Args:
+        org_id (int): id of the organization.
+        drone_id (int, optional): id of the drone. Defaults to None.
+        after (datetime.datetime, optional): fetches everything after this date (not included)
+        before (datetime.datetime, optional): fetches everything before this date (not included)
+
+    Returns:
+        Iterator[List[tuple]]: batches of rows with the columns of EXPORT_COLUMNS.
+    """
+    sql_arr, tuple_arr = drone_updates_table.gernerate_drone_sql(None,
+                                                                 org_id,
+                                                                 None,
+                                                                 drone_id,
+                                                                 after,
+                                                                 before,
+                                                                 'drone_event')
+    sql = db.add_where_clause(GET_ENTRY, sql_arr).format('')
+    return db.fetch_batches(sql, tuple(tuple_arr))
+
+def get_events_by_zone(zone_ids: List[int],
+                       after: datetime.datetime = datetime.datetime.min,
+                       as_struct: bool = False
+                       ) -> dict[int, List[DroneEvent]]:
+    """fetches the events of all given zones with one query.
+
+    Args:
+        zone_ids (List[int]): ids of the zones.
+        after (datetime.datetime): fetches everything after this date (not included)
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
 
-    output = []
+    Returns:
+        dict[int, List[DroneEvent]]: events per zone id, newest first.
+        Zones without events arent in the dict.
+    """
+    output: dict[int, List[DroneEvent]] = {}
+    if len(zone_ids) == 0:
+        return output
 
-    for drone_event in fetched_data:
-        droneevent_obj = get_obj_from_fetched(drone_event)
-        if droneevent_obj:
-            output.append(droneevent_obj)
+    fetched_data = db.fetch_all(GET_EVENTS_OF_ZONES, (json.dumps(list(zone_ids)), to_stored(after)))
+    if fetched_data is None:
+        return output
+
+    for droneevent_obj in EVENT_DECODER.decode_all(fetched_data, as_struct):
+        output.setdefault(droneevent_obj.zone_id, []).append(droneevent_obj)
     return output
 
-def get_obj_from_fetched(fetched_dronedata) -> DroneEvent | None:
-    """generating DroneData objects with the fetched data.
+def get_obj_from_fetched(fetched_dronedata,
+                         as_struct: bool = False) -> DroneEvent | DroneEventStruct | None:
+    """generating DroneData objects with the fetched data, see EVENT_DECODER.
 
     Args:
         fetched_dronedata: the fetched data from the sqlite cursor.
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
 
     Returns:
         DroneData| None: the generated object.
     """
-    if fetched_match_class(DroneEvent, fetched_dronedata):
-
-        try:
-            longitude = float(fetched_dronedata[3])
-            latitude = float(fetched_dronedata[4])
-        except ValueError:
-            longitude, latitude = None, None
-
-        try:
-            eventtype = EventType(fetched_dronedata[5])
-        except ValueError:
-            eventtype = None
-
-        try:
-            timestamp:datetime.datetime = fetched_dronedata[2]
-            if timestamp is not None:
-                timestamp = timestamp.astimezone(pytz.timezone(TIMEZONE))
-        except ValueError:
-            timestamp = fetched_dronedata[2]
-
-        drone_data_obj = DroneEvent(
-            id=fetched_dronedata[0],
-            drone_id=fetched_dronedata[1],
-            timestamp=timestamp,
-            lon =longitude,
-            lat =latitude,
-            event_type=eventtype,
-            confidence=fetched_dronedata[6],
-            picture_path=fetched_dronedata[7],
-            csv_file_path=fetched_dronedata[8],
-            zone_id=fetched_dronedata[9]
-        )
-        return drone_data_obj
-    return None
+    return EVENT_DECODER.decode(fetched_dronedata, as_struct)
 
 
 def calculate_firerisk(events: List[DroneEvent]) -> tuple[FireRisk,FireRisk,FireRisk]:
@@ -214,6 +341,19 @@ def calculate_firerisk(events: List[DroneEvent]) -> tuple[FireRisk,FireRisk,Fire
             if firerisk < event.confidence:
                 firerisk = event.confidence
 
+    return get_firerisk(smokerisk, firerisk)
+
+def get_firerisk(smokerisk: int, firerisk: int) -> tuple[FireRisk,FireRisk,FireRisk]:
+    """calculates the firerisk from the highest smoke and fire confidence,
+    see calculate_firerisk.
+
+    Args:
+        smokerisk (int): highest confidence of the smoke events.
+        firerisk (int): highest confidence of the fire events.
+
+    Returns:
+        tuple[FireRisk,FireRisk,FireRisk]: tuple with the calculated firerisk. (gernal, fire, smoke)
+    """
     try:
         calculated_enum = round(smokerisk/100 * 4)
         calculated_enum = min(calculated_enum, 4)
@@ -241,3 +381,53 @@ def calculate_firerisk(events: List[DroneEvent]) -> tuple[FireRisk,FireRisk,Fire
         return FireRisk.LOW, fire_risk, smoke_risk
 
     return FireRisk.VERY_LOW, fire_risk, smoke_risk
+
+async def create_drone_event_entry_async(drone_id: int,
+                                         timestamp: datetime.datetime,
+                                         longitude: float,
+                                         latitude: float,
+                                         event_type: int,
+                                         confidence: int,
+                                         picture_path: str | None,
+                                         csv_file_path: str | None) -> bool:
+    """awaitable version of create_drone_event_entry, runs on the database executor.
+
+    Returns:
+        bool: see create_drone_event_entry.
+    """
+    return await db.run_async(create_drone_event_entry,
+                              drone_id,
+                              timestamp,
+                              longitude,
+                              latitude,
+                              event_type,
+                              confidence,
+                              picture_path,
+                              csv_file_path)
+
+async def get_event_by_id_async(event_id:int) -> DroneEvent | None:
+    """awaitable version of get_event_by_id, runs on the database executor.
+
+    Returns:
+        DroneEvent | None: see get_event_by_id.
+    """
+    return await db.run_async(get_event_by_id, event_id)
+
+async def get_drone_event_async(**kwargs) -> List[DroneEvent] | None:
+    """awaitable version of get_drone_event, runs on the database executor.
+    Takes the same arguments as get_drone_event.
+
+    Returns:
+        List[DroneEvent] | None: see get_drone_event.
+    """
+    return await db.run_async(get_drone_event, **kwargs)
+
+async def get_drone_event_page_async(**kwargs) -> tuple[List[DroneEvent] | None,
+                                                         tuple[str, int] | None]:
+    """awaitable version of get_drone_event_page, runs on the database executor.
+    Takes the same arguments as get_drone_event_page.
+
+    Returns:
+        tuple[List[DroneEvent] | None, tuple[str, int] | None]: see get_drone_event_page.
+    """
+    return await db.run_async(get_drone_event_page, **kwargs)
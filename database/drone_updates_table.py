@@ -1,75 +1,253 @@
 """DB functions for drone updates"""
 import datetime
-from typing import List
-import pytz
-from shapely.geometry import Point, LineString, mapping
-from api.dependencies.classes import DroneUpdate, DroneUpdateWithRoute
-from database.database import TIMEZONE, fetched_match_class
+import sqlite3
+from typing import Iterator, List
+import numpy
+import shapely
+from shapely.geometry import Point, mapping
+from api.dependencies.classes import (DroneUpdate,
+                                     DroneUpdateStruct,
+                                     DroneUpdateWithRoute,
+                                     DroneUpdateWithRouteStruct,
+                                     RouteSimplification)
 import database.database as db
+from database.epoch_timestamps import (TIMESTAMP_COLUMN, TIMESTAMP_FIELDS, to_epoch_ms, to_epoch_seconds,
+                                       to_stored)
+from database.timestamps import to_utc
+from database.row_decoding import RowDecoder, to_isoformat, to_timezone
+from database.zone_locator import zone_locator
 
 
+# AUTOINCREMENT, so the ids of purged updates arent reused, see database.telemetry_retention.
 CREATE_DRONE_DATA_TABLE = '''CREATE TABLE drone_data
 (
-id           integer NOT NULL ,
+id           integer NOT NULL PRIMARY KEY AUTOINCREMENT ,
 drone_id       integer NOT NULL ,
 timestamp    timestamp NOT NULL ,
 flight_range   real,
 flight_time    real,
-PRIMARY KEY (id),
-FOREIGN KEY (drone_id) REFERENCES drones (id)
+zone_id        integer,
+ts             integer,
+FOREIGN KEY (drone_id) REFERENCES drones (id),
+FOREIGN KEY (zone_id) REFERENCES zones (id)
 );
 
 CREATE INDEX drone_data_FK_1 ON drone_data (drone_id);
+CREATE INDEX drone_data_FK_2 ON drone_data (zone_id);
 CREATE INDEX drone_data_AK_1 ON drone_data (timestamp);
-SELECT AddGeometryColumn('drone_data', 'coordinates', 4326, 'POINT', 'XY');'''
+CREATE INDEX drone_data_AK_2 ON drone_data (drone_id, timestamp);
+CREATE INDEX drone_data_AK_3 ON drone_data (zone_id, timestamp);
+SELECT AddGeometryColumn('drone_data', 'coordinates', 4326, 'POINT', 'XY');
+SELECT CreateSpatialIndex('drone_data', 'coordinates');'''
+
+# downsampled updates that are older than the retention horizon, see database.telemetry_retention.
+# the rows keep the id of the update they were sampled from, unique across both tables.
+CREATE_DRONE_DATA_ARCHIVE_TABLE = '''CREATE TABLE IF NOT EXISTS drone_data_archive
+(
+id           integer NOT NULL ,
+drone_id       integer NOT NULL ,
+timestamp    timestamp NOT NULL ,
+flight_range   real,
+flight_time    real,
+zone_id        integer,
+ts             integer,
+PRIMARY KEY (id),
+FOREIGN KEY (drone_id) REFERENCES drones (id),
+FOREIGN KEY (zone_id) REFERENCES zones (id)
+);
+
+CREATE INDEX IF NOT EXISTS drone_data_archive_AK_1 ON drone_data_archive (timestamp);
+CREATE INDEX IF NOT EXISTS drone_data_archive_AK_2 ON drone_data_archive (drone_id, timestamp);
+CREATE INDEX IF NOT EXISTS drone_data_archive_AK_3 ON drone_data_archive (zone_id, timestamp);
+SELECT AddGeometryColumn('drone_data_archive', 'coordinates', 4326, 'POINT', 'XY')
+WHERE NOT EXISTS (SELECT 1 FROM geometry_columns
+                  WHERE f_table_name = 'drone_data_archive' AND f_geometry_column = 'coordinates');
+SELECT CreateSpatialIndex('drone_data_archive', 'coordinates')
+WHERE NOT EXISTS (SELECT 1 FROM geometry_columns
+                  WHERE f_table_name = 'drone_data_archive' AND f_geometry_column = 'coordinates'
+                  AND spatial_index_enabled = 1);'''
+
+HOT_TABLE = 'drone_data'
+ARCHIVE_TABLE = 'drone_data_archive'
+
+# the reads span all partitions, new updates are only written to the hot table.
+PARTITIONS = [HOT_TABLE, ARCHIVE_TABLE]
+
+# one row per drone with its latest update, kept up to date by triggers on drone_data,
+# so listings dont have to aggregate the whole telemetry history.
+# updates that arrive out of order dont overwrite a newer position.
+CREATE_DRONE_LATEST_TABLE = '''CREATE TABLE IF NOT EXISTS drone_latest
+(
+drone_id       integer NOT NULL ,
+drone_data_id  integer NOT NULL ,
+timestamp    timestamp NOT NULL ,
+flight_range   real,
+flight_time    real,
+zone_id        integer,
+PRIMARY KEY (drone_id),
+FOREIGN KEY (drone_id) REFERENCES drones (id),
+FOREIGN KEY (zone_id) REFERENCES zones (id)
+);
+
+CREATE INDEX IF NOT EXISTS drone_latest_FK_1 ON drone_latest (zone_id);
+SELECT AddGeometryColumn('drone_latest', 'coordinates', 4326, 'POINT', 'XY')
+WHERE NOT EXISTS (SELECT 1 FROM geometry_columns
+                  WHERE f_table_name = 'drone_latest' AND f_geometry_column = 'coordinates');
+
+CREATE TRIGGER IF NOT EXISTS drone_data_latest_insert AFTER INSERT ON drone_data
+BEGIN
+    INSERT INTO drone_latest (drone_id,drone_data_id,timestamp,coordinates,flight_range,flight_time,zone_id)
+    VALUES (NEW.drone_id,NEW.id,NEW.timestamp,NEW.coordinates,NEW.flight_range,NEW.flight_time,NEW.zone_id)
+    ON CONFLICT (drone_id) DO UPDATE SET
+        drone_data_id = excluded.drone_data_id,
+        timestamp = excluded.timestamp,
+        coordinates = excluded.coordinates,
+        flight_range = excluded.flight_range,
+        flight_time = excluded.flight_time,
+        zone_id = excluded.zone_id
+    WHERE excluded.timestamp >= drone_latest.timestamp;
+END;
+
+CREATE TRIGGER IF NOT EXISTS drone_data_latest_zone AFTER UPDATE OF zone_id ON drone_data
+BEGIN
+    UPDATE drone_latest SET zone_id = NEW.zone_id WHERE drone_data_id = NEW.id;
+END;'''
+
+# fills drone_latest from the stored history, used for databases without the table.
+FILL_DRONE_LATEST = '''INSERT INTO drone_latest
+                (drone_id,drone_data_id,timestamp,coordinates,flight_range,flight_time,zone_id)
+                SELECT drone_id, id, MAX(timestamp), coordinates, flight_range, flight_time, zone_id
+                FROM drone_data
+                GROUP BY drone_id
+                ON CONFLICT (drone_id) DO UPDATE SET
+                    drone_data_id = excluded.drone_data_id,
+                    timestamp = excluded.timestamp,
+                    coordinates = excluded.coordinates,
+                    flight_range = excluded.flight_range,
+                    flight_time = excluded.flight_time,
+                    zone_id = excluded.zone_id
+                WHERE excluded.timestamp >= drone_latest.timestamp;'''
+
+GET_LATEST = '''SELECT
+                drone_data_id,
+                drone_id,
+                timestamp,
+                flight_range,
+                flight_time,
+                X(coordinates),
+                Y(coordinates),
+                zone_id
+                FROM drone_latest
+                WHERE drone_id = ?;'''
 
+# ts is bound with the timestamp, see epoch_timestamps.to_epoch_ms.
 CREATE_ENTRY = '''INSERT INTO drone_data
                 (drone_id,
                 timestamp,
+                ts,
                 coordinates,
                 flight_range,
-                flight_time) 
-                VALUES (? ,?,MakePoint(?, ?, 4326) ,? ,?);'''
-
+                flight_time,
+                zone_id)
+                VALUES (? ,?,?,MakePoint(?, ?, 4326) ,? ,?,?);'''
+
+# resolves the zone of rows that were stored before their zone existed.
+ASSIGN_PARTITION_ZONE_IDS = '''UPDATE {table}
+                    SET zone_id = (
+                        SELECT zones.id FROM zones
+                        WHERE ST_Intersects(zones.area, {table}.coordinates)
+                        AND zones.ROWID IN (
+                            SELECT ROWID FROM SpatialIndex
+                            WHERE f_table_name = 'zones' AND f_geometry_column = 'area'
+                            AND search_frame = {table}.coordinates)
+                        LIMIT 1)
+                    WHERE zone_id IS NULL;'''
+
+ASSIGN_ZONE_IDS = ASSIGN_PARTITION_ZONE_IDS.format(table=HOT_TABLE)
+
+# select of one partition, combined by span_partitions.
+# {timestamp} and {ts} are the columns of TIMESTAMP_FIELDS.
 GET_ENTRY ='''SELECT
-                drone_data.id,
+                {table}.id AS id,
                 drone_id,
-                timestamp,
+                {timestamp},
                 flight_range,
                 flight_time,
                 X(coordinates),
                 Y(coordinates),
-                zones.id
-                FROM drone_data
-                LEFT JOIN zones ON ST_Intersects(zones.area, coordinates)
-                JOIN territory_zones ON zones.id = territory_zones.zone_id
+                {table}.zone_id
+                FROM {table}
+                JOIN territory_zones ON territory_zones.zone_id = {table}.zone_id
                 JOIN territories ON territories.id = territory_zones.territory_id
-                {}
-                ORDER BY drone_id, timestamp DESC;'''
-
-GET_UPDATE_IN_ZONE = '''
-SELECT drone_data.id,drone_id,timestamp,flight_range,flight_time, X(coordinates), Y(coordinates),zones.id
-FROM drone_data
-LEFT JOIN zones ON ST_Intersects(zones.area, coordinates)
-WHERE ST_Intersects(drone_data.coordinates, GeomFromGeoJSON(?)) 
-AND timestamp > ? AND timestamp < ?
-ORDER BY timestamp DESC;'''
-
-GET_UPDATE_IN_ORGA_AREA = '''
-SELECT drone_data.id,drone_id,timestamp,flight_range,flight_time, X(coordinates), Y(coordinates),zones.id
-FROM drone_data
-LEFT JOIN zones ON ST_Intersects(zones.area, coordinates)
-JOIN territory_zones ON zones.id = territory_zones.zone_id
+                {{}}'''
+
+# decodes the rows of GET_ENTRY, GET_LATEST and the other selects of updates.
+UPDATE_DECODER = RowDecoder(DroneUpdate,
+                            DroneUpdateStruct,
+                            ['id', 'drone_id', 'timestamp', 'flight_range', 'flight_time',
+                             'lon', 'lat', 'zone_id'],
+                            {'timestamp': to_timezone},
+                            {'timestamp': to_isoformat})
+
+# bisection steps of simplify_to_max_points to find the tolerance for max_points.
+ROUTE_SIMPLIFY_ITERATIONS = 20
+
+# routes are grouped by drone, pages are ordered by the keyset, see db.create_keyset_clause.
+ORDER_BY_DRONE = 'drone_id, timestamp DESC'
+ORDER_BY_PAGE = 'timestamp DESC, id DESC LIMIT ?'
+ORDER_BY_EXPORT = 'timestamp DESC, id DESC'
+
+# column names of the rows of GET_ENTRY, used by the exports.
+EXPORT_COLUMNS = ['id', 'drone_id', 'timestamp', 'flight_range', 'flight_time', 'lon', 'lat', 'zone_id']
+
+UPDATE_IN_ZONE = '''
+SELECT {table}.id AS id,drone_id,{timestamp},flight_range,flight_time, X(coordinates), Y(coordinates),{table}.zone_id
+FROM {table}
+WHERE ST_Intersects({table}.coordinates, GeomFromGeoJSON(?))
+AND {table}.ROWID IN (
+    SELECT ROWID FROM SpatialIndex
+    WHERE f_table_name = '{table}' AND f_geometry_column = 'coordinates'
+    AND search_frame = GeomFromGeoJSON(?))
+AND {ts} > ? AND {ts} < ?'''
+
+UPDATE_IN_ORGA_AREA = '''
+SELECT {table}.id AS id,drone_id,{timestamp},flight_range,flight_time, X(coordinates), Y(coordinates),{table}.zone_id
+FROM {table}
+JOIN territory_zones ON territory_zones.zone_id = {table}.zone_id
 JOIN territories ON territories.id = territory_zones.territory_id
 WHERE territories.orga_id=?
-AND timestamp > ?
-AND timestamp < ?
-ORDER BY timestamp DESC;'''
+AND {ts} > ?
+AND {ts} < ?'''
+
+ACTIVE_DRONE = ''' SELECT drone_id
+                    FROM {table}
+                    WHERE ST_Intersects({table}.coordinates, GeomFromGeoJSON(?))
+                    AND {table}.ROWID IN (
+                        SELECT ROWID FROM SpatialIndex
+                        WHERE f_table_name = '{table}' AND f_geometry_column = 'coordinates'
+                        AND search_frame = GeomFromGeoJSON(?))
+                    AND {ts} > ?'''
+
+
+def union_partitions(select_sql:str, compound:str = 'UNION ALL') -> str:
+    """combines the select of every partition of PARTITIONS.
+    The parameters of the select have to be passed once per partition.
+
+    Args:
+        select_sql (str): select of one partition, {table} is replaced by the partition.
+        compound (str, optional): compound operator. Defaults to 'UNION ALL'.
+
+    Returns:
+        str: the combined select, without ORDER BY.
+    """
+    return f'\n{compound}\n'.join(select_sql.format(table=table, **TIMESTAMP_FIELDS)
+                                   for table in PARTITIONS)
+
+GET_UPDATE_IN_ZONE = union_partitions(UPDATE_IN_ZONE) + '\nORDER BY timestamp DESC;'
+
+GET_UPDATE_IN_ORGA_AREA = union_partitions(UPDATE_IN_ORGA_AREA) + '\nORDER BY timestamp DESC;'
 
-ACTIVE_DRONES = ''' SELECT DISTINCT	drone_id
-                    FROM drone_data
-                    WHERE ST_Intersects(drone_data.coordinates, GeomFromGeoJSON(?))
-                    AND timestamp > ?;'''
+ACTIVE_DRONES = union_partitions(ACTIVE_DRONE, 'UNION') + ';'
 
 
 def create_drone_update(drone_id:int,
@@ -90,72 +268,231 @@ def create_drone_update(drone_id:int,
 
     Returns:
         bool: True for success, False if something went wrong.
+        The timestamp is stored in naive UTC, see timestamps.to_utc.
     """
+    timestamp = to_utc(timestamp)
     inserted_id = db.insert(CREATE_ENTRY,
                                 (
                                 drone_id,
                                 timestamp,
+                                to_epoch_ms(timestamp),
                                 longitude,
                                 latitude,
                                 flight_range,
-                                flight_time
+                                flight_time,
+                                zone_locator.locate(longitude, latitude)
                                 )
                             )
     if inserted_id:
         return True
     return False
 
+def create_drone_updates(drone_id:int,
+                         updates:List[tuple]) -> List[int | None] | None:
+    """store many updates of one drone in a single transaction.
+
+    Args:
+        drone_id (int): id of the drone.
+        updates (List[tuple]): (timestamp, longitude, latitude, flight_range, flight_time)
+            tuple per update.
+
+    Returns:
+        List[int | None] | None: the zone id of every stored update, None if nothing was stored.
+    """
+    return create_drone_update_rows([(drone_id, *update) for update in updates])
+
+def create_drone_update_rows(updates:List[tuple]) -> List[int | None] | None:
+    """store updates of any number of drones in a single transaction.
+
+    Args:
+        updates (List[tuple]): (drone_id, timestamp, longitude, latitude, flight_range, flight_time)
+            tuple per update.
+
+    Returns:
+        List[int | None] | None: the zone id of every stored update, None if nothing was stored.
+        The timestamps are stored in naive UTC, see timestamps.to_utc.
+    """
+    if len(updates) == 0:
+        return []
+
+    zone_ids = zone_locator.locate_many([update[2] for update in updates],
+                                        [update[3] for update in updates])
+    timestamps = [to_utc(update[1]) for update in updates]
+    to_db = [(update[0], timestamp, to_epoch_ms(timestamp), *update[2:], zone_id)
+             for update, timestamp, zone_id in zip(updates, timestamps, zone_ids)]
+    try:
+        rowcount = db.insertmany(CREATE_ENTRY, to_db)
+    except sqlite3.Error as exception:
+        print(exception)
+        return None
+
+    if rowcount != len(to_db):
+        return None
+    return zone_ids
+
+def assign_zone_ids() -> bool:
+    """sets the zone of all updates, that dont have one yet.
+    Needed after zones were added.
+
+    Returns:
+        bool: True if the update was successful.
+    """
+    return all(db.update(ASSIGN_PARTITION_ZONE_IDS.format(table=table)) for table in PARTITIONS)
+
 def get_drone_updates(  polygon:str = None,
                         drone_id:int=None,
                         orga_id:int=None,
                         zone_id:int=None,
                         after:datetime.datetime=None,
                         before:datetime.datetime=None,
-                        get_coords_only:bool = False
+                        get_coords_only:bool = False,
+                        as_struct:bool = False
                         ) -> List[DroneUpdate] | DroneUpdateWithRoute:
     """fetches all entrys that are within the choosen timeframe.
     If only drone_id is set, every entry will be fetched.
+    See get_drone_updates_page to fetch them page by page.
 
     Args:
         drone_id (int): id of the drone.
         after (datetime.datetime): fetches everything after this date (not included)
         before (datetime.datetime): fetches everything before this date (not included)
+        get_coords_only (bool, optional): returns one DroneUpdateWithRoute per drone. Defaults to False.
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
 
     Returns:
         List[DroneData]: List with the fetched data.
         None: if no data was found.
     """
+    return get_drone_updates_page(polygon=polygon,
+                                  drone_id=drone_id,
+                                  orga_id=orga_id,
+                                  zone_id=zone_id,
+                                  after=after,
+                                  before=before,
+                                  get_coords_only=get_coords_only,
+                                  as_struct=as_struct)[0]
+
+def get_drone_updates_page(polygon:str = None,
+                           drone_id:int=None,
+                           orga_id:int=None,
+                           zone_id:int=None,
+                           after:datetime.datetime=None,
+                           before:datetime.datetime=None,
+                           get_coords_only:bool = False,
+                           as_struct:bool = False,
+                           limit:int = None,
+                           before_key:tuple[str, int] = None,
+                           simplification:RouteSimplification = None
+                           ) -> tuple[List[DroneUpdate] | List[DroneUpdateWithRoute] | None,
+                                      tuple[str, int] | None]:
+    """fetches one page of the updates, newest first.
+    Takes the same filters as get_drone_updates.
 
-    sql_arr, tuple_arr = gernerate_drone_sql(polygon,
-                                             orga_id,
-                                             zone_id,
-                                             drone_id,
-                                             after,
-                                             before)
+    Args:
+        get_coords_only (bool, optional): returns one DroneUpdateWithRoute per drone,
+        built from the updates of this page. Defaults to False.
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
+        limit (int, optional): maximum number of updates. Defaults to None, all updates.
+        before_key (tuple[str, int], optional): key of the last update of the previous page.
+        Defaults to None, the first page.
+        simplification (RouteSimplification, optional): simplifies the routes,
+        only used with get_coords_only. Defaults to None.
 
-    sql = db.add_where_clause(GET_ENTRY, sql_arr)
+    Returns:
+        tuple[List | None, tuple[str, int] | None]: the updates (None if no data was found)
+        and the key of the next page (None if this is the last page).
+    """
+    sql, tuple_arr = span_partitions(polygon,
+                                     orga_id,
+                                     zone_id,
+                                     drone_id,
+                                     after,
+                                     before,
+                                     before_key)
+
+    if limit is None:
+        sql = f'{sql}\nORDER BY {ORDER_BY_DRONE};'
+    else:
+        sql = f'{sql}\nORDER BY {ORDER_BY_PAGE};'
+        tuple_arr.append(limit)
 
     fetched_data = db.fetch_all(sql,tuple(tuple_arr))
 
     if fetched_data is None:
-        return None
+        return None, None
+
+    next_key = None
+    if limit is not None and len(fetched_data) == limit:
+        next_key = db.get_keyset(fetched_data[-1][2], fetched_data[-1][0])
 
-    output = []
     if get_coords_only:
-        return get_routeobj_from_fetched(fetched_data)
+        return get_routeobj_from_fetched(fetched_data, as_struct, simplification), next_key
+
+    return UPDATE_DECODER.decode_all(fetched_data, as_struct), next_key
+
+def export_drone_updates(orga_id:int,
+                         drone_id:int=None,
+                         after:datetime.datetime=None,
+                         before:datetime.datetime=None) -> Iterator[List[tuple]]:
+    """streams the raw rows of the updates of an organization, newest first.
+    The rows are fetched batch by batch (see db.fetch_batches), without building DroneUpdates,
+    so the memory doesnt grow with the number of updates.
+
+    Args:
+        orga_id (int): id of the organization.
+        drone_id (int, optional): id of the drone. Defaults to None.
+        after (datetime.datetime, optional): fetches everything after this date (not included)
+        before (datetime.datetime, optional): fetches everything before this date (not included)
 
-    for drone_data in fetched_data:
-        dronedata = get_obj_from_fetched(drone_data)
-        if dronedata is not None:
-            output.append(dronedata)
-    return output
+    Returns:
+        Iterator[List[tuple]]: batches of rows with the columns of EXPORT_COLUMNS.
+    """
+    sql, tuple_arr = span_partitions(None,
+                                     orga_id,
+                                     None,
+                                     drone_id,
+                                     after,
+                                     before)
+    return db.fetch_batches(f'{sql}\nORDER BY {ORDER_BY_EXPORT};', tuple(tuple_arr))
+
+def span_partitions(polygon:str,
+                    orga_id:int,
+                    zone_id:int,
+                    drone_id:int,
+                    after:datetime.datetime,
+                    before:datetime.datetime,
+                    before_key:tuple[str, int] = None) -> tuple[str, List]:
+    """generates the select of GET_ENTRY over all partitions, see gernerate_drone_sql for the filters.
+
+    Returns:
+        str, List[any]: sql without ORDER BY and tuple array
+    """
+    sql_parts = []
+    tuple_arr = []
+    for table in PARTITIONS:
+        sql_arr, table_tuple_arr = gernerate_drone_sql(polygon,
+                                                       orga_id,
+                                                       zone_id,
+                                                       drone_id,
+                                                       after,
+                                                       before,
+                                                       table,
+                                                       before_key)
+        sql_parts.append(db.add_where_clause(GET_ENTRY.format(table=table, **TIMESTAMP_FIELDS),
+                                             sql_arr))
+        tuple_arr.extend(table_tuple_arr)
+    return '\nUNION ALL\n'.join(sql_parts), tuple_arr
 
 def gernerate_drone_sql(polygon:str,
                         orga_id:int,
                         zone_id:int,
                         drone_id:int,
                         after:datetime.datetime,
-                        before:datetime.datetime
+                        before:datetime.datetime,
+                        table:str = 'drone_data',
+                        before_key:tuple[str, int] = None
                         ):
     """generates the sql and tuple array for the get_drone_updates function.
 
@@ -164,6 +501,9 @@ def gernerate_drone_sql(polygon:str,
         drone_id (int): id of the drone.
         after (datetime.datetime): fetches everything after this date (not included)
         before (datetime.datetime): fetches everything before this date (not included)
+        table (str): table whose coordinates are filtered by the polygon. Defaults to 'drone_data'.
+        before_key (tuple[str, int], optional): only rows older than this (timestamp, id) key,
+        see db.create_keyset_clause. Defaults to None.
 
     Returns:
         List[str], List[any]: sql array and tuple array
@@ -176,8 +516,9 @@ def gernerate_drone_sql(polygon:str,
         tuple_arr.append(drone_id)
 
     if polygon is not None:
-        sql_arr.append(db.create_intersection_clause('coordinates'))
-        tuple_arr.append(polygon)
+        sql_arr.append(db.create_intersection_clause(f'{table}.coordinates'))
+        sql_arr.append(db.create_spatial_index_clause(table,'coordinates'))
+        tuple_arr.extend((polygon, polygon))
 
     if orga_id is not None:
         sql_arr.append(db.create_where_clause_statement('territories.orga_id','='))
@@ -188,12 +529,16 @@ def gernerate_drone_sql(polygon:str,
         tuple_arr.append(zone_id)
 
     if after is not None:
-        sql_arr.append(db.create_where_clause_statement('timestamp','>'))
-        tuple_arr.append(after)
+        sql_arr.append(db.create_where_clause_statement(f'{table}.{TIMESTAMP_COLUMN}','>'))
+        tuple_arr.append(to_stored(after))
 
     if before is not None:
-        sql_arr.append(db.create_where_clause_statement('timestamp','<'))
-        tuple_arr.append(before)
+        sql_arr.append(db.create_where_clause_statement(f'{table}.{TIMESTAMP_COLUMN}','<'))
+        tuple_arr.append(to_stored(before))
+
+    if before_key is not None:
+        sql_arr.append(db.create_keyset_clause(f'{table}.{TIMESTAMP_COLUMN}', f'{table}.id'))
+        tuple_arr.extend(before_key)
 
     return sql_arr, tuple_arr
 
@@ -206,8 +551,7 @@ def get_latest_update(drone_id:int) -> DroneUpdate:
     Returns:
         DroneUpdate
     """
-    sql = db.add_where_clause(GET_ENTRY, [db.create_where_clause_statement('drone_id','=')])
-    fetched_data = db.fetch_one(sql,(drone_id,))
+    fetched_data = db.fetch_one(GET_LATEST,(drone_id,))
     return get_obj_from_fetched(fetched_data)
 
 def get_updates_in_zone(polygon: str,
@@ -223,15 +567,12 @@ def get_updates_in_zone(polygon: str,
     Returns:
         List[DroneData]: List with the fetched data.
     """
-    fetched_data = db.fetch_all(GET_UPDATE_IN_ZONE, (polygon, after, before))
-    output = []
+    fetched_data = db.fetch_all(GET_UPDATE_IN_ZONE,
+                                (polygon, polygon, to_stored(after), to_stored(before))
+                                * len(PARTITIONS))
     if fetched_data is None:
         return None
-    for drone_data in fetched_data:
-        dronedata_obj = get_obj_from_fetched(drone_data)
-        if dronedata_obj:
-            output.append(dronedata_obj)
-    return output
+    return UPDATE_DECODER.decode_all(fetched_data)
 
 
 def get_updates_of_orga(orga_id: int,
@@ -247,15 +588,11 @@ def get_updates_of_orga(orga_id: int,
     Returns:
         List[DroneData]: List with the fetched data.
     """
-    fetched_data = db.fetch_all(GET_UPDATE_IN_ORGA_AREA, (orga_id, after, before))
-    output = []
+    fetched_data = db.fetch_all(GET_UPDATE_IN_ORGA_AREA,
+                                (orga_id, to_stored(after), to_stored(before)) * len(PARTITIONS))
     if fetched_data is None:
         return None
-    for drone_data in fetched_data:
-        dronedata_obj = get_obj_from_fetched(drone_data)
-        if dronedata_obj:
-            output.append(dronedata_obj)
-    return output
+    return UPDATE_DECODER.decode_all(fetched_data)
 
 def get_lastest_update_in_zone(polygon: str) -> DroneUpdate | None:
     """fetches the latest update within the provided polygon area.
@@ -268,9 +605,10 @@ def get_lastest_update_in_zone(polygon: str) -> DroneUpdate | None:
     fetched_data = db.fetch_one(GET_UPDATE_IN_ZONE,
                                     (
                                         polygon,
-                                        datetime.datetime.min,
-                                        datetime.datetime.utcnow()
-                                    )
+                                        polygon,
+                                        to_stored(datetime.datetime.min),
+                                        to_stored(datetime.datetime.utcnow())
+                                    ) * len(PARTITIONS)
                                 )
     return get_obj_from_fetched(fetched_data)
 
@@ -287,51 +625,37 @@ def get_active_drones(polygon: str,
     """
     if after is None:
         after = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
-    return db.fetch_all(ACTIVE_DRONES,(polygon,after))
+    return db.fetch_all(ACTIVE_DRONES,(polygon,polygon,to_stored(after)) * len(PARTITIONS))
 
 
-def get_obj_from_fetched(fetched_dronedata) -> DroneUpdate| None:
-    """generating DroneUpdate object with the fetched data.
+def get_obj_from_fetched(fetched_dronedata,
+                         as_struct: bool = False) -> DroneUpdate | DroneUpdateStruct | None:
+    """generating DroneUpdate object with the fetched data, see UPDATE_DECODER.
 
     Args:
         fetched_dronedata: the fetched data from the sqlite cursor.
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
 
     Returns:
         DroneData| None: the generated object.
     """
-    if fetched_match_class(DroneUpdate,fetched_dronedata):
-        try:
-            longitude=float(fetched_dronedata[5])
-            latitude= float(fetched_dronedata[6])
-        except ValueError as exception:
-            print(exception)
-            longitude, latitude= None, None
+    return UPDATE_DECODER.decode(fetched_dronedata, as_struct)
 
-        try:
-            timestamp:datetime.datetime = fetched_dronedata[2]
-            if timestamp is not None:
-                timestamp = timestamp.astimezone(pytz.timezone(TIMEZONE))
-        except ValueError:
-            timestamp = fetched_dronedata[2]
-
-        drone_data_obj = DroneUpdate(
-            id = fetched_dronedata[0],
-            drone_id = fetched_dronedata[1],
-            timestamp = timestamp,
-            lon= longitude,
-            lat = latitude,
-            flight_range = fetched_dronedata[3],
-            flight_time = fetched_dronedata[4],
-            zone_id = fetched_dronedata[7]
-        )
-        return drone_data_obj
-    return None
-
-def get_routeobj_from_fetched(fetched_dronedataarr) -> List[DroneUpdateWithRoute]| None:
+def get_routeobj_from_fetched(fetched_dronedataarr,
+                              as_struct: bool = False,
+                              simplification: RouteSimplification = None
+                              ) -> List[DroneUpdateWithRoute]| None:
     """generating DroneUpdate object with the fetched data.
+    The rows have to be ordered newest first per drone, the rows of different drones may be mixed.
+    The coordinates are read into numpy arrays and grouped by drone,
+    the routes of all drones are built at once, see build_routes.
 
     Args:
         fetched_dronedata: the fetched data from the sqlite cursor.
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
+        simplification (RouteSimplification, optional): simplifies the routes. Defaults to None.
 
     Returns:
         List[DroneUpdateWithRoute]| None: the generated object.
@@ -339,33 +663,147 @@ def get_routeobj_from_fetched(fetched_dronedataarr) -> List[DroneUpdateWithRoute
     if fetched_dronedataarr is None:
         return None
 
-    drones_arr = []
-    route_arr = []
+    # all rows come from the same query, so checking the first one is enough.
+    if len(fetched_dronedataarr) == 0 or len(fetched_dronedataarr[0]) != UPDATE_DECODER.width:
+        return []
+
+    drone_ids = numpy.fromiter((row[1] for row in fetched_dronedataarr),
+                               dtype=numpy.int64,
+                               count=len(fetched_dronedataarr))
+    coords = numpy.array([row[5:7] for row in fetched_dronedataarr], dtype=float)
+
+    # the stable sort keeps the rows of every drone newest first,
+    # so the first row of each group is the latest update of the drone.
+    order = numpy.argsort(drone_ids, kind='stable')
+    unique_ids, starts = numpy.unique(drone_ids[order], return_index=True)
+    latest_rows = order[starts]
+
+    route_rows = order[~numpy.isnan(coords[order]).any(axis=1)]
+    groups = numpy.searchsorted(unique_ids, drone_ids[route_rows])
+
+    seconds = None
+    if simplification is not None and simplification.bucket_seconds is not None:
+        seconds = numpy.array([to_epoch_seconds(fetched_dronedataarr[row][2]) for row in route_rows])
+
+    routes, vertices = build_routes(coords[route_rows], groups, len(unique_ids),
+                                    simplification, seconds)
+
+    # in the order the drones appear.
+    return [create_drone_with_route(get_obj_from_fetched(fetched_dronedataarr[latest_rows[group]], as_struct),
+                                    routes[group],
+                                    as_struct,
+                                    int(vertices[group]))
+            for group in numpy.argsort(latest_rows)]
+
+def build_routes(coords:numpy.ndarray,
+                 groups:numpy.ndarray,
+                 group_count:int,
+                 simplification:RouteSimplification = None,
+                 seconds:numpy.ndarray = None) -> tuple[List[List[List[float]]], numpy.ndarray]:
+    """builds the routes of all groups with vectorised shapely functions
+    and simplifies them, first by time buckets, then with Douglas-Peucker.
+    The newest and the oldest point of a route are always kept.
 
-    drone_update = get_obj_from_fetched(fetched_dronedataarr[0])
-    for fetched_dronedata in fetched_dronedataarr:
-        if fetched_match_class(DroneUpdate,fetched_dronedata):
-            if fetched_dronedata[1] != drone_update.drone_id:
-                drones_arr.append(create_drone_with_route(drone_update,route_arr))
-                route_arr = []
-                drone_update = get_obj_from_fetched(fetched_dronedata)
+    Args:
+        coords (numpy.ndarray): array of shape (n, 2) with lon, lat, sorted by group, newest first.
+        groups (numpy.ndarray): group of every coordinate.
+        group_count (int): number of groups, groups without coordinates get an empty route.
+        simplification (RouteSimplification, optional): how to simplify the routes. Defaults to None.
+        seconds (numpy.ndarray, optional): epoch seconds of every coordinate,
+        needed for simplification.bucket_seconds. Defaults to None.
 
-            try:
-                longitude=float(fetched_dronedata[5])
-                latitude= float(fetched_dronedata[6])
-                route_arr.append(Point(longitude, latitude))
-            except ValueError as exception:
-                print(exception)
+    Returns:
+        tuple[List[List[List[float]]], numpy.ndarray]: the geojson coordinates of every route
+        and the number of points of every route before the simplification.
+    """
+    vertices = numpy.bincount(groups, minlength=group_count)
+    if simplification is None:
+        simplification = RouteSimplification()
+
+    if simplification.bucket_seconds is not None and seconds is not None and len(coords) > 0:
+        buckets = seconds // simplification.bucket_seconds
+        new_group = numpy.ones(len(coords), dtype=bool)
+        new_group[1:] = groups[1:] != groups[:-1]
+        keep = new_group.copy()
+        keep[1:] |= buckets[1:] != buckets[:-1]
+        # the last point of every group.
+        keep[:-1] |= new_group[1:]
+        keep[-1] = True
+        coords = coords[keep]
+        groups = groups[keep]
+
+    counts = numpy.bincount(groups, minlength=group_count)
+    is_line = counts[groups] > 1
+    routes = [[] for _ in range(group_count)]
+    for index in numpy.flatnonzero(~is_line):
+        routes[groups[index]] = [coords[index].tolist()]
+
+    line_groups = numpy.flatnonzero(counts > 1)
+    if len(line_groups) == 0:
+        return routes, vertices
+
+    line_coords = coords[is_line]
+    lines = shapely.linestrings(line_coords,
+                                indices=numpy.searchsorted(line_groups, groups[is_line]))
+
+    if simplification.tolerance is not None:
+        lines = shapely.simplify(lines, simplification.tolerance, preserve_topology=False)
+
+    if simplification.max_points is not None:
+        lines = simplify_to_max_points(lines, simplification.max_points)
+
+    line_coords = shapely.get_coordinates(lines)
+    split = numpy.cumsum(shapely.get_num_coordinates(lines))[:-1]
+    for group, route in zip(line_groups, numpy.split(line_coords, split)):
+        routes[group] = route.tolist()
+    return routes, vertices
+
+def simplify_to_max_points(lines:numpy.ndarray, max_points:int) -> numpy.ndarray:
+    """simplifies every line with more than max_points points
+    with the smallest Douglas-Peucker tolerance that is sufficient, found by bisection.
 
-    drones_arr.append(create_drone_with_route(drone_update,route_arr))
-    return drones_arr
+    Args:
+        lines (numpy.ndarray): array of LineStrings.
+        max_points (int): maximum number of points per line.
 
-def create_drone_with_route(drone_update:DroneUpdate,route:List[Point]) -> DroneUpdateWithRoute:
+    Returns:
+        numpy.ndarray: the simplified lines.
+    """
+    too_long = shapely.get_num_coordinates(lines) > max_points
+    if not too_long.any():
+        return lines
+
+    candidates = lines[too_long]
+    lower = numpy.zeros(len(candidates))
+    upper = shapely.length(candidates)
+    simplified = shapely.simplify(candidates, upper, preserve_topology=False)
+    for _ in range(ROUTE_SIMPLIFY_ITERATIONS):
+        tolerance = (lower + upper) / 2
+        candidate = shapely.simplify(candidates, tolerance, preserve_topology=False)
+        fits = shapely.get_num_coordinates(candidate) <= max_points
+        upper = numpy.where(fits, tolerance, upper)
+        lower = numpy.where(fits, lower, tolerance)
+        simplified = numpy.where(fits, candidate, simplified)
+
+    lines = lines.copy()
+    lines[too_long] = simplified
+    return lines
+
+def create_drone_with_route(drone_update:DroneUpdate | DroneUpdateStruct,
+                            route:List[List[float]],
+                            as_struct:bool = False,
+                            vertices:int = None) -> DroneUpdateWithRoute:
     """creates a drone witha route o
+    The properties of the geojson contain the number of points of the route (vertices)
+    and of the simplified route (simplified_vertices).
 
     Args:
         drone_update: update
-        route: rist of points
+        route: geojson coordinates of the route, see build_routes.
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
+        vertices (int, optional): number of points before the simplification.
+        Defaults to None, the route wasnt simplified.
 
     Returns:
        DroneUpdateWithRoute: new object
@@ -373,22 +811,28 @@ def create_drone_with_route(drone_update:DroneUpdate,route:List[Point]) -> Drone
     if drone_update is None:
         return None
 
+    if vertices is None:
+        vertices = len(route)
+    properties = {'vertices': vertices, 'simplified_vertices': len(route)}
+
     if len(route) > 1:
         geojson = {'type': 'Feature',
-                    'properties': {},
-                    'geometry': mapping(LineString(route))}
+                    'properties': properties,
+                    'geometry': {'type': 'LineString', 'coordinates': route}}
     else:
         try:
             point = Point(drone_update.lon, drone_update.lat)
             geometry = mapping(point)
-        except ValueError:
+        except (TypeError, ValueError):
+            # the update has no coordinates.
             geometry = None
 
         geojson = {'type': 'Feature',
-                    'properties': {},
+                    'properties': properties,
                     'geometry': geometry}
 
-    return DroneUpdateWithRoute(
+    model = DroneUpdateWithRouteStruct if as_struct else DroneUpdateWithRoute
+    return model(
                     id=drone_update.id,
                     drone_id=drone_update.drone_id,
                     timestamp=drone_update.timestamp,
@@ -398,3 +842,65 @@ def create_drone_with_route(drone_update:DroneUpdate,route:List[Point]) -> Drone
                     flight_time=drone_update.flight_time,
                     geojson=geojson,
                     zone_id=drone_update.zone_id)
+
+async def create_drone_update_async(drone_id:int,
+                                    timestamp:datetime.datetime,
+                                    longitude:float,
+                                    latitude:float,
+                                    flight_range:float|None,
+                                    flight_time:float|None) -> bool:
+    """awaitable version of create_drone_update, runs on the database executor.
+
+    Returns:
+        bool: see create_drone_update.
+    """
+    return await db.run_async(create_drone_update,
+                              drone_id,
+                              timestamp,
+                              longitude,
+                              latitude,
+                              flight_range,
+                              flight_time)
+
+async def get_drone_updates_async(**kwargs) -> List[DroneUpdate] | DroneUpdateWithRoute:
+    """awaitable version of get_drone_updates, runs on the database executor.
+    Takes the same arguments as get_drone_updates.
+
+    Returns:
+        List[DroneUpdate] | DroneUpdateWithRoute: see get_drone_updates.
+    """
+    return await db.run_async(get_drone_updates, **kwargs)
+
+async def get_drone_updates_page_async(**kwargs) -> tuple[List[DroneUpdate] | None,
+                                                           tuple[str, int] | None]:
+    """awaitable version of get_drone_updates_page, runs on the database executor.
+    Takes the same arguments as get_drone_updates_page.
+
+    Returns:
+        tuple[List[DroneUpdate] | None, tuple[str, int] | None]: see get_drone_updates_page.
+    """
+    return await db.run_async(get_drone_updates_page, **kwargs)
+
+async def get_latest_update_async(drone_id:int) -> DroneUpdate:
+    """awaitable version of get_latest_update, runs on the database executor.
+
+    Returns:
+        DroneUpdate: see get_latest_update.
+    """
+    return await db.run_async(get_latest_update, drone_id)
+
+async def create_drone_update_rows_async(updates:List[tuple]) -> List[int | None] | None:
+    """awaitable version of create_drone_update_rows, runs on the database executor.
+
+    Returns:
+        List[int | None] | None: see create_drone_update_rows.
+    """
+    return await db.run_async(create_drone_update_rows, updates)
+
+async def create_drone_updates_async(drone_id:int, updates:List[tuple]) -> List[int | None] | None:
+    """awaitable version of create_drone_updates, runs on the database executor.
+
+    Returns:
+        List[int | None] | None: see create_drone_updates.
+    """
+    return await db.run_async(create_drone_updates, drone_id, updates)
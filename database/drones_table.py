@@ -32,21 +32,15 @@ drones.type,
 drones.flight_range, 
 drones.cc_range, 
 drones.flight_time, 
-zones.id
+drone_latest.zone_id
 FROM drones
-LEFT OUTER JOIN  ( 
-        SELECT coordinates, MAX(timestamp) as ts, drone_id
-        from drone_data
-        group by drone_data.drone_id
-    ) AS newdrone_data
-ON newdrone_data.drone_id = drones.id
-JOIN zones ON ST_Intersects(newdrone_data.coordinates, zones.area)
-JOIN territory_zones ON territory_zones.zone_id = zones.id
+LEFT OUTER JOIN drone_latest ON drone_latest.drone_id = drones.id
+JOIN territory_zones ON territory_zones.zone_id = drone_latest.zone_id
 JOIN territories ON territories.id = territory_zones.territory_id
 WHERE drones.id=?
 AND territories.orga_id = ?
 Group by drones.id
-Order by newdrone_data.ts;'''
+Order by drone_latest.timestamp;'''
 
 GET_DRONE_BY_ID = '''SELECT
 drones.id, 
@@ -55,20 +49,14 @@ drones.type,
 drones.flight_range, 
 drones.cc_range, 
 drones.flight_time, 
-zones.id
+drone_latest.zone_id
 FROM drones
-LEFT OUTER JOIN  ( 
-        SELECT coordinates, MAX(timestamp) as ts, drone_id
-        from drone_data
-        group by drone_data.drone_id
-    ) AS newdrone_data
-ON newdrone_data.drone_id = drones.id
-JOIN zones ON ST_Intersects(newdrone_data.coordinates, zones.area)
-JOIN territory_zones ON territory_zones.zone_id = zones.id
+LEFT OUTER JOIN drone_latest ON drone_latest.drone_id = drones.id
+JOIN territory_zones ON territory_zones.zone_id = drone_latest.zone_id
 JOIN territories ON territories.id = territory_zones.territory_id
 WHERE drones.id = ?
 Group by drones.id
-Order by newdrone_data.ts;'''
+Order by drone_latest.timestamp;'''
 
 GET_DRONES = '''SELECT
 drones.id, 
@@ -77,20 +65,14 @@ drones.type,
 drones.flight_range, 
 drones.cc_range, 
 drones.flight_time, 
-zones.id
+drone_latest.zone_id
 FROM drones
-LEFT OUTER JOIN  ( 
-        SELECT coordinates, MAX(timestamp) as ts, drone_id
-        from drone_data
-        group by drone_data.drone_id
-    ) AS newdrone_data
-ON newdrone_data.drone_id = drones.id
-JOIN zones ON ST_Intersects(newdrone_data.coordinates, zones.area)
-JOIN territory_zones ON territory_zones.zone_id = zones.id
+LEFT OUTER JOIN drone_latest ON drone_latest.drone_id = drones.id
+JOIN territory_zones ON territory_zones.zone_id = drone_latest.zone_id
 JOIN territories ON territories.id = territory_zones.territory_id
 WHERE territories.orga_id = ?
 Group by drones.id
-Order by newdrone_data.ts;'''
+Order by drone_latest.timestamp;'''
 
 def create_drone(name:str,
                  drone_type:str|None,
@@ -211,3 +193,35 @@ def get_obj_from_fetched(fetched_drone):
             print(exception)
 
     return None
+
+async def create_drone_async(name:str, drone_type:str|None, flight_range:float|None, cc_range:float|None, flight_time:float|None) -> Drone | None:
+    """awaitable version of create_drone, runs on the database executor.
+
+    Returns:
+        Drone | None: see create_drone.
+    """
+    return await db.run_async(create_drone, name, drone_type, flight_range, cc_range, flight_time)
+
+async def get_drone_async(drone_id:int, orga_id:int) -> Drone | None:
+    """awaitable version of get_drone, runs on the database executor.
+
+    Returns:
+        Drone | None: see get_drone.
+    """
+    return await db.run_async(get_drone, drone_id, orga_id)
+
+async def get_drone_id_async(drone_id:int) -> Drone | None:
+    """awaitable version of get_drone_id, runs on the database executor.
+
+    Returns:
+        Drone | None: see get_drone_id.
+    """
+    return await db.run_async(get_drone_id, drone_id)
+
+async def get_drones_async(orga_id:int) -> List[Drone]:
+    """awaitable version of get_drones, runs on the database executor.
+
+    Returns:
+        List[Drone]: see get_drones.
+    """
+    return await db.run_async(get_drones, orga_id)
@@ -0,0 +1,156 @@
+"""Opt-in integer timestamps of the telemetry.
+
+The timestamp columns store the datetimes as text, so range filters compare strings,
+the offset of timezone aware values is lost when they are read and every row is parsed
+by the timestamp converter of sqlite3.
+The tables of EPOCH_TABLES have the column ts with the timestamp as integer epoch milliseconds (UTC),
+the writers bind it next to timestamp (see to_epoch_ms), older databases get it by the migration
+add_epoch_columns. So ts is always complete, whether DB_EPOCH_TIMESTAMPS is set or not.
+If DB_EPOCH_TIMESTAMPS is 'True', the composite indexes of EPOCH_INDEXES are created on start
+(and dropped if it isnt, see set_epoch_indexes) and the reads of the table modules filter, order
+and page on ts and select it as timestamp, the decoders convert it back to a datetime,
+see row_decoding.to_timezone.
+"""
+import datetime
+import os
+import sqlite3
+import database.database as db
+
+EPOCH_TIMESTAMPS = os.getenv('DB_EPOCH_TIMESTAMPS', 'False') == 'True'
+
+# the column the reads filter and order on, and the select of it.
+# ts is selected as timestamp, so ORDER BY timestamp and the row layout stay the same.
+TIMESTAMP_COLUMN = 'ts' if EPOCH_TIMESTAMPS else 'timestamp'
+SELECT_TIMESTAMP = 'ts AS timestamp' if EPOCH_TIMESTAMPS else 'timestamp'
+
+# placeholders of the sql templates, formatted together with {table}.
+TIMESTAMP_FIELDS = {'timestamp': SELECT_TIMESTAMP, 'ts': TIMESTAMP_COLUMN}
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+EPOCH_TABLES = ['drone_data', 'drone_data_archive', 'drone_event', 'incidents']
+
+# (index, table, columns), the rowid is the last column of every index.
+EPOCH_INDEXES = [
+    ('drone_data_AK_4', 'drone_data', 'ts'),
+    ('drone_data_AK_5', 'drone_data', 'drone_id, ts'),
+    ('drone_data_AK_6', 'drone_data', 'zone_id, ts'),
+    ('drone_data_archive_AK_4', 'drone_data_archive', 'ts'),
+    ('drone_data_archive_AK_5', 'drone_data_archive', 'drone_id, ts'),
+    ('drone_data_archive_AK_6', 'drone_data_archive', 'zone_id, ts'),
+    ('drone_event_AK_4', 'drone_event', 'ts'),
+    ('drone_event_AK_5', 'drone_event', 'drone_id, ts'),
+    ('drone_event_AK_6', 'drone_event', 'zone_id, ts'),
+    ('incidents_AK_2', 'incidents', 'ts'),
+]
+
+# julianday understands the formats sqlite3 stores datetimes in, including the utc offset.
+TO_EPOCH_MS = "CAST(round((julianday({}) - 2440587.5) * 86400000) AS integer)"
+
+# fills ts of the rows that were stored before the column existed, see add_epoch_columns.
+FILL_TS = f'UPDATE {{table}} SET ts = {TO_EPOCH_MS.format("timestamp")} WHERE ts IS NULL;'
+
+# triggers of older versions that filled ts after every insert, replaced by the writers.
+TS_TRIGGERS = ['{table}_ts_insert', '{table}_ts_update']
+
+
+def to_epoch_ms(timestamp: datetime.datetime) -> int:
+    """converts a datetime to epoch milliseconds, naive datetimes are UTC.
+
+    Args:
+        timestamp (datetime.datetime): the datetime.
+
+    Returns:
+        int: milliseconds since 1970-01-01 UTC.
+    """
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return round((timestamp - EPOCH) / datetime.timedelta(milliseconds=1))
+
+def from_epoch_ms(milliseconds: int) -> datetime.datetime:
+    """converts epoch milliseconds to a timezone aware datetime.
+
+    Args:
+        milliseconds (int): milliseconds since 1970-01-01 UTC.
+
+    Returns:
+        datetime.datetime: the datetime in UTC.
+    """
+    return EPOCH + datetime.timedelta(milliseconds=milliseconds)
+
+def to_stored(timestamp: datetime.datetime | None) -> datetime.datetime | int | None:
+    """converts a datetime parameter to the value of TIMESTAMP_COLUMN.
+
+    Args:
+        timestamp (datetime.datetime | None): the parameter.
+
+    Returns:
+        datetime.datetime | int | None: epoch milliseconds if EPOCH_TIMESTAMPS is set,
+        otherwise the unchanged parameter.
+    """
+    if EPOCH_TIMESTAMPS and isinstance(timestamp, datetime.datetime):
+        return to_epoch_ms(timestamp)
+    return timestamp
+
+def to_epoch_seconds(timestamp: datetime.datetime | int) -> float:
+    """epoch seconds of a fetched timestamp, either a datetime or epoch milliseconds.
+
+    Args:
+        timestamp (datetime.datetime | int): the fetched timestamp.
+
+    Returns:
+        float: seconds since 1970-01-01 UTC.
+    """
+    if isinstance(timestamp, int):
+        return timestamp / 1000
+    return timestamp.timestamp()
+
+def add_epoch_columns(conn: sqlite3.Connection) -> None:
+    """adds the ts column to the tables of EPOCH_TABLES that dont have it,
+    fills it for the stored rows and drops the triggers that filled it before.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+    """
+    for table in EPOCH_TABLES:
+        columns = [column[1] for column in conn.execute(f'PRAGMA table_info({table});')]
+        if len(columns) == 0:
+            continue
+        if 'ts' not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN ts integer;')
+        for trigger in TS_TRIGGERS:
+            conn.execute(f'DROP TRIGGER IF EXISTS {trigger.format(table=table)};')
+        conn.execute(FILL_TS.format(table=table))
+
+def set_epoch_indexes(conn: sqlite3.Connection, enabled: bool) -> None:
+    """creates the indexes of EPOCH_INDEXES, or drops them if the reads dont use ts,
+    so they arent updated by every insert for nothing.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+        enabled (bool): True if the reads use ts, see EPOCH_TIMESTAMPS.
+    """
+    for index, table, columns in EPOCH_INDEXES:
+        if not enabled:
+            conn.execute(f'DROP INDEX IF EXISTS {index};')
+        elif conn.execute(f'PRAGMA table_info({table});').fetchone() is not None:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {index} ON {table} ({columns});')
+
+def apply_epoch_indexes(enabled: bool = EPOCH_TIMESTAMPS) -> bool:
+    """applies set_epoch_indexes in one transaction, called on start.
+
+    Args:
+        enabled (bool, optional): True if the reads use ts. Defaults to EPOCH_TIMESTAMPS.
+
+    Returns:
+        bool: True if the indexes match enabled.
+    """
+    with db.database_connection() as conn:
+        try:
+            set_epoch_indexes(conn, enabled)
+            conn.commit()
+            return True
+        except sqlite3.Error as exception:
+            conn.rollback()
+            print(f'epoch indexes failed: {exception}')
+    return False
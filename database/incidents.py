@@ -2,10 +2,10 @@
 from typing import List
 import datetime
 
-import pytz
-from database.database import TIMEZONE, fetched_match_class
 import database.database as db
-from api.dependencies.classes import Incident
+from database.epoch_timestamps import SELECT_TIMESTAMP, TIMESTAMP_COLUMN, to_epoch_ms
+from database.row_decoding import RowDecoder, to_isoformat, to_timezone
+from api.dependencies.classes import Incident, IncidentStruct
 
 CREATE_INCIDENTS_TABLE = '''CREATE TABLE IF NOT EXISTS incidents
 (
@@ -15,15 +15,28 @@ location    text NOT NULL ,
 alarm_type  text NOT NULL,
 notes       text NOT NULL,
 timestamp   timestamp NOT NULL,
+ts          integer,
 PRIMARY KEY (id)
-);'''
+);
+CREATE INDEX IF NOT EXISTS incidents_AK_1 ON incidents (timestamp);'''
 
-INSERT_INCIDENT= 'INSERT INTO incidents (drone_name, location, alarm_type, notes, timestamp) VALUES (?,?,?,?,?);'
+# ts is bound with the timestamp, see epoch_timestamps.to_epoch_ms.
+INSERT_INCIDENT= 'INSERT INTO incidents (drone_name, location, alarm_type, notes, timestamp, ts) VALUES (?,?,?,?,?,?);'
 
-GET_INCIDENT = '''SELECT * FROM incidents
-                    ORDER BY timestamp DESC LIMIT {};'''
+# the columns are listed, because incidents have the ts column, see database.epoch_timestamps.
+INCIDENT_COLUMNS = f'id, drone_name, location, alarm_type, notes, {SELECT_TIMESTAMP}'
 
-GET_ALL_INCIDENT = '''SELECT * FROM incidents;'''
+GET_INCIDENT = f'''SELECT {INCIDENT_COLUMNS} FROM incidents
+                    {{}}
+                    ORDER BY timestamp DESC, id DESC LIMIT ?;'''
+
+GET_ALL_INCIDENT = f'''SELECT {INCIDENT_COLUMNS} FROM incidents;'''
+
+INCIDENT_DECODER = RowDecoder(Incident,
+                              IncidentStruct,
+                              ['id', 'drone_name', 'location', 'alarm_type', 'notes', 'timestamp'],
+                              {'timestamp': to_timezone},
+                              {'timestamp': to_isoformat})
 
 def create_incident(drone_name: str, location: str, alarm_type: str, notes: str, timestamp: datetime.datetime) -> int | None:
     """create an incident.
@@ -36,78 +49,108 @@ def create_incident(drone_name: str, location: str, alarm_type: str, notes: str,
     Returns:
         int | None: Id of the inserted entry, None if an error occurs.
     """
-    return db.insert(INSERT_INCIDENT, (drone_name, location, alarm_type, notes, timestamp))
+    return db.insert(INSERT_INCIDENT, (drone_name, location, alarm_type, notes, timestamp, to_epoch_ms(timestamp)))
 
-def get_last_incidents(amount: int) -> List[Incident]:
+def get_last_incidents(amount: int, as_struct: bool = False) -> List[Incident]:
     """returns the last x incidents
     Args:
         amount (int): number of incidents
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
     Returns:
         List[Incident]: list of incidents.
     """
-    sql = GET_INCIDENT.format(amount)
+    incidents, _ = get_incidents_page(amount, as_struct=as_struct)
+    return incidents
 
-    fetched_data = db.fetch_all(sql)
+def get_incidents_page(limit: int,
+                       before_key: tuple[str, int] = None,
+                       as_struct: bool = False) -> tuple[List[Incident] | None, tuple[str, int] | None]:
+    """returns one page of the incidents, newest first.
+    Args:
+        limit (int): maximum number of incidents.
+        before_key (tuple[str, int], optional): key of the last incident of the previous page.
+        Defaults to None, the first page.
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
+    Returns:
+        tuple[List[Incident] | None, tuple[str, int] | None]: the incidents (None if there are none)
+        and the key of the next page (None if this is the last page).
+    """
+    if before_key is None:
+        sql = GET_INCIDENT.format('')
+        fetched_data = db.fetch_all(sql, (limit,))
+    else:
+        sql = GET_INCIDENT.format('WHERE ' + db.create_keyset_clause(TIMESTAMP_COLUMN, 'id'))
+        fetched_data = db.fetch_all(sql, (*before_key, limit))
 
     if fetched_data is None:
-        return None
-
-    incidents = []
+        return None, None
 
-    for incident_data in fetched_data:
-        incident_obj = get_obj_from_fetched(incident_data)
-        if incident_obj:
-            incidents.append(incident_obj)
+    next_key = None
+    if len(fetched_data) == limit:
+        next_key = db.get_keyset(fetched_data[-1][5], fetched_data[-1][0])
 
-    return incidents
+    return INCIDENT_DECODER.decode_all(fetched_data, as_struct), next_key
 
-def get_all_incidents() -> List[Incident]:
+def get_all_incidents(as_struct: bool = False) -> List[Incident]:
     """returns the last x incidents
     Args:
-        amount (int): number of incidents
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
     Returns:
         List[Incident]: list of incidents.
     """
 
-    incidents = []
     fetched_data = db.fetch_all(GET_ALL_INCIDENT)
 
     if fetched_data is None:
-        return incidents
+        return []
 
-    for incident_data in fetched_data:
-        incident_obj = get_obj_from_fetched(incident_data)
-        if incident_obj:
-            incidents.append(incident_obj)
-
-    return incidents
+    return INCIDENT_DECODER.decode_all(fetched_data, as_struct)
 
-def get_obj_from_fetched(fetched_incident: tuple) -> Incident:
-    """get a Incident object from a fetched tuple.
+def get_obj_from_fetched(fetched_incident: tuple, as_struct: bool = False) -> Incident | IncidentStruct:
+    """get a Incident object from a fetched tuple, see INCIDENT_DECODER.
     Args:
         fetched_incident (tuple): the fetched tuple.
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
     Returns:
         Incident: the territory object.
     """
-    if fetched_match_class(Incident,fetched_incident,0):
-        try:
-            timestamp:datetime.datetime = fetched_incident[5]
-            if timestamp is not None:
-                timestamp = timestamp.astimezone(pytz.timezone(TIMEZONE))
-        except ValueError:
-            timestamp = fetched_incident[5]
-
-        try:
-            incident_obj = Incident(
-                id = fetched_incident[0],
-                drone_name = fetched_incident[1],
-                location = fetched_incident[2],
-                alarm_type = fetched_incident[3],
-                notes = fetched_incident[4],
-                timestamp = timestamp,
-            )
-            return incident_obj
-        except ValueError as exception:
-            print(exception)
-
-    return None
+    return INCIDENT_DECODER.decode(fetched_incident, as_struct)
+
+async def create_incident_async(drone_name: str, location: str, alarm_type: str, notes: str, timestamp: datetime.datetime) -> int | None:
+    """awaitable version of create_incident, runs on the database executor.
+
+    Returns:
+        int | None: see create_incident.
+    """
+    return await db.run_async(create_incident, drone_name, location, alarm_type, notes, timestamp)
+
+async def get_last_incidents_async(amount: int, as_struct: bool = False) -> List[Incident]:
+    """awaitable version of get_last_incidents, runs on the database executor.
+
+    Returns:
+        List[Incident]: see get_last_incidents.
+    """
+    return await db.run_async(get_last_incidents, amount, as_struct)
+
+async def get_incidents_page_async(limit: int,
+                                   before_key: tuple[str, int] = None,
+                                   as_struct: bool = False) -> tuple[List[Incident] | None,
+                                                                     tuple[str, int] | None]:
+    """awaitable version of get_incidents_page, runs on the database executor.
+
+    Returns:
+        tuple[List[Incident] | None, tuple[str, int] | None]: see get_incidents_page.
+    """
+    return await db.run_async(get_incidents_page, limit, before_key, as_struct)
+
+async def get_all_incidents_async(as_struct: bool = False) -> List[Incident]:
+    """awaitable version of get_all_incidents, runs on the database executor.
+
+    Returns:
+        List[Incident]: see get_all_incidents.
+    """
+    return await db.run_async(get_all_incidents, as_struct)
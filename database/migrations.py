@@ -0,0 +1,255 @@
+"""Schema migrations for databases that were created by an older version.
+New databases get the current schema from the CREATE statements of the table modules,
+so every migration has to be a no-op if its change already exists.
+The number of applied migrations is stored in PRAGMA user_version.
+"""
+import sqlite3
+import database.database as db
+from database import (area_cache_table, drone_events_table, drone_updates_table,
+                      epoch_timestamps, zone_risk_table, zones_table)
+
+# (table, geometry column) pairs that need an R*Tree spatial index.
+SPATIAL_INDEXES = [
+    ('zones', 'area'),
+    ('drone_data', 'coordinates'),
+    ('drone_event', 'coordinates'),
+]
+
+def add_spatial_indexes(conn:sqlite3.Connection) -> None:
+    """creates the missing spatial indexes of SPATIAL_INDEXES.
+    CreateSpatialIndex fills the index with the already stored geometries.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+    """
+    for table, column in SPATIAL_INDEXES:
+        fetched = conn.execute('''SELECT spatial_index_enabled
+                                  FROM geometry_columns
+                                  WHERE f_table_name = ? AND f_geometry_column = ?;''',
+                               (table, column)).fetchone()
+        if fetched is not None and fetched[0] == 0:
+            conn.execute('SELECT CreateSpatialIndex(?, ?);', (table, column))
+
+# tables that store the zone of each row, resolved when the row is inserted.
+ZONE_ID_TABLES = ['drone_data', 'drone_event']
+
+def add_zone_id_columns(conn:sqlite3.Connection) -> None:
+    """adds the indexed zone_id column to the tables of ZONE_ID_TABLES
+    and resolves the zone of the already stored rows.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+    """
+    for table in ZONE_ID_TABLES:
+        columns = [column[1] for column in conn.execute(f'PRAGMA table_info({table});')]
+        if len(columns) == 0:
+            continue
+        if 'zone_id' not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN zone_id integer REFERENCES zones (id);')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_FK_2 ON {table} (zone_id);')
+
+    conn.execute(drone_updates_table.ASSIGN_ZONE_IDS)
+    conn.execute(drone_events_table.ASSIGN_ZONE_IDS)
+
+def add_drone_latest(conn:sqlite3.Connection) -> None:
+    """creates the drone_latest table with its triggers
+    and fills it with the latest stored update of every drone.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+    """
+    conn.executescript(drone_updates_table.CREATE_DRONE_LATEST_TABLE)
+    conn.execute(drone_updates_table.FILL_DRONE_LATEST)
+
+def add_zone_risk(conn:sqlite3.Connection) -> None:
+    """creates the zone_risk table and computes the fire risk of all zones.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+    """
+    conn.executescript(zone_risk_table.CREATE_ZONE_RISK_TABLE)
+    conn.execute(zone_risk_table.RECOMPUTE.format(''), (zone_risk_table.get_window_start(),))
+
+def add_area_cache(conn:sqlite3.Connection) -> None:
+    """creates the area_cache table, its entries are computed when they are read.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+    """
+    conn.executescript(area_cache_table.CREATE_AREA_CACHE_TABLE)
+
+# tables that store the simplified geojson of their area, see Detail.
+DETAIL_TABLES = ['zones', 'area_cache']
+
+def add_detail_geometries(conn:sqlite3.Connection) -> None:
+    """adds the simplified geojson columns to the tables of DETAIL_TABLES
+    and simplifies the areas of the stored zones.
+    The area_cache is cleared, its entries are recomputed with the new columns when they are read.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+    """
+    for table in DETAIL_TABLES:
+        columns = [column[1] for column in conn.execute(f'PRAGMA table_info({table});')]
+        if len(columns) == 0:
+            continue
+        for column in ('geojson_medium', 'geojson_low'):
+            if column not in columns:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} text;')
+
+    conn.execute(zones_table.SIMPLIFY_AREAS)
+    conn.execute('DELETE FROM area_cache;')
+
+# (index, table, columns) of the composite indexes behind the keyset pagination.
+PAGINATION_INDEXES = [
+    ('drone_data_AK_2', 'drone_data', 'drone_id, timestamp'),
+    ('drone_data_AK_3', 'drone_data', 'zone_id, timestamp'),
+    ('drone_event_AK_2', 'drone_event', 'drone_id, timestamp'),
+    ('drone_event_AK_3', 'drone_event', 'zone_id, timestamp'),
+    ('incidents_AK_1', 'incidents', 'timestamp'),
+]
+
+def add_pagination_indexes(conn:sqlite3.Connection) -> None:
+    """creates the indexes of PAGINATION_INDEXES on the existing tables.
+    The rowid is the last column of every index, so they cover the (timestamp, id) keys.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+    """
+    for index, table, columns in PAGINATION_INDEXES:
+        if conn.execute(f'PRAGMA table_info({table});').fetchone() is None:
+            continue
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {index} ON {table} ({columns});')
+
+def add_drone_data_archive(conn:sqlite3.Connection) -> None:
+    """creates the drone_data_archive table, see database.telemetry_retention.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+    """
+    conn.executescript(drone_updates_table.CREATE_DRONE_DATA_ARCHIVE_TABLE)
+
+# (index, table, columns) of indexes whose columns changed, see update_query_indexes.
+QUERY_INDEXES = [
+    # covers the aggregates of zone_risk_table, so the risk of a zone is computed from the index.
+    ('drone_event_AK_3', 'drone_event', 'zone_id, timestamp, event_type, confidence'),
+]
+
+def update_query_indexes(conn:sqlite3.Connection) -> None:
+    """recreates the indexes of QUERY_INDEXES that dont have the listed columns.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+    """
+    for index, table, columns in QUERY_INDEXES:
+        if conn.execute(f'PRAGMA table_info({table});').fetchone() is None:
+            continue
+        indexed = [column[2] for column in conn.execute(f'PRAGMA index_info({index});')]
+        if ', '.join(indexed) == columns:
+            continue
+        conn.execute(f'DROP INDEX IF EXISTS {index};')
+        conn.execute(f'CREATE INDEX {index} ON {table} ({columns});')
+
+def add_drone_data_autoincrement(conn:sqlite3.Connection) -> None:
+    """rebuilds drone_data with the AUTOINCREMENT id of CREATE_DRONE_DATA_TABLE.
+    Without it the ids restart once every update was archived, and the archived and the hot
+    updates share ids. Updates whose id is already archived get a new one, above all archived ids.
+    Columns, indexes and triggers that were added to the old table are kept.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+    """
+    table = conn.execute('''SELECT sql FROM sqlite_master
+                            WHERE type = 'table' AND name = 'drone_data';''').fetchone()
+    if table is None or 'AUTOINCREMENT' in table[0].upper():
+        return
+
+    columns = conn.execute('PRAGMA table_info(drone_data);').fetchall()
+    # indexes and triggers that exist again after the rebuild, e.g. of spatialite, are skipped.
+    extras = conn.execute('''SELECT name, sql FROM sqlite_master
+                             WHERE tbl_name = 'drone_data' AND type IN ('index', 'trigger')
+                             AND sql IS NOT NULL;''').fetchall()
+    conn.execute('CREATE TEMP TABLE drone_data_copy AS SELECT * FROM drone_data;')
+    conn.execute("SELECT DisableSpatialIndex('drone_data', 'coordinates');")
+    conn.execute('DROP TABLE IF EXISTS idx_drone_data_coordinates;')
+    conn.execute("SELECT DiscardGeometryColumn('drone_data', 'coordinates');")
+    conn.execute('DROP TABLE drone_data;')
+    # statement by statement, executescript would commit the open transaction.
+    for statement in drone_updates_table.CREATE_DRONE_DATA_TABLE.split(';'):
+        if statement.strip():
+            conn.execute(statement)
+
+    created = [column[1] for column in conn.execute('PRAGMA table_info(drone_data);')]
+    for column in columns:
+        if column[1] not in created:
+            conn.execute(f'ALTER TABLE drone_data ADD COLUMN {column[1]} {column[2]};')
+
+    archived = 'SELECT id FROM drone_data_archive'
+    if conn.execute('PRAGMA table_info(drone_data_archive);').fetchone() is None:
+        archived = 'SELECT NULL'
+    names = ', '.join(column[1] for column in columns)
+    conn.execute(f'''INSERT INTO drone_data ({names}) SELECT {names} FROM temp.drone_data_copy
+                     WHERE id NOT IN ({archived});''')
+    conn.execute("DELETE FROM sqlite_sequence WHERE name = 'drone_data';")
+    conn.execute(f'''INSERT INTO sqlite_sequence (name, seq)
+                     SELECT 'drone_data', COALESCE(MAX(id), 0)
+                     FROM (SELECT id FROM drone_data UNION ALL {archived});''')
+    names = ', '.join(column[1] for column in columns if column[1] != 'id')
+    conn.execute(f'''INSERT INTO drone_data ({names}) SELECT {names} FROM temp.drone_data_copy
+                     WHERE id IN ({archived}) ORDER BY id;''')
+    conn.execute('DROP TABLE temp.drone_data_copy;')
+
+    for name, create_sql in extras:
+        exists = conn.execute('SELECT 1 FROM sqlite_master WHERE name = ?;', (name,)).fetchone()
+        if exists is None:
+            conn.execute(create_sql)
+    # the latest update of a drone may have got a new id.
+    if conn.execute('PRAGMA table_info(drone_latest);').fetchone() is not None:
+        conn.execute(drone_updates_table.FILL_DRONE_LATEST)
+
+# the position in this list is the schema version, only append new migrations.
+MIGRATIONS = [
+    add_spatial_indexes,
+    add_zone_id_columns,
+    add_drone_latest,
+    add_zone_risk,
+    add_area_cache,
+    add_detail_geometries,
+    add_pagination_indexes,
+    add_drone_data_archive,
+    update_query_indexes,
+    add_drone_data_autoincrement,
+    epoch_timestamps.add_epoch_columns,
+]
+
+def get_schema_version(conn:sqlite3.Connection) -> int:
+    """reads the number of applied migrations.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+
+    Returns:
+        int: the schema version.
+    """
+    return conn.execute('PRAGMA user_version;').fetchone()[0]
+
+def run_migrations() -> int:
+    """applies all migrations that werent applied to the database yet.
+    Each migration is committed on its own, together with the new schema version.
+
+    Returns:
+        int: the schema version after the migrations.
+    """
+    with db.database_connection() as conn:
+        version = get_schema_version(conn)
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            try:
+                migration(conn)
+                conn.execute(f'PRAGMA user_version = {number};')
+                conn.commit()
+            except sqlite3.Error as exception:
+                conn.rollback()
+                print(f'migration {number} ({migration.__name__}) failed: {exception}')
+                return number - 1
+            print(f'migration {number} ({migration.__name__}) applied.')
+        return get_schema_version(conn)
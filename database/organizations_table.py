@@ -2,8 +2,8 @@
 from enum import Enum
 
 from api.dependencies.classes import Organization
-from database.database import fetched_match_class
 import database.database as db
+from database.row_decoding import RowDecoder
 
 CREATE_ORGANISATIONS_TABLE = """ CREATE TABLE IF NOT EXISTS organizations
                         (
@@ -23,6 +23,8 @@ UPDATE_ORGA_NAME = ''' UPDATE users
                     WHERE email = ?;'''
 UPDATE_ATTRIBUTE = 'UPDATE organizations SET {} = ? WHERE name = ?;'
 
+ORGA_DECODER = RowDecoder(Organization, None, ['id', 'name', 'abbreviation'])
+
 class OrgAttributes(str,Enum):
     """Enum that defines the attributes of the organizations table. Can be one of the following:
     NAME,
@@ -101,7 +103,7 @@ def get_all_orga():
     return output
 
 def get_obj_from_fetched(fetched_orga):
-    """generate Organization obj from fetched element.
+    """generate Organization obj from fetched element, see ORGA_DECODER.
 
     Args:
         fetched_orga (list): fetched attributes from orga.
@@ -109,11 +111,12 @@ def get_obj_from_fetched(fetched_orga):
     Returns:
         Organization: orga object.
     """
-    if fetched_match_class(Organization,fetched_orga):
-        orga_obj = Organization(
-            id = fetched_orga[0],
-            name=fetched_orga[1],
-            abbreviation=fetched_orga[2]
-        )
-        return orga_obj
-    return None
+    return ORGA_DECODER.decode(fetched_orga)
+
+async def get_orga_async(organame:str) -> Organization | None:
+    """awaitable version of get_orga, runs on the database executor.
+
+    Returns:
+        Organization | None: see get_orga.
+    """
+    return await db.run_async(get_orga, organame)
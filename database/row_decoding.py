@@ -0,0 +1,179 @@
+"""Shared decoding of fetched rows into the response classes.
+
+A RowDecoder is created once per query shape and maps the column positions to the fields,
+so decoding a row is a single pass over its values.
+The values come from our own schema, sqlite3 already returns them with the right types
+(timestamps are parsed by PARSE_DECLTYPES), so the pydantic classes are constructed
+without validation. Only the converters of the decoder are applied, e.g. to_timezone.
+"""
+import datetime
+import functools
+from typing import Callable, Iterable, List, Sequence
+import msgspec
+import pytz
+from pydantic import BaseModel
+from database.database import TIMEZONE
+from database.epoch_timestamps import from_epoch_ms
+
+
+@functools.lru_cache(maxsize=None)
+def get_timezone(name: str = TIMEZONE) -> datetime.tzinfo:
+    """the timezone object, created once per name.
+
+    Args:
+        name (str, optional): name of the timezone. Defaults to TIMEZONE.
+
+    Returns:
+        datetime.tzinfo: the timezone.
+    """
+    return pytz.timezone(name)
+
+def to_timezone(timestamp: datetime.datetime | int | None) -> datetime.datetime | None:
+    """converts a fetched timestamp to TIMEZONE, like the api returns it.
+    Epoch milliseconds (see database.epoch_timestamps) are converted to a datetime first.
+
+    Args:
+        timestamp (datetime.datetime | int | None): the fetched timestamp.
+
+    Returns:
+        datetime.datetime | None: the converted timestamp, unchanged if it cant be converted.
+    """
+    if timestamp is None:
+        return None
+    if isinstance(timestamp, int):
+        timestamp = from_epoch_ms(timestamp)
+    try:
+        return timestamp.astimezone(get_timezone())
+    except (AttributeError, ValueError):
+        return timestamp
+
+def to_isoformat(timestamp: datetime.datetime | int | None) -> str | None:
+    """converts a fetched timestamp like to_timezone and formats it like FastAPI does (isoformat).
+    Used for the msgspec mirrors, msgspec writes UTC as 'Z' instead of '+00:00'.
+    Formatted by msgspec, isoformat of a pytz timestamp is several times slower.
+
+    Args:
+        timestamp (datetime.datetime | int | None): the fetched timestamp.
+
+    Returns:
+        str | None: the formatted timestamp, unchanged if it cant be converted.
+    """
+    timestamp = to_timezone(timestamp)
+    if not isinstance(timestamp, datetime.datetime):
+        return timestamp
+    text = msgspec.to_builtins(timestamp)
+    if text[-1] == 'Z':
+        return text[:-1] + '+00:00'
+    return text
+
+def to_bool(value) -> bool | None:
+    """converts a fetched integer flag to bool.
+
+    Args:
+        value: the fetched value.
+
+    Returns:
+        bool | None: the flag, None stays None.
+    """
+    if value is None:
+        return None
+    return bool(value)
+
+def to_enum(enum: type) -> Callable:
+    """creates a converter to an enum, values that arent in the enum become None.
+
+    Args:
+        enum (type): the enum class.
+
+    Returns:
+        Callable: the converter.
+    """
+    members = {member.value: member for member in enum}
+
+    def convert(value):
+        return members.get(value)
+    return convert
+
+
+class RowDecoder:
+    """decodes the rows of one query into a pydantic class or its msgspec mirror.
+
+    Args:
+        model (type[BaseModel]): the pydantic class.
+        struct (type[msgspec.Struct] | None): the msgspec mirror of the class, see as_struct.
+        columns (Sequence[str | None]): field of every column, None skips the column.
+        converters (dict[str, Callable], optional): converter per field. Defaults to None.
+        struct_converters (dict[str, Callable], optional): converter per field for the msgspec mirror,
+        replaces the converter of the field. Defaults to None.
+    """
+
+    def __init__(self,
+                 model: type[BaseModel],
+                 struct: type[msgspec.Struct] | None,
+                 columns: Sequence[str | None],
+                 converters: dict[str, Callable] = None,
+                 struct_converters: dict[str, Callable] = None):
+        self.model = model
+        self.struct = struct
+        self.width = len(columns)
+        converters = converters or {}
+        struct_converters = {**converters, **(struct_converters or {})}
+        # (column position, field, converter), resolved once.
+        self._fields = [(position, field, converters.get(field))
+                        for position, field in enumerate(columns) if field is not None]
+        self._struct_fields = [(position, field, struct_converters.get(field))
+                               for position, field in enumerate(columns) if field is not None]
+
+    def values(self, row: Sequence, as_struct: bool = False) -> dict | None:
+        """maps the columns of the row to the fields.
+
+        Args:
+            row (Sequence): the fetched row.
+            as_struct (bool, optional): use the converters of the msgspec mirror. Defaults to False.
+
+        Returns:
+            dict | None: value per field, None if the row doesnt match the columns.
+        """
+        if not row or len(row) != self.width:
+            return None
+        fields = self._struct_fields if as_struct else self._fields
+        return {field: row[position] if converter is None else converter(row[position])
+                for position, field, converter in fields}
+
+    def decode(self, row: Sequence, as_struct: bool = False, **extra) -> BaseModel | msgspec.Struct | None:
+        """decodes one row.
+
+        Args:
+            row (Sequence): the fetched row.
+            as_struct (bool, optional): build the msgspec mirror instead of the pydantic class.
+            Defaults to False.
+            **extra: values of fields that dont come from the row.
+
+        Returns:
+            BaseModel | msgspec.Struct | None: the object, None if the row doesnt match the columns.
+        """
+        values = self.values(row, as_struct)
+        if values is None:
+            return None
+        values.update(extra)
+        if as_struct:
+            return self.struct(**values)
+        return self.model.construct(**values)
+
+    def decode_all(self, rows: Iterable[Sequence], as_struct: bool = False) -> List:
+        """decodes all rows, rows that dont match the columns are skipped.
+
+        Args:
+            rows (Iterable[Sequence]): the fetched rows.
+            as_struct (bool, optional): build the msgspec mirror instead of the pydantic class.
+            Defaults to False.
+
+        Returns:
+            List: the objects.
+        """
+        output = []
+        for row in rows:
+            obj = self.decode(row, as_struct)
+            if obj is not None:
+                output.append(obj)
+        return output
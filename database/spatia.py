@@ -2,12 +2,21 @@
 import json
 from typing import List
 import msgspec
+from api.dependencies.classes import Detail
 
 geo_types = {'Point', 'MultiPoint', 'LineString', 'MultiLineString',
              'Polygon', 'MultiPolygon'}
 
 wkt_types = {x.upper() for x in geo_types}
 
+# tolerance in degrees of the topology preserving simplification per level of detail.
+DETAIL_TOLERANCES = {
+    Detail.MEDIUM: 0.0005,
+    Detail.LOW: 0.002,
+}
+# decimal places of the simplified geojson, 5 places are about 1m.
+DETAIL_PRECISION = 5
+
 type_translations = {x.upper(): x for x in geo_types}
 
 def spatiapoint_to_long_lat(spatia_point:str)-> tuple[float, float]:
@@ -151,3 +160,16 @@ def geojson_insert_text(geometry):
 
     geo_json['crs'] = {"type":"name","properties":{"name":"EPSG:4326"}}
     return json.dumps(geo_json)
+
+def simplified_geojson_sql(geometry:str, detail:Detail) -> str:
+    """generates the sql expression for the simplified geojson of a geometry column.
+
+    Args:
+        geometry (str): name of the geometry column.
+        detail (Detail): MEDIUM or LOW.
+
+    Returns:
+        str: sql expression.
+    """
+    tolerance = DETAIL_TOLERANCES[detail]
+    return f'AsGeoJSON(SimplifyPreserveTopology({geometry}, {tolerance}), {DETAIL_PRECISION})'
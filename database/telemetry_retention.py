@@ -0,0 +1,89 @@
+"""Retention of the drone telemetry.
+
+Updates that are older than TELEMETRY_HOT_HOURS are downsampled into drone_data_archive,
+one update per drone and TELEMETRY_DOWNSAMPLE_SECONDS (the latest of each interval),
+and removed from drone_data. So drone_data only holds the recent updates and stays small.
+The reads of drone_updates_table span both tables, see drone_updates_table.PARTITIONS.
+If TELEMETRY_RETENTION is 'True', the retention runs every TELEMETRY_RETENTION_SWEEP_SECONDS.
+"""
+import asyncio
+import datetime
+import os
+import sqlite3
+import time
+import database.database as db
+from database.drone_updates_table import ARCHIVE_TABLE, HOT_TABLE
+
+TELEMETRY_RETENTION = os.getenv('TELEMETRY_RETENTION', 'False') == 'True'
+TELEMETRY_HOT_HOURS = float(os.getenv('TELEMETRY_HOT_HOURS', '168'))
+TELEMETRY_DOWNSAMPLE_SECONDS = int(os.getenv('TELEMETRY_DOWNSAMPLE_SECONDS', '60'))
+TELEMETRY_RETENTION_SWEEP_SECONDS = float(os.getenv('TELEMETRY_RETENTION_SWEEP_SECONDS', '3600'))
+
+# the bare columns are taken from the row with the latest timestamp of each group.
+# the interval is the first group term, so the index on timestamp is used for the range,
+# instead of reading all updates in drone_id order.
+# the ids of drone_data are never reused, so an id that is already archived is an error.
+ARCHIVE_UPDATES = f'''INSERT INTO {ARCHIVE_TABLE}
+                (id, drone_id, timestamp, flight_range, flight_time, zone_id, coordinates, ts)
+                SELECT id, drone_id, MAX(timestamp), flight_range, flight_time, zone_id, coordinates, ts
+                FROM {HOT_TABLE}
+                WHERE timestamp < ?
+                GROUP BY CAST(strftime('%s', timestamp) AS integer) / ?, drone_id;'''
+
+PURGE_UPDATES = f'DELETE FROM {HOT_TABLE} WHERE timestamp < ?;'
+
+
+def get_horizon(hot_hours: float = TELEMETRY_HOT_HOURS,
+                interval: int = TELEMETRY_DOWNSAMPLE_SECONDS) -> datetime.datetime:
+    """start of the hot updates, rounded down to the downsampling interval,
+    so an interval is never split between two runs.
+
+    Args:
+        hot_hours (float, optional): hours the updates stay in drone_data. Defaults to TELEMETRY_HOT_HOURS.
+        interval (int, optional): seconds per archived update. Defaults to TELEMETRY_DOWNSAMPLE_SECONDS.
+
+    Returns:
+        datetime.datetime: updates older than this are archived.
+    """
+    horizon = time.time() - hot_hours * 3600
+    return datetime.datetime.utcfromtimestamp(horizon // interval * interval)
+
+def archive_updates(horizon: datetime.datetime = None,
+                    interval: int = TELEMETRY_DOWNSAMPLE_SECONDS) -> int | None:
+    """downsamples the updates older than horizon into the archive and removes them from drone_data,
+    both in one transaction.
+
+    Args:
+        horizon (datetime.datetime, optional): updates older than this are archived.
+        Defaults to None, see get_horizon.
+        interval (int, optional): seconds per archived update. Defaults to TELEMETRY_DOWNSAMPLE_SECONDS.
+
+    Returns:
+        int | None: number of removed updates, None if something went wrong.
+    """
+    if horizon is None:
+        horizon = get_horizon(interval=interval)
+
+    try:
+        with db.database_connection() as conn:
+            try:
+                conn.execute(ARCHIVE_UPDATES, (horizon, interval))
+                purged = conn.execute(PURGE_UPDATES, (horizon,)).rowcount
+                conn.commit()
+                return purged
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+    except sqlite3.Error as exception:
+        print(exception)
+    return None
+
+async def run_retention(interval: float = TELEMETRY_RETENTION_SWEEP_SECONDS) -> None:
+    """runs archive_updates every interval seconds, until the task is cancelled.
+
+    Args:
+        interval (float, optional): seconds between two runs. Defaults to TELEMETRY_RETENTION_SWEEP_SECONDS.
+    """
+    while True:
+        await db.run_async(archive_updates)
+        await asyncio.sleep(interval)
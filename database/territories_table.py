@@ -7,10 +7,11 @@ import datetime
 from typing import List
 
 import pytz
-from database import drone_events_table, zones_table
+from database import area_cache_table, drone_events_table, zones_table
 import database.database as db
+from database.row_decoding import to_isoformat
 from database.spatia import spatiageostr_to_geojson
-from api.dependencies.classes import FireRisk, TerritoryWithZones, Zone
+from api.dependencies.classes import Detail, TerritoryWithZones, TerritoryWithZonesStruct, Zone
 
 
 CREATE_TERRITORY_TABLE = '''CREATE TABLE IF NOT EXISTS territories
@@ -44,33 +45,22 @@ territories.id,
 territories.orga_id,
 territories.name,
 territories.description,
-AsGeoJSON(GUnion(area)) as oarea,
-X(ST_Centroid(GUnion(area)))as lon,
-Y(ST_Centroid(GUnion(area)))as lat,
-MAX(newdrone_data.ts),
-COUNT(DISTINCT drone_id),
-COUNT(DISTINCT territory_zones.zone_id)
+area_cache.geojson,
+area_cache.lon,
+area_cache.lat,
+MAX(drone_latest.timestamp),
+COUNT(DISTINCT drone_latest.drone_id),
+COUNT(DISTINCT territory_zones.zone_id),
+IFNULL(MAX(zone_risk.max_smoke), 0),
+IFNULL(MAX(zone_risk.max_fire), 0)
 from territories
+JOIN area_cache ON area_cache.kind = 'territory' AND area_cache.owner_id = territories.id
 JOIN territory_zones ON territory_zones.territory_id = territories.id
-JOIN zones ON territory_zones.zone_id = zones.id
-LEFT OUTER JOIN (
-        SELECT coordinates, MAX(timestamp) as ts, drone_id
-        from drone_data
-        group by drone_data.drone_id
-    ) AS newdrone_data
-ON ST_Intersects(newdrone_data.coordinates, area)
+LEFT OUTER JOIN drone_latest ON drone_latest.zone_id = territory_zones.zone_id
+LEFT OUTER JOIN zone_risk ON zone_risk.zone_id = territory_zones.zone_id
 {}
 group by territories.id;"""
 
-GET_ORGA_AREA = """
-SELECT 
-AsGeoJSON(GUnion(area)) as oarea
-from zones
-JOIN territory_zones 
-ON zones.id = territory_zones.zone_id
-JOIN territories ON territories.id = territory_zones.territory_id
-WHERE territories.orga_id = ?
-;"""
 
 def create_territory(orga_id: int, name: str, description: str=None) -> int | None:
     """create a territory.
@@ -85,38 +75,58 @@ def create_territory(orga_id: int, name: str, description: str=None) -> int | No
     """
     return db.insert(INSERT_TERRITORY, (orga_id, name, description))
 
-def get_territory(territory_id: int) -> TerritoryWithZones:
+def with_detail(sql: str, detail: Detail) -> str:
+    """replaces the full geojson of the territory select with the requested level of detail.
+
+    Args:
+        sql (str): the territory select.
+        detail (Detail): level of detail.
+
+    Returns:
+        str: the sql.
+    """
+    return sql.replace('area_cache.geojson', area_cache_table.GEOJSON_DETAIL[detail], 1)
+
+def get_territory(territory_id: int, detail: Detail = Detail.FULL) -> TerritoryWithZones:
     """get a territory by its id.
 
     Args:
         territory_id (int): id of the territory to fetch.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to Detail.FULL.
 
     Returns:
         Territory: the territory object.
     """
-    sql = GET_ORGA_TERRITORIES.format('WHERE territories.id = ?')
+    area_cache_table.fill()
+    sql = with_detail(GET_ORGA_TERRITORIES, detail).format('WHERE territories.id = ?')
     fetched_territory = db.fetch_one(sql, (territory_id,))
     if fetched_territory is None or fetched_territory[0] is None:
         return None
 
     return get_obj_from_fetched(fetched_territory)
 
-def get_territories(orga_id: int) -> List[TerritoryWithZones]:
+def get_territories(orga_id: int,
+                    detail: Detail = Detail.FULL,
+                    as_struct: bool = False) -> List[TerritoryWithZones]:
     """fetch all territories.
 
     Args:
         orga_id (int): id of the organization that the territories belong to.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to Detail.FULL.
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
 
     Returns:
         list: list of all territories, linked to the organization.
     """
-    sql = GET_ORGA_TERRITORIES.format('WHERE territories.orga_id = ?')
+    area_cache_table.fill()
+    sql = with_detail(GET_ORGA_TERRITORIES, detail).format('WHERE territories.orga_id = ?')
     fetched_territories = db.fetch_all(sql, (orga_id,))
     if fetched_territories is None:
         return None
     output = []
     for territory in fetched_territories:
-        territory_obj = get_obj_from_fetched(territory)
+        territory_obj = get_obj_from_fetched(territory, as_struct)
         if territory_obj:
             output.append(territory_obj)
     return output
@@ -130,11 +140,7 @@ def get_orga_area(orga_id) -> str | None:
     Returns:
         str | None: the area of all territories of an organization. As a geojson string.
     """
-
-    polygon = db.fetch_one(GET_ORGA_AREA, (orga_id,))
-    if polygon is not None:
-        return polygon[0]
-    return None
+    return area_cache_table.get_area(area_cache_table.ORGA, orga_id)
 
 def get_territory_zones(orga_id: int) -> List[Zone]:
     """fetch all zones of all territories of an organization.
@@ -145,27 +151,26 @@ def get_territory_zones(orga_id: int) -> List[Zone]:
     Returns:
         list: list of all zones.
     """
-    oraga_area = get_orga_area(orga_id)
-    return zones_table.get_zones_in_area(oraga_area)
+    return zones_table.get_zones_in_cached_area(area_cache_table.ORGA, orga_id)
 
 
-def get_obj_from_fetched(fetched_territory: tuple) -> TerritoryWithZones:
+def get_obj_from_fetched(fetched_territory: tuple,
+                         as_struct: bool = False) -> TerritoryWithZones | TerritoryWithZonesStruct:
     """get a territory object from a fetched tuple.
 
     Args:
         fetched_territory (tuple): the fetched tuple.
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
 
     Returns:
         Territory: the territory object.
     """
-    if not db.fetched_match_class(TerritoryWithZones, fetched_territory, subtract=2):
+    if not db.fetched_match_class(TerritoryWithZones, fetched_territory):
         return None
 
     geo_json = spatiageostr_to_geojson(fetched_territory[4])
 
-    events = drone_events_table.get_drone_event(
-                                    polygon=fetched_territory[4])
-
     la_timestam = fetched_territory[7]
 
     try:
@@ -179,14 +184,12 @@ def get_obj_from_fetched(fetched_territory: tuple) -> TerritoryWithZones:
             la_timestam = la_timestam.astimezone(pytz.timezone(db.TIMEZONE))
     except ValueError:
         pass
+    if as_struct:
+        la_timestam = to_isoformat(la_timestam)
 
-    if events:
-        try:
-            ai_firerisk_enum = drone_events_table.calculate_firerisk(events)[0]
-        except IndexError:
-            ai_firerisk_enum = FireRisk(0)
-    else:
-        ai_firerisk_enum = FireRisk(0)
+    # highest risk of all zones, precomputed in zone_risk.
+    ai_firerisk_enum = drone_events_table.get_firerisk(fetched_territory[10],
+                                                       fetched_territory[11])[0]
 
     zone_count = fetched_territory[9]
 
@@ -197,15 +200,35 @@ def get_obj_from_fetched(fetched_territory: tuple) -> TerritoryWithZones:
         lon = None
         lat= None
 
-    return TerritoryWithZones(id=fetched_territory[0],
-                              orga_id=fetched_territory[1],
-                              name=fetched_territory[2],
-                              description=fetched_territory[3],
-                              dwd_fire_risk=None,
-                              ai_fire_risk=ai_firerisk_enum,
-                              drone_count=fetched_territory[8],
-                              last_update=la_timestam,
-                              zone_count=zone_count,
-                              geo_json=geo_json,
-                              lon=lon,
-                              lat=lat)
+    model = TerritoryWithZonesStruct if as_struct else TerritoryWithZones
+    return model(id=fetched_territory[0],
+                 orga_id=fetched_territory[1],
+                 name=fetched_territory[2],
+                 description=fetched_territory[3],
+                 dwd_fire_risk=None,
+                 ai_fire_risk=ai_firerisk_enum,
+                 drone_count=fetched_territory[8],
+                 last_update=la_timestam,
+                 zone_count=zone_count,
+                 geo_json=geo_json,
+                 lon=lon,
+                 lat=lat)
+
+async def get_territory_async(territory_id: int,
+                              detail: Detail = Detail.FULL) -> TerritoryWithZones:
+    """awaitable version of get_territory, runs on the database executor.
+
+    Returns:
+        TerritoryWithZones: see get_territory.
+    """
+    return await db.run_async(get_territory, territory_id, detail)
+
+async def get_territories_async(orga_id: int,
+                                detail: Detail = Detail.FULL,
+                                as_struct: bool = False) -> List[TerritoryWithZones]:
+    """awaitable version of get_territories, runs on the database executor.
+
+    Returns:
+        List[TerritoryWithZones]: see get_territories.
+    """
+    return await db.run_async(get_territories, orga_id, detail, as_struct)
@@ -3,9 +3,9 @@
 """
 from typing import List
 
-from api.dependencies.classes import Organization, Zone
+from api.dependencies.classes import Detail, Organization, Zone, ZoneStruct
 import database.database as db
-from database import zones_table
+from database import area_cache_table, zones_table
 import database.organizations_table as orgas_table
 
 CREATE_TERRITORYZONES_TABLE = """ CREATE TABLE territory_zones
@@ -21,6 +21,7 @@ CREATE INDEX IF NOT EXISTS territory_zones_FK_2 ON territory_zones (territory_id
 CREATE INDEX IF NOT EXISTS territory_zones_FK_3 ON territory_zones (zone_id);"""
 
 INSERT_ORGAZONE =  "INSERT INTO territory_zones (territory_id,zone_id) VALUES (?,?);"
+DELETE_ORGAZONE =  "DELETE FROM territory_zones WHERE territory_id = ? AND zone_id = ?;"
 
 
 GET_ZONEORGAS = ''' SELECT *
@@ -35,39 +36,60 @@ GET_ORGAZONES_BY_ZONE = 'SELECT territory_id FROM territory_zones WHERE zone_id=
 UPDATE_ATTRIBUTE = 'UPDATE territory_zones SET {} = ? WHERE name = ?;'
 
 
-def link_territory_zone(territory_id:int,zone_id:int)->bool:
-    """link a territory with a zone.
+def link_territory_zone(territory_id:int,zone_id:int,refresh:bool=True)->bool:
+    """link a territory with a zone and recompute the cached area of the territory.
 
     Args:
         territory_id (int): id of the territory that should be linked.
         zone_id (int): id of the zone that should be linked.
+        refresh (bool, optional): recompute the cached area, pass False when linking many zones
+        and call area_cache_table.refresh_territory once afterwards. Defaults to True.
 
     Returns:
         bool: returns if action was successful.
     """
     inserted_id = db.insert(INSERT_ORGAZONE,(territory_id,zone_id))
     if inserted_id:
+        if refresh:
+            area_cache_table.refresh_territory(territory_id)
         return True
 
     return False
 
-def get_zones_by_orga(orga_id:int) -> List[Zone] | None:
+def unlink_territory_zone(territory_id:int,zone_id:int)->bool:
+    """remove the link between a territory and a zone and recompute the cached area of the territory.
+
+    Args:
+        territory_id (int): id of the territory.
+        zone_id (int): id of the zone.
+
+    Returns:
+        bool: returns if action was successful.
+    """
+    if db.update(DELETE_ORGAZONE,(territory_id,zone_id)):
+        return area_cache_table.refresh_territory(territory_id)
+
+    return False
+
+def get_zones_by_orga(orga_id:int,
+                      detail:Detail = Detail.FULL,
+                      as_struct:bool = False) -> List[Zone] | List[ZoneStruct] | None:
     """fetches all zones, linked to an organization.
 
     Args:
         territory_id (int): id of the territory.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to Detail.FULL.
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
 
     Returns:
         List[Zone] | None: list of zones.
     """
-    fetched_zones = db.fetch_all(zones_table.GET_ORGAZONES,(orga_id,))
+    sql = zones_table.with_detail(zones_table.GET_ORGAZONES, detail)
+    fetched_zones = db.fetch_all(sql,(orga_id,))
     if fetched_zones is None:
         return None
-    output = []
-    for fetched in fetched_zones:
-        zone = zones_table.get_obj_from_fetched(fetched)
-        output.append(zone)
-    return output
+    return zones_table.get_objs_from_fetched(fetched_zones, as_struct=as_struct)
 
 def get_orgas_by_zone(zone_id:int) -> List[Organization] | None:
     """get orgas that are linked to this zone.
@@ -87,30 +109,58 @@ def get_orgas_by_zone(zone_id:int) -> List[Organization] | None:
         output.append(orga)
     return output
 
-def get_orgazones_by_name(name,orga_id) -> Zone | None:
+def get_orgazones_by_name(name,orga_id,detail:Detail = Detail.FULL) -> Zone | None:
     """fetch the zone by its name and make sure its a zone that the orga is allowed to see.
 
     Args:
         name (str): name of the zone.
         orga_id (int): id of the orga that want to access this zones data.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to Detail.FULL.
 
     Returns:
         Zone | None: zone object.
     """
-    sql = zones_table.GET_ZONEJOINORGA.format('name')
+    sql = zones_table.with_detail(zones_table.GET_ZONEJOINORGA, detail).format('name')
     fetched_zone = db.fetch_one(sql,(name,orga_id))
     return zones_table.get_obj_from_fetched(fetched_zone)
 
-def get_orgazone_by_id(zone_id,orga_id) -> Zone | None:
+def get_orgazone_by_id(zone_id,orga_id,detail:Detail = Detail.FULL) -> Zone | None:
     """fetch the zone by its id and make sure its a zone that the orga is allowed to see.
 
     Args:
         zone_id (int): id of the zone.
         orga_id (int): id of the orga that want to access this zones data.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to Detail.FULL.
 
     Returns:
         Zone | None: zone object.
     """
-    sql = zones_table.GET_ZONEJOINORGA.format('id')
+    sql = zones_table.with_detail(zones_table.GET_ZONEJOINORGA, detail).format('id')
     fetched_zone = db.fetch_one(sql,(zone_id,orga_id))
     return zones_table.get_obj_from_fetched(fetched_zone)
+
+async def get_zones_by_orga_async(orga_id:int,
+                                  detail:Detail = Detail.FULL,
+                                  as_struct:bool = False) -> List[Zone] | List[ZoneStruct] | None:
+    """awaitable version of get_zones_by_orga, runs on the database executor.
+
+    Returns:
+        List[Zone] | List[ZoneStruct] | None: see get_zones_by_orga.
+    """
+    return await db.run_async(get_zones_by_orga, orga_id, detail, as_struct)
+
+async def get_orgazones_by_name_async(name, orga_id, detail:Detail = Detail.FULL) -> Zone | None:
+    """awaitable version of get_orgazones_by_name, runs on the database executor.
+
+    Returns:
+        Zone | None: see get_orgazones_by_name.
+    """
+    return await db.run_async(get_orgazones_by_name, name, orga_id, detail)
+
+async def get_orgazone_by_id_async(zone_id, orga_id, detail:Detail = Detail.FULL) -> Zone | None:
+    """awaitable version of get_orgazone_by_id, runs on the database executor.
+
+    Returns:
+        Zone | None: see get_orgazone_by_id.
+    """
+    return await db.run_async(get_orgazone_by_id, zone_id, orga_id, detail)
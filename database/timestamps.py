@@ -0,0 +1,21 @@
+"""Helper functions for the timestamps of the tables.
+
+The timestamp columns store the datetimes as text and are compared as text,
+so all writers store naive UTC, see to_utc.
+"""
+import datetime
+
+
+def to_utc(timestamp: datetime.datetime) -> datetime.datetime:
+    """converts a datetime to a naive datetime in UTC, naive datetimes are UTC already.
+    Makes timestamps with and without timezone comparable.
+
+    Args:
+        timestamp (datetime.datetime): the datetime.
+
+    Returns:
+        datetime.datetime: the naive datetime in UTC.
+    """
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
@@ -1,11 +1,18 @@
 """funcs to read and write on the users table in database."""
+import os
+import threading
+import time
+from collections import OrderedDict
 from enum import Enum
 from typing import List
 
 from api.dependencies.classes import User, UserWithSensitiveInfo, Permission
-from database.database import fetched_match_class
 import database.database as db
 from database import organizations_table as organizations
+from database.row_decoding import RowDecoder, to_bool, to_enum
+
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '1024'))
+USER_CACHE_SECONDS = float(os.getenv('USER_CACHE_SECONDS', '30'))
 
 CREATE_USER_TABLE = """ CREATE TABLE IF NOT EXISTS users (
                         id INTEGER,
@@ -60,6 +67,21 @@ GET_USER_WITH_ORGA = '''SELECT
                         WHERE {}=?;'''
 CHECK_CREDS = "SELECT password FROM users WHERE EMAIL=? AND PASSWORD = ?;"
 
+# columns of GET_USER_WITH_ORGA, the organization is decoded by organizations_table.
+USER_CONVERTERS = {
+    'permission': to_enum(Permission),
+    'disabled': to_bool,
+    'email_verified': to_bool,
+}
+SENSITIVE_USER_DECODER = RowDecoder(UserWithSensitiveInfo, None,
+                                    ['id', 'email', 'first_name', 'last_name', 'hashed_password',
+                                     'permission', 'disabled', 'email_verified', None, None, None],
+                                    USER_CONVERTERS)
+USER_DECODER = RowDecoder(User, None,
+                          ['id', 'email', 'first_name', 'last_name', None,
+                           'permission', 'disabled', 'email_verified', None, None, None],
+                          USER_CONVERTERS)
+
 def create_user(user:UserWithSensitiveInfo) -> bool:
     """Create an entry for an user.
 
@@ -153,7 +175,9 @@ def update_user(user_id:int, attribute:UsrAttributes, new_value):
         new_value (_type_): the new value of the choosen attribute.
     """
     update_str = UPDATE_ATTRIBUTE.format(attribute)
-    return db.update(update_str,(new_value, user_id))
+    updated = db.update(update_str,(new_value, user_id))
+    user_cache.invalidate(user_id)
+    return updated
 
 def delete_user(user_id:int)->bool:
     """remove user from db.
@@ -164,7 +188,9 @@ def delete_user(user_id:int)->bool:
     Returns:
         bool: True if removal was successful.
     """
-    return db.update(DELETE,(user_id,))
+    deleted = db.update(DELETE,(user_id,))
+    user_cache.invalidate(user_id)
+    return deleted
 
 def update_user_withsql(user_id:int, set_sql: str, update_arr:List):
     """updates the user with the given sql str.
@@ -180,7 +206,9 @@ def update_user_withsql(user_id:int, set_sql: str, update_arr:List):
     update_str = UPDATE_STR.format(set_sql)
     update_arr.append(user_id)
     update_tuple = tuple(update_arr)
-    return db.update(update_str,update_tuple)
+    updated = db.update(update_str,update_tuple)
+    user_cache.invalidate(user_id)
+    return updated
 
 
 def check_creds(mail:str,hashed_pass:str) -> bool:
@@ -199,7 +227,7 @@ def check_creds(mail:str,hashed_pass:str) -> bool:
 def get_obj_from_fetched(fetched_user,
                          with_sensitive_info:bool
                          ) -> User | UserWithSensitiveInfo | None:
-    """generate User obj from fetched element.
+    """generate User obj from fetched element, see USER_DECODER.
 
     Args:
         fetched_user (list): fetched attributes from User.
@@ -207,39 +235,172 @@ def get_obj_from_fetched(fetched_user,
     Returns:
         UserWithSensitiveInfo | None: User object or None if obj cant be generated.
     """
-
-    if not fetched_match_class(UserWithSensitiveInfo,fetched_user, add=2):
+    decoder = SENSITIVE_USER_DECODER if with_sensitive_info else USER_DECODER
+    if not fetched_user or len(fetched_user) != decoder.width:
         raise ValueError('Fetched data noch matching format.')
+    return decoder.decode(fetched_user,
+                          organization=organizations.get_obj_from_fetched(fetched_user[-3:]))
 
-    try:
-        permission = Permission(fetched_user[5])
-    except ValueError:
-        permission = None
-    try:
-        orga = organizations.get_obj_from_fetched(fetched_user[-3:])
-    except IndexError:
-        orga = None
-
-    if with_sensitive_info:
-        user = UserWithSensitiveInfo(
-                            id=fetched_user[0],
-                            email=fetched_user[1],
-                            first_name=fetched_user[2],
-                            last_name=fetched_user[3],
-                            hashed_password=fetched_user[4],
-                            permission=permission,
-                            disabled=fetched_user[6],
-                            email_verified=fetched_user[7],
-                            organization=orga)
-    else:
-        user = User(
-                    id=fetched_user[0],
-                    email=fetched_user[1],
-                    first_name=fetched_user[2],
-                    last_name=fetched_user[3],
-                    permission=permission,
-                    disabled=fetched_user[6],
-                    email_verified=fetched_user[7],
-                    organization=orga)
+async def create_user_async(user:UserWithSensitiveInfo) -> bool:
+    """awaitable version of create_user, runs on the database executor.
 
-    return user
+    Returns:
+        bool: see create_user.
+    """
+    return await db.run_async(create_user, user)
+
+async def get_user_async(email, with_sensitive_info:bool=True) -> UserWithSensitiveInfo | None:
+    """awaitable version of get_user, runs on the database executor.
+
+    Returns:
+        UserWithSensitiveInfo | None: see get_user.
+    """
+    return await db.run_async(get_user, email, with_sensitive_info)
+
+async def get_user_by_id_async(user_id:int, with_sensitive_info:bool=False) -> UserWithSensitiveInfo | None:
+    """awaitable version of get_user_by_id, runs on the database executor.
+
+    Returns:
+        UserWithSensitiveInfo | None: see get_user_by_id.
+    """
+    return await db.run_async(get_user_by_id, user_id, with_sensitive_info)
+
+async def get_all_users_async(orga_id:int) -> List[User]:
+    """awaitable version of get_all_users, runs on the database executor.
+
+    Returns:
+        List[User]: see get_all_users.
+    """
+    return await db.run_async(get_all_users, orga_id)
+
+async def delete_user_async(user_id:int) -> bool:
+    """awaitable version of delete_user, runs on the database executor.
+
+    Returns:
+        bool: see delete_user.
+    """
+    return await db.run_async(delete_user, user_id)
+
+async def update_user_withsql_async(user_id:int, set_sql: str, update_arr:List) -> bool:
+    """awaitable version of update_user_withsql, runs on the database executor.
+
+    Returns:
+        bool: see update_user_withsql.
+    """
+    return await db.run_async(update_user_withsql, user_id, set_sql, update_arr)
+
+
+class UserCache:
+    """least recently used cache of the users of get_current_user, keyed by email.
+    Entries expire after max_age seconds, so changes that dont go through update_user,
+    update_user_withsql or delete_user (e.g. a disabled user or a renamed organization)
+    are picked up within max_age. Those functions invalidate the user by id immediately.
+
+    Args:
+        size (int): maximum number of cached users.
+        max_age (float): seconds after which a cached user is fetched again.
+    """
+
+    def __init__(self, size: int = USER_CACHE_SIZE, max_age: float = USER_CACHE_SECONDS):
+        self.size = size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._users: OrderedDict[str, tuple[float, UserWithSensitiveInfo]] = OrderedDict()
+        # email of every cached user id, so updates by id find the entry.
+        self._emails: dict[int, str] = {}
+        # incremented by every invalidation, a fetch that overlapped one isnt cached.
+        self._generation = 0
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def _lookup(self, email: str, count_miss: bool = True) -> tuple[UserWithSensitiveInfo | None, int]:
+        """the cached user if it didnt expire and the current generation.
+
+        Args:
+            email (str): email adress of the user.
+            count_miss (bool, optional): count a miss if the user isnt cached. Defaults to True.
+
+        Returns:
+            tuple[UserWithSensitiveInfo | None, int]: the user or None, the generation.
+        """
+        with self._lock:
+            cached = self._users.get(email)
+            if cached is not None and time.monotonic() - cached[0] < self.max_age:
+                self._users.move_to_end(email)
+                self._stats['hits'] += 1
+                return cached[1], self._generation
+            if count_miss:
+                self._stats['misses'] += 1
+            return None, self._generation
+
+    def get_user(self, email: str) -> UserWithSensitiveInfo | None:
+        """returns the cached user if it didnt expire, otherwise fetches it with get_user.
+
+        Args:
+            email (str): email adress of the user.
+
+        Returns:
+            UserWithSensitiveInfo | None: the user with sensitive information, None if it doesnt exist.
+        """
+        cached, generation = self._lookup(email)
+        if cached is not None:
+            return cached
+
+        user = get_user(email)
+        if user is None:
+            return None
+
+        with self._lock:
+            if generation == self._generation:
+                self._users[email] = (time.monotonic(), user)
+                self._users.move_to_end(email)
+                self._emails[user.id] = email
+                while len(self._users) > self.size:
+                    _, (_, removed) = self._users.popitem(last=False)
+                    self._emails.pop(removed.id, None)
+        return user
+
+    def invalidate(self, user_id: int) -> None:
+        """removes the user from the cache, called after the user was changed,
+        so a fetch that read the old row while the change was written isnt kept.
+
+        Args:
+            user_id (int): id of the user.
+        """
+        with self._lock:
+            self._generation += 1
+            self._stats['invalidations'] += 1
+            email = self._emails.pop(user_id, None)
+            if email is not None:
+                self._users.pop(email, None)
+
+    def clear(self) -> None:
+        """removes all cached users."""
+        with self._lock:
+            self._generation += 1
+            self._users.clear()
+            self._emails.clear()
+
+    def stats(self) -> dict:
+        """metrics of the cache.
+
+        Returns:
+            dict: hits, misses and invalidations since the start and the number of cached users.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._users)
+        return stats
+
+    async def get_user_async(self, email: str) -> UserWithSensitiveInfo | None:
+        """awaitable version of get_user, the database is only used on a miss.
+
+        Returns:
+            UserWithSensitiveInfo | None: see get_user.
+        """
+        cached, _ = self._lookup(email, count_miss=False)
+        if cached is not None:
+            return cached
+        return await db.run_async(self.get_user, email)
+
+
+user_cache = UserCache()
@@ -0,0 +1,365 @@
+"""Mapbox vector tiles of the zones, territories and drones of an organization.
+
+A tile contains the layers 'zones', 'territories' and 'drones', cut to the tile
+(plus a small buffer) and projected to web mercator.
+Encoded tiles are cached per (orga, z, x, y) together with a stamp of the organization's data,
+the stamp changes with every ingest into the organization's zones (zones.last_update, drone_latest),
+with new events in them and when zones are linked or unlinked.
+Cached tiles are also dropped after TILE_CACHE_SECONDS, so the sweep of zone_risk is picked up.
+The stamp itself is reused for TILE_STAMP_SECONDS, so the tiles of one map view share one stamp query.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+import mapbox_vector_tile
+import numpy
+import shapely
+from api.dependencies.classes import Detail
+from database import area_cache_table, drone_events_table, zones_table
+import database.database as db
+
+TILE_CACHE_SIZE = int(os.getenv('TILE_CACHE_SIZE', '2048'))
+TILE_CACHE_SECONDS = float(os.getenv('TILE_CACHE_SECONDS', '300'))
+TILE_STAMP_SECONDS = float(os.getenv('TILE_STAMP_SECONDS', '2'))
+
+TILE_EXTENT = 4096
+# the geometries are cut with this buffer around the tile, in tile units.
+TILE_BUFFER = 64
+MAX_ZOOM = 22
+
+EARTH_RADIUS = 6378137.0
+MERCATOR_MAX = math.pi * EARTH_RADIUS
+MAX_LATITUDE = 85.0511287798
+
+# only the zones of the organization count, so ingest in other organizations keeps the tiles cached.
+# the count and the sum of the drones change when a drone leaves the zones.
+GET_TILE_STAMP = '''WITH orga_zones AS (
+                    SELECT territory_zones.zone_id
+                    FROM territory_zones
+                    JOIN territories ON territories.id = territory_zones.territory_id
+                    WHERE territories.orga_id = ?)
+                SELECT
+                (SELECT MAX(last_update) FROM zones WHERE id IN (SELECT zone_id FROM orga_zones)),
+                (SELECT COUNT(*) FROM orga_zones),
+                (SELECT MAX(timestamp) FROM drone_latest WHERE zone_id IN (SELECT zone_id FROM orga_zones)),
+                (SELECT COUNT(*) FROM drone_latest WHERE zone_id IN (SELECT zone_id FROM orga_zones)),
+                (SELECT TOTAL(drone_id) FROM drone_latest WHERE zone_id IN (SELECT zone_id FROM orga_zones)),
+                (SELECT MAX(id) FROM drone_event WHERE zone_id IN (SELECT zone_id FROM orga_zones));'''
+
+GET_TILE_ZONES = '''SELECT zones.id, zones.name, zones.district, zones.last_update, AsGeoJSON(area),
+                IFNULL(MAX(zone_risk.max_smoke), 0),
+                IFNULL(MAX(zone_risk.max_fire), 0)
+                FROM zones
+                JOIN territory_zones ON territory_zones.zone_id = zones.id
+                JOIN territories ON territories.id = territory_zones.territory_id
+                LEFT OUTER JOIN zone_risk ON zone_risk.zone_id = zones.id
+                WHERE territories.orga_id = ?
+                AND zones.ROWID IN (
+                    SELECT ROWID FROM SpatialIndex
+                    WHERE f_table_name = 'zones' AND f_geometry_column = 'area'
+                    AND search_frame = BuildMbr(?, ?, ?, ?, 4326))
+                GROUP BY zones.id;'''
+
+GET_TILE_TERRITORIES = '''SELECT territories.id, territories.name, area_cache.geojson
+                FROM territories
+                JOIN area_cache ON area_cache.kind = 'territory' AND area_cache.owner_id = territories.id
+                WHERE territories.orga_id = ?
+                AND area_cache.max_lon >= ? AND area_cache.min_lon <= ?
+                AND area_cache.max_lat >= ? AND area_cache.min_lat <= ?;'''
+
+GET_TILE_DRONES = '''SELECT drones.id, drones.name, drone_latest.timestamp,
+                X(drone_latest.coordinates), Y(drone_latest.coordinates),
+                drone_latest.flight_range, drone_latest.flight_time, drone_latest.zone_id
+                FROM drone_latest
+                JOIN drones ON drones.id = drone_latest.drone_id
+                JOIN territory_zones ON territory_zones.zone_id = drone_latest.zone_id
+                JOIN territories ON territories.id = territory_zones.territory_id
+                WHERE territories.orga_id = ?
+                AND X(drone_latest.coordinates) BETWEEN ? AND ?
+                AND Y(drone_latest.coordinates) BETWEEN ? AND ?
+                GROUP BY drones.id;'''
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    """checks if the tile exists in the web mercator tile grid.
+
+    Args:
+        z (int): zoom level.
+        x (int): column of the tile.
+        y (int): row of the tile, 0 is the northmost row.
+
+    Returns:
+        bool: True if the tile exists.
+    """
+    if z < 0 or z > MAX_ZOOM:
+        return False
+    size = 2 ** z
+    return 0 <= x < size and 0 <= y < size
+
+def get_tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """bounds of the tile in web mercator meters.
+
+    Args:
+        z (int): zoom level.
+        x (int): column of the tile.
+        y (int): row of the tile, 0 is the northmost row.
+
+    Returns:
+        tuple[float, float, float, float]: (min_x, min_y, max_x, max_y).
+    """
+    tile_size = 2 * MERCATOR_MAX / 2 ** z
+    min_x = -MERCATOR_MAX + x * tile_size
+    max_y = MERCATOR_MAX - y * tile_size
+    return (min_x, max_y - tile_size, min_x + tile_size, max_y)
+
+def get_tile_of_coordinate(lon: float, lat: float, z: int) -> tuple[int, int]:
+    """column and row of the tile, that contains the coordinate.
+
+    Args:
+        lon (float): longitude.
+        lat (float): latitude.
+        z (int): zoom level.
+
+    Returns:
+        tuple[int, int]: x, y of the tile.
+    """
+    x, y = to_mercator(numpy.array([[lon, lat]], dtype=float))[0]
+    tile_size = 2 * MERCATOR_MAX / 2 ** z
+    max_index = 2 ** z - 1
+    return (min(max(int((x + MERCATOR_MAX) // tile_size), 0), max_index),
+            min(max(int((MERCATOR_MAX - y) // tile_size), 0), max_index))
+
+def to_mercator(coords: numpy.ndarray) -> numpy.ndarray:
+    """projects lon, lat coordinates (EPSG:4326) to web mercator (EPSG:3857).
+
+    Args:
+        coords (numpy.ndarray): array of shape (n, 2) with lon, lat.
+
+    Returns:
+        numpy.ndarray: array of shape (n, 2) with x, y in meters.
+    """
+    lon = coords[:, 0]
+    lat = numpy.clip(coords[:, 1], -MAX_LATITUDE, MAX_LATITUDE)
+    x = numpy.radians(lon) * EARTH_RADIUS
+    y = numpy.log(numpy.tan(numpy.pi / 4 + numpy.radians(lat) / 2)) * EARTH_RADIUS
+    return numpy.column_stack((x, y))
+
+def to_lonlat(x: float, y: float) -> tuple[float, float]:
+    """projects a web mercator coordinate back to lon, lat.
+
+    Args:
+        x (float): x in meters.
+        y (float): y in meters.
+
+    Returns:
+        tuple[float, float]: lon, lat.
+    """
+    lon = math.degrees(x / EARTH_RADIUS)
+    lat = math.degrees(2 * math.atan(math.exp(y / EARTH_RADIUS)) - math.pi / 2)
+    return lon, lat
+
+def get_features(fetched_geojson: list[str | None],
+                 properties: list[dict],
+                 clip_bounds: tuple[float, float, float, float]) -> list[dict]:
+    """projects and cuts the geometries to the tile.
+
+    Args:
+        fetched_geojson (list[str | None]): geojson of the geometries.
+        properties (list[dict]): properties per geometry, 'id' becomes the feature id.
+        clip_bounds (tuple[float, float, float, float]): tile bounds with buffer, in meters.
+
+    Returns:
+        list[dict]: the features of the layer, without the geometries outside of the tile.
+    """
+    geometries = shapely.from_geojson(fetched_geojson, on_invalid='ignore')
+    geometries = shapely.transform(geometries, to_mercator)
+    geometries = shapely.clip_by_rect(geometries, *clip_bounds)
+
+    features = []
+    for geometry, props in zip(geometries, properties):
+        if geometry is None or geometry.is_empty:
+            continue
+        features.append({'geometry': geometry,
+                         'id': props['id'],
+                         'properties': {key: value for key, value in props.items()
+                                        if value is not None}})
+    return features
+
+def build_tile(orga_id: int, z: int, x: int, y: int, detail: Detail = Detail.FULL) -> bytes:
+    """builds the vector tile from the database.
+
+    Args:
+        orga_id (int): id of the organization.
+        z (int): zoom level.
+        x (int): column of the tile.
+        y (int): row of the tile, 0 is the northmost row.
+        detail (Detail, optional): level of detail of the zones and territories. Defaults to Detail.FULL.
+
+    Returns:
+        bytes: the encoded tile, empty if the tile contains nothing.
+    """
+    bounds = get_tile_bounds(z, x, y)
+    buffer = (bounds[2] - bounds[0]) * TILE_BUFFER / TILE_EXTENT
+    clip_bounds = (bounds[0] - buffer, bounds[1] - buffer, bounds[2] + buffer, bounds[3] + buffer)
+    min_lon, min_lat = to_lonlat(clip_bounds[0], clip_bounds[1])
+    max_lon, max_lat = to_lonlat(clip_bounds[2], clip_bounds[3])
+
+    layers = []
+
+    sql = zones_table.with_detail(GET_TILE_ZONES, detail)
+    fetched_zones = db.fetch_all(sql, (orga_id, min_lon, min_lat, max_lon, max_lat)) or []
+    zone_props = [{'id': zone[0],
+                   'name': zone[1],
+                   'district': zone[2],
+                   'last_update': None if zone[3] is None else str(zone[3]),
+                   'ai_fire_risk': drone_events_table.get_firerisk(zone[5], zone[6])[0].value}
+                  for zone in fetched_zones]
+    layers.append({'name': 'zones',
+                   'features': get_features([zone[4] for zone in fetched_zones],
+                                            zone_props,
+                                            clip_bounds)})
+
+    area_cache_table.fill()
+    sql = GET_TILE_TERRITORIES.replace('area_cache.geojson',
+                                       area_cache_table.GEOJSON_DETAIL[detail], 1)
+    fetched_territories = db.fetch_all(sql, (orga_id, min_lon, max_lon, min_lat, max_lat)) or []
+    layers.append({'name': 'territories',
+                   'features': get_features([territory[2] for territory in fetched_territories],
+                                            [{'id': territory[0], 'name': territory[1]}
+                                             for territory in fetched_territories],
+                                            clip_bounds)})
+
+    fetched_drones = db.fetch_all(GET_TILE_DRONES,
+                                  (orga_id, min_lon, max_lon, min_lat, max_lat)) or []
+    points = to_mercator(numpy.array([drone[3:5] for drone in fetched_drones],
+                                     dtype=float).reshape(-1, 2))
+    layers.append({'name': 'drones',
+                   'features': [{'geometry': shapely.Point(point),
+                                 'id': drone[0],
+                                 'properties': {key: value for key, value in {
+                                     'id': drone[0],
+                                     'name': drone[1],
+                                     'timestamp': str(drone[2]),
+                                     'flight_range': drone[5],
+                                     'flight_time': drone[6],
+                                     'zone_id': drone[7]}.items() if value is not None}}
+                                for drone, point in zip(fetched_drones, points.tolist())]})
+
+    layers = [layer for layer in layers if len(layer['features']) > 0]
+    if len(layers) == 0:
+        return b''
+    return mapbox_vector_tile.encode(layers, default_options={'quantize_bounds': bounds,
+                                                             'extents': TILE_EXTENT})
+
+def get_tile_stamp(orga_id: int) -> tuple | None:
+    """stamp of the organization's data, it changes whenever a tile of the organization might change.
+
+    Args:
+        orga_id (int): id of the organization.
+
+    Returns:
+        tuple | None: the stamp, None if the query failed.
+    """
+    return db.fetch_one(GET_TILE_STAMP, (orga_id,))
+
+
+class TileCache:
+    """least recently used cache of encoded tiles.
+
+    Args:
+        size (int): maximum number of cached tiles.
+        max_age (float): seconds after which a cached tile is rebuilt.
+        stamp_age (float): seconds the stamp of an organization is reused.
+    """
+
+    def __init__(self,
+                 size: int = TILE_CACHE_SIZE,
+                 max_age: float = TILE_CACHE_SECONDS,
+                 stamp_age: float = TILE_STAMP_SECONDS):
+        self.size = size
+        self.max_age = max_age
+        self.stamp_age = stamp_age
+        self._lock = threading.Lock()
+        self._tiles: OrderedDict[tuple, tuple[tuple, float, bytes]] = OrderedDict()
+        # stamp and the time it was queried per orga id.
+        self._stamps: dict[int, tuple[tuple, float]] = {}
+
+    def get_stamp(self, orga_id: int) -> tuple | None:
+        """the stamp of the organization, queried at most every stamp_age seconds.
+
+        Args:
+            orga_id (int): id of the organization.
+
+        Returns:
+            tuple | None: see get_tile_stamp.
+        """
+        with self._lock:
+            cached = self._stamps.get(orga_id)
+        if cached is not None and time.monotonic() - cached[1] < self.stamp_age:
+            return cached[0]
+
+        stamp = get_tile_stamp(orga_id)
+        if stamp is not None:
+            with self._lock:
+                self._stamps[orga_id] = (stamp, time.monotonic())
+        return stamp
+
+    def get_tile(self, orga_id: int, z: int, x: int, y: int, detail: Detail = Detail.FULL) -> bytes:
+        """returns the cached tile if the data didnt change, otherwise builds it.
+
+        Args:
+            orga_id (int): id of the organization.
+            z (int): zoom level.
+            x (int): column of the tile.
+            y (int): row of the tile, 0 is the northmost row.
+            detail (Detail, optional): level of detail of the zones and territories.
+            Has to be the same for all requests of a zoom level. Defaults to Detail.FULL.
+
+        Returns:
+            bytes: the encoded tile.
+        """
+        key = (orga_id, z, x, y)
+        stamp = self.get_stamp(orga_id)
+        with self._lock:
+            cached = self._tiles.get(key)
+            if (cached is not None
+                    and stamp is not None
+                    and cached[0] == stamp
+                    and time.monotonic() - cached[1] < self.max_age):
+                self._tiles.move_to_end(key)
+                return cached[2]
+
+        tile = build_tile(orga_id, z, x, y, detail)
+        if stamp is None:
+            return tile
+
+        with self._lock:
+            self._tiles[key] = (stamp, time.monotonic(), tile)
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.size:
+                self._tiles.popitem(last=False)
+        return tile
+
+    def clear(self) -> None:
+        """removes all cached tiles."""
+        with self._lock:
+            self._tiles.clear()
+            self._stamps.clear()
+
+    async def get_tile_async(self,
+                             orga_id: int,
+                             z: int,
+                             x: int,
+                             y: int,
+                             detail: Detail = Detail.FULL) -> bytes:
+        """awaitable version of get_tile, runs on the database executor.
+
+        Returns:
+            bytes: see get_tile.
+        """
+        return await db.run_async(self.get_tile, orga_id, z, x, y, detail)
+
+
+tile_cache = TileCache()
@@ -0,0 +1,150 @@
+"""Process local point in zone lookup.
+
+All zone polygons are loaded once into a shapely STRtree of prepared geometries,
+so the zone of a coordinate is found without asking the database.
+The locator is rebuilt lazily after zones were added, see invalidate.
+Every process keeps its own locator, zones added by another process
+are only seen after that process invalidated its locator as well.
+"""
+import sqlite3
+import threading
+from typing import Sequence
+import numpy
+import shapely
+import database.database as db
+
+GET_ZONE_AREAS = 'SELECT id, AsGeoJSON(area) FROM zones WHERE area IS NOT NULL;'
+
+
+class ZoneLocator:
+    """finds the zone of coordinates with a STRtree of all zone areas.
+    If a point intersects more than one zone, the zone with the lowest id is returned.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # held by the one thread that reloads the zones.
+        self._refresh_lock = threading.Lock()
+        self._tree: shapely.STRtree | None = None
+        self._zone_ids = numpy.empty(0, dtype=numpy.int64)
+        # incremented by invalidate, the tree is current if it was loaded at the latest generation.
+        self._generation = 0
+        self._tree_generation = -1
+
+    def refresh(self) -> int | None:
+        """loads all zone areas from the database and rebuilds the tree.
+        Waits if another thread is already reloading the zones.
+
+        Returns:
+            int | None: number of loaded zones, None if the query failed.
+        """
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self) -> int | None:
+        """refresh, the caller holds _refresh_lock.
+
+        Returns:
+            int | None: see refresh.
+        """
+        with self._lock:
+            generation = self._generation
+        try:
+            with db.database_connection() as conn:
+                fetched = conn.execute(GET_ZONE_AREAS).fetchall()
+        except sqlite3.Error as exception:
+            # the locator stays outdated, the next lookup tries again.
+            print(exception)
+            return None
+
+        zone_ids = numpy.array([row[0] for row in fetched], dtype=numpy.int64)
+        areas = shapely.from_geojson(numpy.array([row[1] for row in fetched], dtype=object),
+                                     on_invalid='ignore')
+        valid = ~shapely.is_missing(areas)
+        zone_ids = zone_ids[valid]
+        areas = areas[valid]
+        shapely.prepare(areas)
+        tree = shapely.STRtree(areas)
+
+        with self._lock:
+            self._tree = tree
+            self._zone_ids = zone_ids
+            # an invalidate during the query keeps the locator outdated.
+            self._tree_generation = generation
+        return len(zone_ids)
+
+    def invalidate(self) -> None:
+        """marks the locator as outdated, the next lookup reloads the zones.
+        Has to be called whenever zones are added or their area changes.
+        """
+        with self._lock:
+            self._generation += 1
+
+    def locate(self, lon: float, lat: float) -> int | None:
+        """get the id of the zone, the coordinate is in.
+
+        Args:
+            lon (float): longitude of the point.
+            lat (float): latitude of the point.
+
+        Returns:
+            int | None: id of the zone, None if the point isnt inside a zone.
+        """
+        return self.locate_many([lon], [lat])[0]
+
+    async def locate_async(self, lon: float, lat: float) -> int | None:
+        """awaitable version of locate, runs on the database executor,
+        because an outdated locator reloads all zones.
+
+        Returns:
+            int | None: see locate.
+        """
+        return await db.run_async(self.locate, lon, lat)
+
+    def locate_many(self, lons: Sequence[float], lats: Sequence[float]) -> list[int | None]:
+        """get the ids of the zones, the coordinates are in.
+
+        Args:
+            lons (Sequence[float]): longitudes of the points.
+            lats (Sequence[float]): latitudes of the points, same length as lons.
+
+        Returns:
+            list[int | None]: zone id per coordinate, None if the point isnt inside a zone.
+        """
+        tree, zone_ids = self._get_tree()
+        output: list[int | None] = [None] * len(lons)
+        if len(output) == 0 or len(zone_ids) == 0:
+            return output
+
+        points = shapely.points(numpy.asarray(lons, dtype=float),
+                                numpy.asarray(lats, dtype=float))
+        point_index, zone_index = tree.query(points, predicate='intersects')
+        for point, zone in zip(point_index.tolist(), zone_ids[zone_index].tolist()):
+            if output[point] is None or zone < output[point]:
+                output[point] = zone
+        return output
+
+    def _get_tree(self) -> tuple[shapely.STRtree | None, numpy.ndarray]:
+        """returns the current tree, rebuilds it if it is outdated.
+        Only one thread rebuilds the tree, the others keep using the old tree
+        or wait for the first tree.
+
+        Returns:
+            tuple[shapely.STRtree | None, numpy.ndarray]: the tree and the zone id of every tree item.
+        """
+        with self._lock:
+            if self._tree_generation == self._generation:
+                return self._tree, self._zone_ids
+            loaded = self._tree is not None
+
+        if not (loaded and self._refresh_lock.locked()):
+            with self._refresh_lock:
+                # the zones may have been reloaded while this thread waited.
+                with self._lock:
+                    stale = self._tree_generation != self._generation
+                if stale:
+                    self._refresh()
+        with self._lock:
+            return self._tree, self._zone_ids
+
+zone_locator = ZoneLocator()
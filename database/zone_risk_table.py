@@ -0,0 +1,146 @@
+"""Per zone fire risk aggregates.
+
+zone_risk holds the highest smoke and fire confidence and the number of events
+of every zone within the look-back window (FIRE_RISK_WINDOW_HOURS).
+New events are added when they are stored, a periodic sweep
+(every FIRE_RISK_SWEEP_SECONDS) recomputes zones whose oldest event left the window.
+"""
+import asyncio
+import datetime
+import os
+import sqlite3
+from api.dependencies.classes import EventType
+import database.database as db
+from database.timestamps import to_utc
+
+FIRE_RISK_WINDOW_HOURS = float(os.getenv('FIRE_RISK_WINDOW_HOURS', '72'))
+FIRE_RISK_SWEEP_SECONDS = float(os.getenv('FIRE_RISK_SWEEP_SECONDS', '300'))
+
+CREATE_ZONE_RISK_TABLE = '''CREATE TABLE IF NOT EXISTS zone_risk
+(
+zone_id      integer NOT NULL ,
+max_smoke    integer NOT NULL DEFAULT 0,
+max_fire     integer NOT NULL DEFAULT 0,
+smoke_count  integer NOT NULL DEFAULT 0,
+fire_count   integer NOT NULL DEFAULT 0,
+oldest       timestamp NOT NULL ,
+PRIMARY KEY (zone_id),
+FOREIGN KEY (zone_id) REFERENCES zones (id)
+);
+CREATE INDEX IF NOT EXISTS zone_risk_AK ON zone_risk (oldest);'''
+
+ADD_EVENT = '''INSERT INTO zone_risk (zone_id,max_smoke,max_fire,smoke_count,fire_count,oldest)
+                VALUES (?,?,?,?,?,?)
+                ON CONFLICT (zone_id) DO UPDATE SET
+                    max_smoke = MAX(max_smoke, excluded.max_smoke),
+                    max_fire = MAX(max_fire, excluded.max_fire),
+                    smoke_count = smoke_count + excluded.smoke_count,
+                    fire_count = fire_count + excluded.fire_count,
+                    oldest = MIN(oldest, excluded.oldest);'''
+
+RECOMPUTE = f'''INSERT INTO zone_risk (zone_id,max_smoke,max_fire,smoke_count,fire_count,oldest)
+                SELECT zone_id,
+                MAX(CASE WHEN event_type = {EventType.SMOKE.value} THEN confidence ELSE 0 END),
+                MAX(CASE WHEN event_type != {EventType.SMOKE.value} THEN confidence ELSE 0 END),
+                SUM(event_type = {EventType.SMOKE.value}),
+                SUM(event_type != {EventType.SMOKE.value}),
+                MIN(timestamp)
+                FROM drone_event
+                WHERE zone_id IS NOT NULL
+                AND timestamp > ?
+                {{}}
+                GROUP BY zone_id
+                ON CONFLICT (zone_id) DO UPDATE SET
+                    max_smoke = excluded.max_smoke,
+                    max_fire = excluded.max_fire,
+                    smoke_count = excluded.smoke_count,
+                    fire_count = excluded.fire_count,
+                    oldest = excluded.oldest;'''
+
+EXPIRED_ZONES = 'AND zone_id IN (SELECT zone_id FROM zone_risk WHERE oldest <= ?)'
+
+DELETE_EXPIRED = 'DELETE FROM zone_risk WHERE oldest <= ?;'
+
+DELETE_ALL = 'DELETE FROM zone_risk;'
+
+
+def get_window_start() -> datetime.datetime:
+    """start of the look-back window.
+
+    Returns:
+        datetime.datetime: events older than this dont count for the fire risk.
+    """
+    return datetime.datetime.utcnow() - datetime.timedelta(hours=FIRE_RISK_WINDOW_HOURS)
+
+def add_event(zone_id: int | None,
+              event_type: int | EventType,
+              confidence: int,
+              timestamp: datetime.datetime) -> bool:
+    """adds a new event to the aggregate of its zone.
+
+    Args:
+        zone_id (int | None): id of the zone, the event is in.
+        event_type (int | EventType): type of the event.
+        confidence (int): confidence of the event.
+        timestamp (datetime.datetime): timestamp of the event.
+
+    Returns:
+        bool: True if the aggregate was updated or the event doesnt count.
+    """
+    if zone_id is None:
+        return True
+    # the window and oldest are naive UTC.
+    timestamp = to_utc(timestamp)
+    if timestamp <= get_window_start():
+        return True
+
+    if event_type in (EventType.SMOKE, EventType.SMOKE.value):
+        values = (zone_id, confidence, 0, 1, 0, timestamp)
+    else:
+        values = (zone_id, 0, confidence, 0, 1, timestamp)
+    return db.update(ADD_EVENT, values)
+
+def sweep() -> bool:
+    """recomputes the zones, whose oldest event left the window,
+    and removes zones without events in the window.
+
+    Returns:
+        bool: True if successful.
+    """
+    window_start = get_window_start()
+    try:
+        with db.database_connection() as conn:
+            conn.execute(RECOMPUTE.format(EXPIRED_ZONES), (window_start, window_start))
+            conn.execute(DELETE_EXPIRED, (window_start,))
+            conn.commit()
+            return True
+    except sqlite3.Error as exception:
+        print(exception)
+    return False
+
+def rebuild() -> bool:
+    """recomputes the aggregates of all zones in one transaction,
+    e.g. after events got their zone assigned. Readers see the old aggregates until it is done.
+
+    Returns:
+        bool: True if successful.
+    """
+    try:
+        with db.database_connection() as conn:
+            conn.execute(DELETE_ALL)
+            conn.execute(RECOMPUTE.format(''), (get_window_start(),))
+            conn.commit()
+            return True
+    except sqlite3.Error as exception:
+        print(exception)
+    return False
+
+async def run_sweeps(interval: float = FIRE_RISK_SWEEP_SECONDS) -> None:
+    """runs the sweep every interval seconds, until the task is cancelled.
+
+    Args:
+        interval (float, optional): seconds between two sweeps. Defaults to FIRE_RISK_SWEEP_SECONDS.
+    """
+    while True:
+        await db.run_async(sweep)
+        await asyncio.sleep(interval)
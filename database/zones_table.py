@@ -8,13 +8,20 @@ from enum import Enum
 import json
 from typing import List
 
-import pytz
-from api.dependencies.classes import FireRisk, Zone
-from database.database import TIMEZONE, add_where_clause, create_where_clause_statement, fetched_match_class
-from database.spatia import coordinates_to_multipolygonstr, spatiageostr_to_geojson
-from database import drone_events_table, drone_updates_table
+from api.dependencies.classes import Detail, DroneEvent, Zone, ZoneStruct
+from database.database import add_where_clause, create_where_clause_statement
+from database.timestamps import to_utc
+from database.row_decoding import to_isoformat, to_timezone
+from database.spatia import (coordinates_to_multipolygonstr,
+                            simplified_geojson_sql,
+                            spatiageostr_to_geojson)
+from database import area_cache_table, drone_events_table, drone_updates_table, zone_risk_table
+from database.zone_locator import zone_locator
 import database.database as db
 
+# the events of the last days are attached to the zones, see get_events_after.
+ZONE_EVENTS_DAYS = 3
+
 CREATE_ZONE_TABLE = '''CREATE TABLE zones
 (
 id       integer NOT NULL ,
@@ -22,20 +29,52 @@ name    text NOT NULL ,
 federal_state    text NOT NULL ,
 district    text NOT NULL ,
 last_update timestamp,
+geojson_medium text,
+geojson_low text,
 PRIMARY KEY (id)
 );
 CREATE INDEX IF NOT EXISTS zones_AK ON zones (name);
 SELECT AddGeometryColumn('zones', 'area', 4326, 'MULTIPOLYGON', 'XY');
-SELECT AddGeometryColumn('zones', 'geo_point', 4326, 'POINT', 'XY');'''
+SELECT AddGeometryColumn('zones', 'geo_point', 4326, 'POINT', 'XY');
+SELECT CreateSpatialIndex('zones', 'area');'''
 #   POLYGON((101.23 171.82, 201.32 101.5, 215.7 201.953, 101.23 171.82))
 #   exterior ring, no interior rings
 
 class ZoneWhereClause(str, Enum):
     """Class for zones with a where clause"""
-    MAKEPOINTINTERSECT = 'ST_Intersects(zones.area, MakePoint(?, ?, 4326))'
-    GEOJSONINTERSECT = 'ST_Intersects(zones.area, GeomFromGeoJSON(?))'
+    MAKEPOINTINTERSECT = '''ST_Intersects(zones.area, MakePoint(?, ?, 4326))
+                            AND zones.ROWID IN (
+                                SELECT ROWID FROM SpatialIndex
+                                WHERE f_table_name = 'zones' AND f_geometry_column = 'area'
+                                AND search_frame = MakePoint(?, ?, 4326))'''
+    GEOJSONINTERSECT = '''ST_Intersects(zones.area, GeomFromGeoJSON(?))
+                            AND zones.ROWID IN (
+                                SELECT ROWID FROM SpatialIndex
+                                WHERE f_table_name = 'zones' AND f_geometry_column = 'area'
+                                AND search_frame = GeomFromGeoJSON(?))'''
+    CACHEDAREAINTERSECT = '''ST_Intersects(zones.area, (
+                                SELECT area FROM area_cache WHERE kind = ? AND owner_id = ?))
+                            AND zones.ROWID IN (
+                                SELECT ROWID FROM SpatialIndex
+                                WHERE f_table_name = 'zones' AND f_geometry_column = 'area'
+                                AND search_frame = (
+                                    SELECT area FROM area_cache WHERE kind = ? AND owner_id = ?))'''
     ZONE_ID = 'zones.id'
 
+# precomputed simplified geojson of the area, see Detail.
+SIMPLIFY_AREAS = f'''UPDATE zones SET
+                geojson_medium = {simplified_geojson_sql('area', Detail.MEDIUM)},
+                geojson_low = {simplified_geojson_sql('area', Detail.LOW)}
+                WHERE geojson_low IS NULL AND area IS NOT NULL;'''
+
+# geojson expression of the zone selects per level of detail.
+GEOJSON_FULL = 'AsGeoJSON(area)'
+GEOJSON_DETAIL = {
+    Detail.FULL: GEOJSON_FULL,
+    Detail.MEDIUM: f'IFNULL(zones.geojson_medium, {GEOJSON_FULL})',
+    Detail.LOW: f'IFNULL(zones.geojson_low, {GEOJSON_FULL})',
+}
+
 CREATE_ENTRY = '''INSERT INTO zones (name,federal_state,district,area,geo_point,last_update)
                 VALUES (?,?,?,GeomFromGeoJSON(?),MakePoint(?, ?, 4326),0);'''
 
@@ -43,23 +82,26 @@ UPDATE_ZONE = 'UPDATE zones SET {} = ? WHERE {};'
 
 UPDATE_TIMESTAMP = 'UPDATE zones SET last_update = ? {};'
 
+# only moves last_update forward, replayed old updates dont reset it.
+UPDATE_TIMESTAMP_IF_NEWER = '''UPDATE zones SET last_update = ?
+                            WHERE id = ?
+                            AND (last_update IS NULL OR last_update < ?);'''
+
 CREATE_ENTRY_TEXTGEO = '''INSERT OR IGNORE
                         INTO zones (id, name,federal_state,district,area,geo_point,last_update) 
                         VALUES (?,?,?,?,GeomFromText(?,4326),MakePoint(?, ?, 4326),?);'''
 
 GET_ZONE = """SELECT zones.id,zones.name,federal_state,district,AsGeoJSON(area),
                 X(geo_point),Y(geo_point),
-                Count(DISTINCT newdrone_data.drone_id),
+                Count(DISTINCT drone_latest.drone_id),
                 zones.last_update,
-                Count(DISTINCT drone_event.id)
+                Count(DISTINCT drone_event.id),
+                IFNULL(MAX(zone_risk.max_smoke), 0),
+                IFNULL(MAX(zone_risk.max_fire), 0)
                 FROM zones
-                LEFT OUTER JOIN drone_event ON ST_Intersects(drone_event.coordinates, area)
-                LEFT OUTER JOIN ( 
-                            SELECT coordinates, MAX(timestamp) as ts, drone_id
-                            from drone_data
-                            group by drone_data.drone_id
-                    ) AS newdrone_data
-                ON ST_Intersects(newdrone_data.coordinates, area)
+                LEFT OUTER JOIN drone_event ON drone_event.zone_id = zones.id
+                LEFT OUTER JOIN drone_latest ON drone_latest.zone_id = zones.id
+                LEFT OUTER JOIN zone_risk ON zone_risk.zone_id = zones.id
                 {}
                 GROUP BY name
                 ORDER BY name;"""
@@ -70,20 +112,18 @@ GET_ZONEPOLYGON = """   SELECT AsGeoJSON(area)
 
 GET_ZONEJOINORGA ='''SELECT zones.id,zones.name,federal_state,district,AsGeoJSON(area),
                         X(geo_point),Y(geo_point),
-                        Count(DISTINCT newdrone_data.drone_id),
+                        Count(DISTINCT drone_latest.drone_id),
                     zones.last_update,
-                    Count(DISTINCT drone_event.id)
+                    Count(DISTINCT drone_event.id),
+                    IFNULL(MAX(zone_risk.max_smoke), 0),
+                    IFNULL(MAX(zone_risk.max_fire), 0)
                     FROM zones
                     JOIN territory_zones 
                     ON zones.id = territory_zones.zone_id
                     JOIN territories ON territories.id = territory_zones.territory_id
-                    LEFT OUTER JOIN drone_event ON ST_Intersects(drone_event.coordinates, area)
-                    LEFT OUTER JOIN (  
-                            SELECT coordinates, MAX(timestamp) as ts, drone_id
-                            from drone_data
-                            group by drone_data.drone_id
-                    ) AS newdrone_data
-                    ON ST_Intersects(newdrone_data.coordinates, area)
+                    LEFT OUTER JOIN drone_event ON drone_event.zone_id = zones.id
+                    LEFT OUTER JOIN drone_latest ON drone_latest.zone_id = zones.id
+                    LEFT OUTER JOIN zone_risk ON zone_risk.zone_id = zones.id
 
                     WHERE zones.{}=? 
                     AND territories.orga_id=?
@@ -91,40 +131,39 @@ GET_ZONEJOINORGA ='''SELECT zones.id,zones.name,federal_state,district,AsGeoJSON
                     ORDER BY zones.name;'''
 
 GET_ZONES_BY_DISTRICT = '''SELECT zones.id,zones.name,federal_state,district,AsGeoJSON(area),
-                            X(geo_point),Y(geo_point),Count(DISTINCT newdrone_data.drone_id),
+                            X(geo_point),Y(geo_point),Count(DISTINCT drone_latest.drone_id),
                             zones.last_update,
-                            Count(DISTINCT drone_event.id)
+                            Count(DISTINCT drone_event.id),
+                            IFNULL(MAX(zone_risk.max_smoke), 0),
+                            IFNULL(MAX(zone_risk.max_fire), 0)
                             FROM zones
-                            LEFT OUTER JOIN drone_event ON ST_Intersects(drone_event.coordinates, area)
-                            LEFT OUTER JOIN ( 
-                                    SELECT coordinates, MAX(timestamp) as ts, drone_id
-                                    from drone_data
-                                    group by drone_data.drone_id
-                            ) AS newdrone_data
-                            ON ST_Intersects(newdrone_data.coordinates, area)
+                            LEFT OUTER JOIN drone_event ON drone_event.zone_id = zones.id
+                            LEFT OUTER JOIN drone_latest ON drone_latest.zone_id = zones.id
+                            LEFT OUTER JOIN zone_risk ON zone_risk.zone_id = zones.id
                             WHERE district = ?
                             GROUP BY zones.name;'''
 
 GET_ORGAZONES = '''  SELECT zones.id,zones.name,federal_state,district,AsGeoJSON(area),
                     X(geo_point),
                     Y(geo_point),
-                    Count(DISTINCT newdrone_data.drone_id),
+                    Count(DISTINCT drone_latest.drone_id),
                     zones.last_update,
-                    Count(DISTINCT drone_event.id)
+                    Count(DISTINCT drone_event.id),
+                    IFNULL(MAX(zone_risk.max_smoke), 0),
+                    IFNULL(MAX(zone_risk.max_fire), 0)
                     FROM zones
                     JOIN territory_zones 
                     ON zones.id = territory_zones.zone_id
                     JOIN territories ON territories.id = territory_zones.territory_id
-                    LEFT OUTER JOIN drone_event ON ST_Intersects(drone_event.coordinates, area)
-                    LEFT OUTER JOIN ( 
-                                    SELECT coordinates, MAX(timestamp) as ts, drone_id
-                                    from drone_data
-                                    group by drone_data.drone_id
-                            ) AS newdrone_data
-                    ON ST_Intersects(newdrone_data.coordinates, area)
+                    LEFT OUTER JOIN drone_event ON drone_event.zone_id = zones.id
+                    LEFT OUTER JOIN drone_latest ON drone_latest.zone_id = zones.id
+                    LEFT OUTER JOIN zone_risk ON zone_risk.zone_id = zones.id
                     WHERE territories.orga_id=?
                     GROUP BY zones.name;'''
 
+# number of columns of the zone selects above, see get_obj_from_fetched.
+ZONE_COLUMNS = 12
+
 
 def add_from_geojson(path_to_geojson) -> int:
     """add zone data from a geojson file to the db.
@@ -168,6 +207,10 @@ def add_from_geojson(path_to_geojson) -> int:
             to_db.append(insertuple)
 
     rowcount = db.insertmany(CREATE_ENTRY_TEXTGEO, to_db)
+    if rowcount:
+        zone_locator.invalidate()
+        simplify_areas()
+        assign_zone_ids()
 
     return rowcount
 
@@ -208,20 +251,52 @@ def create_zone(gem_code, name, federal_state, district, gemometry: dict, geo_po
             )
         )
     if inserted_id:
+        zone_locator.invalidate()
+        simplify_areas()
+        assign_zone_ids()
         return True
     return False
 
-def get_zone(zone_id:int) -> Zone | None:
+def assign_zone_ids() -> None:
+    """sets the zone of all stored drone updates and events, that werent inside a zone yet,
+    and recomputes the fire risk of the zones.
+    """
+    drone_updates_table.assign_zone_ids()
+    drone_events_table.assign_zone_ids()
+    zone_risk_table.rebuild()
+
+def simplify_areas() -> bool:
+    """computes the simplified geojson of all zones, that dont have one yet.
+
+    Returns:
+        bool: True if successful.
+    """
+    return db.update(SIMPLIFY_AREAS)
+
+def with_detail(sql:str, detail:Detail) -> str:
+    """replaces the full geojson of a zone select with the requested level of detail.
+
+    Args:
+        sql (str): one of the zone selects.
+        detail (Detail): level of detail.
+
+    Returns:
+        str: the sql.
+    """
+    return sql.replace(GEOJSON_FULL, GEOJSON_DETAIL[detail], 1)
+
+def get_zone(zone_id:int, detail:Detail = Detail.FULL) -> Zone | None:
     """fetch the zone.
 
     Args:
         zone_id (int): id of the zone.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to Detail.FULL.
 
     Returns:
         Zone | None: the Zone.
     """
     where_arr = create_where_clause_statement(ZoneWhereClause.ZONE_ID,'=')
-    sql = add_where_clause(GET_ZONE,[where_arr])
+    sql = add_where_clause(with_detail(GET_ZONE, detail),[where_arr])
     fetched_zone = db.fetch_one(sql, (zone_id,))
     return get_obj_from_fetched(fetched_zone)
 
@@ -253,9 +328,10 @@ def get_zone_of_coordinate(long:float, lat:float) -> Zone | None:
     Returns:
         Zone | None: the Zone if the point is inside a zones area, None if not.
     """
-    sql = add_where_clause(GET_ZONE,[ZoneWhereClause.MAKEPOINTINTERSECT])
-    fetched_zone = db.fetch_one(sql, (long, lat))
-    return get_obj_from_fetched(fetched_zone)
+    zone_id = zone_locator.locate(long, lat)
+    if zone_id is None:
+        return None
+    return get_zone(zone_id)
 
 def set_update_for_coordinate(long:float, lat:float, timestamp:datetime.datetime) -> bool:
     """set the last_update field of the zone, the given lat lon tuple is in.
@@ -268,70 +344,121 @@ def set_update_for_coordinate(long:float, lat:float, timestamp:datetime.datetime
     Returns:
         bool: Wether the update was successful or not.
     """
+    zone_id = zone_locator.locate(long, lat)
+    if zone_id is None:
+        return False
+    stm = create_where_clause_statement(ZoneWhereClause.ZONE_ID,'=')
+    sql = add_where_clause(UPDATE_TIMESTAMP,[stm])
+    return db.update(sql,(to_utc(timestamp), zone_id))
+
+def get_last_updates(timestamps:List[datetime.datetime],
+                     zone_ids:List[int | None]) -> dict[int, datetime.datetime]:
+    """coalesces the timestamps of many updates to the newest timestamp per zone.
+    The timestamps are converted to naive UTC, so a batch can mix timestamps with and without timezone.
+
+    Args:
+        timestamps (List[datetime.datetime]): timestamp of every update.
+        zone_ids (List[int | None]): zone id of every update, None if it isnt inside a zone.
+
+    Returns:
+        dict[int, datetime.datetime]: newest timestamp per zone id.
+    """
+    last_updates = {}
+    for timestamp, zone_id in zip(timestamps, zone_ids):
+        if zone_id is None:
+            continue
+        timestamp = to_utc(timestamp)
+        if zone_id not in last_updates or last_updates[zone_id] < timestamp:
+            last_updates[zone_id] = timestamp
+    return last_updates
+
+def set_update_for_zones(last_updates:dict[int, datetime.datetime]) -> bool:
+    """set the last_update field of many zones in one transaction.
+    A zone keeps its last_update if it is newer than the given timestamp.
+
+    Args:
+        last_updates (dict[int, datetime.datetime]): timestamp of the latest update per zone id.
 
-    sql = add_where_clause(UPDATE_TIMESTAMP,[ZoneWhereClause.MAKEPOINTINTERSECT])
-    return db.update(sql,(timestamp, long, lat))
+    Returns:
+        bool: Wether the update was successful or not.
+    """
+    if len(last_updates) == 0:
+        return True
+    to_db = [(timestamp, zone_id, timestamp) for zone_id, timestamp in last_updates.items()]
+    return db.updatemany(UPDATE_TIMESTAMP_IF_NEWER, to_db)
 
-def get_zones_in_area(area:str) -> List[Zone] | None:
+def get_zones_in_area(area:str, detail:Detail = Detail.FULL) -> List[Zone] | None:
     """fetch all zones in the given area.
 
     Args:
         area (str): geojson string of the area.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to Detail.FULL.
 
     Returns:
         List[Zone] | None: list of zones in the area.
     """
-    sql = add_where_clause(GET_ZONE,[ZoneWhereClause.GEOJSONINTERSECT])
-    fetched_zones = db.fetch_all(sql, (area,))
+    sql = add_where_clause(with_detail(GET_ZONE, detail),[ZoneWhereClause.GEOJSONINTERSECT])
+    fetched_zones = db.fetch_all(sql, (area, area))
 
     if fetched_zones is None:
         return None
 
-    output = []
-    for zone in fetched_zones:
-        zone_obj = get_obj_from_fetched(zone)
-        if zone_obj:
-            output.append(zone_obj)
-    return output
+    return get_objs_from_fetched(fetched_zones)
 
 
-def get_zone_of_district(name: str) -> List[Zone] | None:
+def get_zones_in_cached_area(kind:str,
+                             owner_id:int,
+                             detail:Detail = Detail.FULL) -> List[Zone] | None:
+    """fetch all zones in the cached area of a territory or an organization.
+
+    Args:
+        kind (str): area_cache_table.TERRITORY or area_cache_table.ORGA.
+        owner_id (int): id of the territory or the organization.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to Detail.FULL.
+
+    Returns:
+        List[Zone] | None: list of zones in the area.
+    """
+    area_cache_table.fill()
+    sql = add_where_clause(with_detail(GET_ZONE, detail),[ZoneWhereClause.CACHEDAREAINTERSECT])
+    fetched_zones = db.fetch_all(sql, (kind, owner_id, kind, owner_id))
+
+    if fetched_zones is None:
+        return None
+
+    return get_objs_from_fetched(fetched_zones)
+
+def get_zone_of_district(name: str, detail:Detail = Detail.FULL) -> List[Zone] | None:
     """list all zones of this district.
 
     Args:
         name (str): name of the district.
+        detail (Detail, optional): level of detail of the geo_json. Defaults to Detail.FULL.
 
     Returns:
         List[Zone] | None: list of zones in the district.
     """
-    fetched_zones = db.fetch_all(GET_ZONES_BY_DISTRICT, (name,))
+    fetched_zones = db.fetch_all(with_detail(GET_ZONES_BY_DISTRICT, detail), (name,))
     if fetched_zones is None:
         return None
 
-    output = []
-    for zone in fetched_zones:
-        zone_obj = get_obj_from_fetched(zone)
-        if zone_obj:
-            output.append(zone_obj)
-    return output
+    return get_objs_from_fetched(fetched_zones)
 
 
-def get_zones() -> List[Zone]:
+def get_zones(detail:Detail = Detail.FULL) -> List[Zone]:
     """get a list of all zones.
 
+    Args:
+        detail (Detail, optional): level of detail of the geo_json. Defaults to Detail.FULL.
+
     Returns:
         List[Zone]: list containing Zone obj.
     """
-    sql = GET_ZONE.format('')
+    sql = with_detail(GET_ZONE, detail).format('')
     fetched_zones = db.fetch_all(sql)
     if fetched_zones is None:
         return None
-    output = []
-    for zone in fetched_zones:
-        zone_obj = get_obj_from_fetched(zone)
-        if zone_obj:
-            output.append(zone_obj)
-    return output
+    return get_objs_from_fetched(fetched_zones)
 
 def get_active_drone_count(polygon: str,
                            after: datetime.datetime = None) -> int:
@@ -351,47 +478,98 @@ def get_active_drone_count(polygon: str,
 
     return len(drones)
 
+def get_events_after(after: datetime.datetime | None = None) -> datetime.datetime:
+    """start of the events that are attached to the zones.
+
+    Args:
+        after (datetime.datetime | None, optional): the requested start. Defaults to None,
+        ZONE_EVENTS_DAYS days before now.
+
+    Returns:
+        datetime.datetime: the start.
+    """
+    if after is None:
+        return datetime.datetime.utcnow() - datetime.timedelta(days=ZONE_EVENTS_DAYS)
+    return after
+
+def get_objs_from_fetched(
+                fetched_zones: list,
+                after: datetime.datetime | None = None,
+                as_struct: bool = False
+                ) -> List[Zone] | List[ZoneStruct]:
+    """generate Zone objs from fetched elements.
+    The events of all zones are fetched with one query.
+
+    Args:
+        fetched_zones (list): list of fetched attributes from the zones.
+        after (datetime | None): restriction to only select events that where created after this timestamp,
+        defaults to ZONE_EVENTS_DAYS days ago.
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
+
+    Returns:
+        List[Zone]: list of zone objects, elements that cant be generated are skipped.
+    """
+    zone_ids = [fetched[0] for fetched in fetched_zones if has_events(fetched)]
+    events_by_zone = drone_events_table.get_events_by_zone(zone_ids, get_events_after(after), as_struct)
+
+    output = []
+    for fetched in fetched_zones:
+        zone_obj = get_obj_from_fetched(fetched, after, events_by_zone, as_struct)
+        if zone_obj:
+            output.append(zone_obj)
+    return output
+
+def has_events(fetched_zone) -> bool:
+    """checks the event count of a fetched zone.
+
+    Args:
+        fetched_zone (list): fetched attributes from the zone.
+
+    Returns:
+        bool: True if events are stored for the zone.
+    """
+    try:
+        return fetched_zone[9] > 0
+    except (IndexError, TypeError):
+        return False
+
 def get_obj_from_fetched(
                 fetched_zone,
-                after: datetime.datetime = datetime.datetime.utcnow()-datetime.timedelta(days=3)
-                ) -> Zone | None:
+                after: datetime.datetime | None = None,
+                events_by_zone: dict[int, List[DroneEvent]] = None,
+                as_struct: bool = False
+                ) -> Zone | ZoneStruct | None:
     """generate Zone obj from fetched element.
 
     Args:
         fetched_zone (list): fetched attributes from the zone.
-        after (datetime): restriction to only select events that where created after this timestamp,
-        defaults to 24h ago.
+        after (datetime | None): restriction to only select events that where created after this timestamp,
+        defaults to ZONE_EVENTS_DAYS days ago.
+        events_by_zone (dict[int, List[DroneEvent]], optional): already fetched events per zone id,
+        see get_objs_from_fetched. Fetches the events of this zone if None.
+        as_struct (bool, optional): build the msgspec mirror instead of the pydantic class,
+        see api.dependencies.responses.MsgspecResponse. Defaults to False.
 
     Returns:
         Zone | None: zone object or None if obj cant be generated.
     """
-    if fetched_match_class(Zone, fetched_zone,4):
+    if fetched_zone and len(fetched_zone) == ZONE_COLUMNS:
         geo_json = spatiageostr_to_geojson(fetched_zone[4])
 
-        try:
-            if fetched_zone[9] > 0:
-                events = drone_events_table.get_drone_event(
-                                            polygon=fetched_zone[4],
-                                            after=after)
-            else:
-                events = None
-        except IndexError:
-            events = None
-            print('no events found')
+        if events_by_zone is None and has_events(fetched_zone):
+            events_by_zone = drone_events_table.get_events_by_zone([fetched_zone[0]],
+                                                                  get_events_after(after),
+                                                                  as_struct)
+        events = None
+        if events_by_zone is not None:
+            events = events_by_zone.get(fetched_zone[0])
 
-        try:
-            la_timestam:datetime.datetime = fetched_zone[8]
-            if la_timestam is not None:
-                la_timestam = la_timestam.astimezone(pytz.timezone(TIMEZONE))
-        except ValueError:
-            la_timestam = fetched_zone[8]
-
-        if events:
-            ai_firerisk_enum, firerisk, smokerisk = drone_events_table.calculate_firerisk(events)
-        else:
-            ai_firerisk_enum= FireRisk(0)
-            firerisk= FireRisk(0)
-            smokerisk  = FireRisk(0)
+        la_timestam = to_isoformat(fetched_zone[8]) if as_struct else to_timezone(fetched_zone[8])
+
+        # precomputed in zone_risk, see zone_risk_table.
+        ai_firerisk_enum, firerisk, smokerisk = drone_events_table.get_firerisk(fetched_zone[10],
+                                                                                fetched_zone[11])
 
         try:
             lon = fetched_zone[5]
@@ -400,7 +578,9 @@ def get_obj_from_fetched(
             lon = None
             lat= None
 
-        zone_obj = Zone(
+        # the values come from our schema, so the Zone isnt validated again.
+        model = ZoneStruct if as_struct else Zone.construct
+        zone_obj = model(
             id=fetched_zone[0],
             name=fetched_zone[1],
             federal_state=fetched_zone[2],
@@ -417,3 +597,27 @@ def get_obj_from_fetched(
         )
         return zone_obj
     return None
+
+async def get_zone_of_coordinate_async(long:float, lat:float) -> Zone | None:
+    """awaitable version of get_zone_of_coordinate, runs on the database executor.
+
+    Returns:
+        Zone | None: see get_zone_of_coordinate.
+    """
+    return await db.run_async(get_zone_of_coordinate, long, lat)
+
+async def set_update_for_coordinate_async(long:float, lat:float, timestamp:datetime.datetime) -> bool:
+    """awaitable version of set_update_for_coordinate, runs on the database executor.
+
+    Returns:
+        bool: see set_update_for_coordinate.
+    """
+    return await db.run_async(set_update_for_coordinate, long, lat, timestamp)
+
+async def set_update_for_zones_async(last_updates:dict[int, datetime.datetime]) -> bool:
+    """awaitable version of set_update_for_zones, runs on the database executor.
+
+    Returns:
+        bool: see set_update_for_zones.
+    """
+    return await db.run_async(set_update_for_zones, last_updates)
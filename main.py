@@ -1,4 +1,5 @@
 """ Main file for the API. """
+import asyncio
 import datetime
 import os
 import sqlite3
@@ -10,25 +11,32 @@ from fastapi.middleware.cors import CORSMiddleware
 
 
 from simulation.sim import simulate
-from api.dependencies.authentication import get_password_hash
+from api.dependencies.authentication import get_password_hash, password_hasher
 from api.dependencies.classes import UserWithSensitiveInfo, Zone
-from api.routers import emails, users, zones, drones, simulation,territories, incidents
-from database import (users_table,
+from api.dependencies.ingest import INGEST_BUFFER, ingest_buffer
+from api.routers import emails, users, zones, drones, simulation,territories, incidents, tiles
+from database import (area_cache_table,
+                      users_table,
                       organizations_table,
                       drones_table,
                       drone_events_table,
                       drone_updates_table,
+                      epoch_timestamps,
+                      telemetry_retention,
+                      zone_risk_table,
                       zones_table)
 
-from database.database import create_table, initialise_spatialite
+from database.database import close_pools, create_table, get_connection_profile, initialise_spatialite
 from database.drone_events_table import CREATE_DRONE_EVENT_TABLE
 from database.territory_zones_table import CREATE_TERRITORYZONES_TABLE, link_territory_zone
 from database.territories_table import CREATE_TERRITORY_TABLE, create_territory
 from database.drones_table import CREATE_DRONES_TABLE
 from database.organizations_table import CREATE_ORGANISATIONS_TABLE
-from database.users_table import CREATE_USER_TABLE
+from database.users_table import CREATE_USER_TABLE, user_cache
 from database.zones_table import CREATE_ZONE_TABLE
 from database.incidents import CREATE_INCIDENTS_TABLE
+from database.migrations import run_migrations
+from database.zone_locator import zone_locator
 
 app = FastAPI(  title="KIWA",
                 description="test")
@@ -39,6 +47,7 @@ app.include_router(drones.router)
 app.include_router(simulation.router)
 app.include_router(territories.router)
 app.include_router(incidents.router)
+app.include_router(tiles.router)
 
 # CORS https://fastapi.tiangolo.com/tutorial/cors/
 app.add_middleware(
@@ -165,9 +174,10 @@ def create_territory_link_zones(orga_id,name,fetched_zones:List[Zone]):
 
     for zone in fetched_zones:
         try:
-            link_territory_zone(territorry_id,zone.id)
+            link_territory_zone(territorry_id,zone.id,refresh=False)
         except sqlite3.IntegrityError:
             print(f'couldnt link {zone.name} to the territory')
+    area_cache_table.refresh_territory(territorry_id)
 
 def insert_demo_events(long: float, lat: float, droneid = 1, ignore_existing: bool = False):
     """insert 5 demo drone events.
@@ -226,19 +236,27 @@ def main():
         Create a default user if the environment variables are set.
         Create a default territory and link zones to it, if the environment variables are set.
     """
+    print(f'database connection profile: {get_connection_profile()}')
     initialise_spatialite()
     create_table(CREATE_ORGANISATIONS_TABLE)
     create_table(CREATE_USER_TABLE)
     create_table(CREATE_ZONE_TABLE)
     create_table(CREATE_DRONES_TABLE)
     create_table(drone_updates_table.CREATE_DRONE_DATA_TABLE)
+    create_table(drone_updates_table.CREATE_DRONE_LATEST_TABLE)
+    create_table(drone_updates_table.CREATE_DRONE_DATA_ARCHIVE_TABLE)
     create_table(CREATE_DRONE_EVENT_TABLE)
+    create_table(zone_risk_table.CREATE_ZONE_RISK_TABLE)
     create_table(CREATE_TERRITORY_TABLE)
     create_table(CREATE_TERRITORYZONES_TABLE)
+    create_table(area_cache_table.CREATE_AREA_CACHE_TABLE)
     create_table(CREATE_INCIDENTS_TABLE)
+    run_migrations()
+    epoch_timestamps.apply_epoch_indexes()
     create_default_user()
     load_zones_from_geojson()
     create_drone_events()
+    print(f'zones loaded into the zone locator: {zone_locator.refresh()}')
     run_sim = os.getenv("RUN_SIMULATION")
     if run_sim == 'True':
         try:
@@ -249,6 +267,33 @@ def main():
 
 main()
 
+background_tasks = set()
+
+@app.on_event("startup")
+async def startup():
+    """ Start the periodic fire risk sweep,
+        the telemetry retention, if TELEMETRY_RETENTION is set,
+        and the write-behind buffer for drone updates, if INGEST_BUFFER is set."""
+    background_tasks.add(asyncio.create_task(zone_risk_table.run_sweeps()))
+    if telemetry_retention.TELEMETRY_RETENTION:
+        background_tasks.add(asyncio.create_task(telemetry_retention.run_retention()))
+    if INGEST_BUFFER:
+        await ingest_buffer.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """ Write the buffered drone updates, print the metrics of the user cache and the password hasher,
+        stop the password hashing processes and close all pooled database connections."""
+    for task in background_tasks:
+        task.cancel()
+    if ingest_buffer.running:
+        await ingest_buffer.stop()
+        print(f'ingest buffer: {ingest_buffer.stats()}')
+    print(f'user cache: {user_cache.stats()}')
+    print(f'password hasher: {password_hasher.stats()}')
+    password_hasher.close()
+    close_pools()
+
 @app.get("/")
 async def root():
     """ Root function to check if the server is running."""
@@ -1,27 +1,41 @@
 """api tests"""
+import asyncio
 import datetime
+from typing import List
 import os
 import cProfile
 import random
 from smtplib import SMTPException
 import pytz
 from fastapi import HTTPException
+import mapbox_vector_tile
 import msgspec
 import pytest
+from pydantic import parse_raw_as
 from shapely import Polygon, from_geojson, difference
-from api.routers import zones,users,drones
+from api.routers import zones,users,drones,tiles
 from api.routers.incidents import alarm_team, all_incidents
 from api.routers.territories import read_territories,read_territory
-from database import drone_events_table, zones_table, drone_updates_table
-from database import territories_table
-from database import drones_table
-from database.database import TIMEZONE, create_table
+from api.dependencies.authentication import (PasswordHasher, get_password_hash_async, password_hasher,
+                                             verify_password_async)
+from api.dependencies.classes import (Detail, Drone, DroneEvent, DroneUpdateItem, DroneUpdateWithRoute,
+                                     ExportFormat, ExportTable, Incident, TerritoryWithZones, Zone)
+from api.dependencies import exports
+from api.dependencies.drones import store_drone_updates
+from api.dependencies.pagination import NEXT_CURSOR_HEADER
+from api.dependencies.users import get_user
+from database import drone_events_table, zones_table, drone_updates_table, zone_risk_table
+from database import area_cache_table, telemetry_retention, territories_table
+from database import drones_table, vector_tiles
+from database.database import TIMEZONE, create_table, fetch_one
 from database.drones_table import CREATE_DRONES_TABLE
 from database.incidents import CREATE_INCIDENTS_TABLE
-from database.organizations_table import CREATE_ORGANISATIONS_TABLE
+from database.organizations_table import CREATE_ORGANISATIONS_TABLE, create_orga, get_orga
 from database.territories_table import CREATE_TERRITORY_TABLE, get_orga_area
-from database.territory_zones_table import CREATE_TERRITORYZONES_TABLE
+from database.territory_zones_table import (CREATE_TERRITORYZONES_TABLE, link_territory_zone,
+                                           unlink_territory_zone)
 from database.users_table import CREATE_USER_TABLE
+from database.vector_tiles import get_tile_of_coordinate
 
 def improvements():
     """test.
@@ -54,9 +68,13 @@ def test_createstatements():
     create_table(zones_table.CREATE_ZONE_TABLE)
     create_table(CREATE_DRONES_TABLE)
     create_table(drone_updates_table.CREATE_DRONE_DATA_TABLE)
+    create_table(drone_updates_table.CREATE_DRONE_LATEST_TABLE)
+    create_table(drone_updates_table.CREATE_DRONE_DATA_ARCHIVE_TABLE)
     create_table(drone_events_table.CREATE_DRONE_EVENT_TABLE)
+    create_table(zone_risk_table.CREATE_ZONE_RISK_TABLE)
     create_table(CREATE_TERRITORY_TABLE)
     create_table(CREATE_TERRITORYZONES_TABLE)
+    create_table(area_cache_table.CREATE_AREA_CACHE_TABLE)
     create_table(CREATE_INCIDENTS_TABLE)
 
 
@@ -64,14 +82,14 @@ def test_createstatements():
 async def test_incidents():
     """incident api tests.
     """
-    user = users.get_user(os.getenv("ADMIN_MAIL"))
+    user = get_user(os.getenv("ADMIN_MAIL"))
     await alarm_team('test_name',
                'test_loc',
                'test_type',
                 'test_notes',
                 user)
 
-    alarms = await all_incidents(user)
+    alarms = parse_raw_as(List[Incident], (await all_incidents(user)).body)
     assert alarms[len(alarms)-1].notes == 'test_notes'
     assert alarms[len(alarms)-1].location == 'test_loc'
 
@@ -80,8 +98,8 @@ async def test_zones():
     """zone api tests.
     """
     #fetched = zones_table.get_zones()
-    user = users.get_user(os.getenv("ADMIN_MAIL"))
-    territories = await read_territories(user)
+    user = get_user(os.getenv("ADMIN_MAIL"))
+    territories = parse_raw_as(List[TerritoryWithZones], (await read_territories(user)).body)
     assert len(territories) <= 2 and len(territories) > 0
     with pytest.raises(HTTPException):
         await read_territory(0,user)
@@ -107,12 +125,120 @@ async def test_zones():
     count = await zones.get_zone_count(user.organization.id)
     assert len(zones_arr) == count
 
+    low_zones = parse_raw_as(List[Zone], (await zones.read_zones_all(user, zoom=5)).body)
+    assert [low.id for low in low_zones] == [full.id for full in zones_arr]
+    low_zone = await zones.read_zone(zones_arr[index].id, user, detail=Detail.LOW)
+    assert low_zone.geo_json is not None
+    assert low_zone.last_update == zone.last_update
+
+    tile_x, tile_y = get_tile_of_coordinate(zone.lon, zone.lat, 10)
+    tile = await tiles.read_tile(10, tile_x, tile_y, user)
+    layers = mapbox_vector_tile.decode(tile.body)
+    assert zone.id in [feature['id'] for feature in layers['zones']['features']]
+    assert len(layers['territories']['features']) > 0
+    with pytest.raises(HTTPException):
+        await tiles.read_tile(1, 2, 0, user)
+
+def test_area_cache():
+    """linking and unlinking zones recomputes the cached area of the territory.
+    """
+    orga_id = get_orga(os.getenv("ADMIN_ORGANIZATION_TWO")).id
+    territory_id = territories_table.create_territory(orga_id, f'cache{random.randint(0, 100000)}')
+    zone_one, zone_two = zones_table.get_zone_of_district(os.getenv("DEMO_DISTRICT"))[:2]
+
+    def get_cached():
+        return fetch_one(area_cache_table.GET_AREA, (area_cache_table.TERRITORY, territory_id))
+
+    assert link_territory_zone(territory_id, zone_one.id)
+    # computed by the link, not by the read.
+    area_one = get_cached()
+    assert area_one is not None
+    assert area_cache_table.get_area(area_cache_table.TERRITORY, territory_id) == area_one[0]
+
+    assert link_territory_zone(territory_id, zone_two.id)
+    area_two = get_cached()
+    assert area_two != area_one
+    assert from_geojson(area_two[0]).area > from_geojson(area_one[0]).area
+
+    assert unlink_territory_zone(territory_id, zone_two.id)
+    assert get_cached() == area_one
+    assert unlink_territory_zone(territory_id, zone_one.id)
+    assert get_cached() is None
+
 @pytest.mark.asyncio
-async def test_drones():
-    """drone api tests
+async def test_tile_stamp():
+    """updates only change the tile stamp of the organizations whose zones they are in.
+    """
+    user = get_user(os.getenv("ADMIN_MAIL"))
+    other = create_orga(f'tiles{random.randint(0, 100000)}', 'TLS')
+    territory_id = territories_table.create_territory(other.id, f'tiles{random.randint(0, 100000)}')
+    lat = float(os.getenv("DEMO_LAT"))
+    lon = float(os.getenv("DEMO_LONG"))
+    zone = zones_table.get_zone_of_coordinate(lon, lat)
+    other_zone = next(other_zone for other_zone in zones_table.get_zone_of_district(os.getenv("DEMO_DISTRICT_TWO"))
+                      if other_zone.id != zone.id)
+    assert link_territory_zone(territory_id, other_zone.id)
+
+    stamp = vector_tiles.get_tile_stamp(user.organization.id)
+    other_stamp = vector_tiles.get_tile_stamp(other.id)
+    tile_x, tile_y = get_tile_of_coordinate(lon, lat, 10)
+    tile = (await tiles.read_tile(10, tile_x, tile_y, user)).body
+    assert (await tiles.read_tile(10, tile_x, tile_y, user)).body == tile
+
+    drone = drones_table.create_drone(name=f'niobe{random.randint(0, 1000)}',
+                                      drone_type="Unmanned Aerial Vehicle",
+                                      cc_range=7.5,
+                                      flight_range=100.0,
+                                      flight_time=90.0)
+    timestamp = datetime.datetime.utcnow()
+    drone_updates_table.create_drone_update(drone_id=drone.id,
+                                            timestamp=timestamp,
+                                            longitude=lon,
+                                            latitude=lat,
+                                            flight_range=50,
+                                            flight_time=50)
+    zones_table.set_update_for_coordinate(lon, lat, timestamp)
+    assert vector_tiles.get_tile_stamp(user.organization.id) != stamp
+    assert vector_tiles.get_tile_stamp(other.id) == other_stamp
+    # the stamp of the organization is reused for TILE_STAMP_SECONDS.
+    vector_tiles.tile_cache.clear()
+    drones_layer = mapbox_vector_tile.decode((await tiles.read_tile(10, tile_x, tile_y, user)).body)['drones']
+    assert drone.id in [feature['id'] for feature in drones_layer['features']]
+
+@pytest.mark.asyncio
+async def test_zones_all_events(monkeypatch):
+    """/zones/all/ fetches the events of all zones with one query and attaches them.
+    """
+    user = get_user(os.getenv("ADMIN_MAIL"))
+    zone = (await zones.get_all_zones(user.organization.id))[0]
+    drone = drones_table.create_drone(name=f'morpheus{random.randint(0, 1000)}',
+                                      drone_type="Unmanned Aerial Vehicle",
+                                      cc_range=7.5,
+                                      flight_range=100.0,
+                                      flight_time=90.0)
+    assert drone_events_table.create_drone_event_entry(drone.id, datetime.datetime.utcnow(),
+                                                       zone.lon, zone.lat, 1, 90, None, None)
+
+    calls = []
+    get_events_by_zone = drone_events_table.get_events_by_zone
+    def count_calls(*args, **kwargs):
+        calls.append(args)
+        return get_events_by_zone(*args, **kwargs)
+    monkeypatch.setattr(drone_events_table, 'get_events_by_zone', count_calls)
+
+    all_zones = parse_raw_as(List[Zone], (await zones.read_zones_all(user)).body)
+    assert len(calls) == 1
+    # the window starts 3 days before the request, not before the start of the process.
+    assert datetime.datetime.utcnow() - calls[0][1] < datetime.timedelta(days=3, minutes=1)
+    read_zone = next(read for read in all_zones if read.id == zone.id)
+    assert read_zone.events and read_zone.events[0].drone_id == drone.id
+
+def create_demo_drone(name: str) -> tuple[Drone, datetime.datetime]:
+    """creates a drone with one update at DEMO_LONG, DEMO_LAT.
+
+    Returns:
+        tuple[Drone, datetime.datetime]: the drone and the timestamp of its update.
     """
-    user = users.get_user(os.getenv("ADMIN_MAIL"))
-    name = f'trinity{random.randint(0, 1000)}'
     drone = drones_table.create_drone(
                 name=name,
                 drone_type="Unmanned Aerial Vehicle",
@@ -132,6 +258,14 @@ async def test_drones():
             flight_time=50
         )
     zones_table.set_update_for_coordinate(lon, lat, timestamp)
+    return drone, timestamp
+
+@pytest.mark.asyncio
+async def test_drones():
+    """drone api tests
+    """
+    user = get_user(os.getenv("ADMIN_MAIL"))
+    drone, timestamp = create_demo_drone(f'trinity{random.randint(0, 1000)}')
     read_drone = await drones.read_drone(drone_id=drone.id,current_user=user)
     assert drone.name == read_drone.name and drone.flight_range == read_drone.flight_range
 
@@ -140,12 +274,16 @@ async def test_drones():
     assert [] == await drones.read_drone_events(current_user=user,zone_id=-1)
 
     try:
-        zone_events = await drones.read_drone_events(current_user=user,zone_id=zone.id)
+        zone_events = parse_raw_as(List[DroneEvent],
+                                   (await drones.read_drone_events(current_user=user,
+                                                                   zone_id=zone.id)).body)
     except HTTPException:
         print('No events in zone')
         zone_events = None
 
-    zone_updates = await drones.read_drone_route(current_user=user,drone_id=drone.id)
+    zone_updates = parse_raw_as(List[DroneUpdateWithRoute],
+                                (await drones.read_drone_route(current_user=user,
+                                                               drone_id=drone.id)).body)
     assert zone_events == zone.events
     assert zone_updates[0].timestamp == zone.last_update
 
@@ -205,13 +343,151 @@ async def test_drones():
             flight_time=50
         )
 
+@pytest.mark.asyncio
+async def test_drone_events_pagination():
+    """the pages of /drones/events/ contain all events in the same order.
+    """
+    user = get_user(os.getenv("ADMIN_MAIL"))
+    all_events = parse_raw_as(List[DroneEvent],
+                              (await drones.read_drone_events(current_user=user)).body)
+    paged_events = []
+    cursor = None
+    while True:
+        page = await drones.read_drone_events(current_user=user, limit=1, cursor=cursor)
+        if page == []:
+            break
+        paged_events += parse_raw_as(List[DroneEvent], page.body)
+        cursor = page.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+    assert paged_events == all_events
+
+@pytest.mark.asyncio
+async def test_drone_export():
+    """the csv export contains all events, the ndjson export all updates of the drone.
+    """
+    user = get_user(os.getenv("ADMIN_MAIL"))
+    drone, _ = create_demo_drone(f'switch{random.randint(0, 1000)}')
+    all_events = parse_raw_as(List[DroneEvent],
+                              (await drones.read_drone_events(current_user=user)).body)
+
+    export = await drones.export_drones(table=ExportTable.EVENTS,
+                                        export_format=ExportFormat.CSV,
+                                        current_user=user)
+    lines = b''.join([chunk async for chunk in export.body_iterator]).splitlines()
+    assert lines[0].decode() == ','.join(drone_events_table.EXPORT_COLUMNS)
+    assert len(lines) - 1 == len(all_events)
+
+    export = await drones.export_drones(drone_id=drone.id, current_user=user)
+    exported = [msgspec.json.decode(line)
+                for line in b''.join([chunk async for chunk in export.body_iterator]).splitlines()]
+    assert len(exported) == len(drone_updates_table.get_drone_updates(orga_id=1, drone_id=drone.id))
+
+def test_export_concurrency(monkeypatch):
+    """only EXPORT_CONCURRENCY exports read from the database at once, the others wait.
+    """
+    monkeypatch.setattr(exports, 'EXPORT_CONCURRENCY', 1)
+    reading = []
+
+    def chunks(name):
+        # the connection is checked out when the generator starts.
+        reading.append(name)
+        try:
+            yield name.encode()
+            yield name.encode()
+        finally:
+            reading.remove(name)
+
+    async def export(name):
+        result = []
+        async for chunk in exports.iterate_async(chunks(name)):
+            assert reading == [name]
+            result.append(chunk)
+            await asyncio.sleep(0)
+        return b''.join(result)
+
+    async def run_exports():
+        return await asyncio.gather(export('a'), export('b'))
+
+    assert asyncio.run(run_exports()) == [b'aa', b'bb']
+    assert not reading
+
+@pytest.mark.asyncio
+async def test_drone_route_simplification():
+    """/drones/route/ simplifies the routes to max_points and rejects invalid parameters.
+    """
+    user = get_user(os.getenv("ADMIN_MAIL"))
+    drone, timestamp = create_demo_drone(f'apoc{random.randint(0, 1000)}')
+    lat = float(os.getenv("DEMO_LAT"))
+    lon = float(os.getenv("DEMO_LONG"))
+    drone_updates_table.create_drone_updates(drone.id,
+                                             [(timestamp - datetime.timedelta(seconds=step),
+                                               lon + step * 0.0001, lat + (step % 2) * 0.0001, 50, 50)
+                                              for step in range(1, 6)])
+
+    route = parse_raw_as(List[DroneUpdateWithRoute],
+                         (await drones.read_drone_route(current_user=user, drone_id=drone.id)).body)
+    simplified = parse_raw_as(List[DroneUpdateWithRoute],
+                              (await drones.read_drone_route(current_user=user,
+                                                             drone_id=drone.id,
+                                                             max_points=2)).body)
+    properties = simplified[0].geojson['properties']
+    assert properties['vertices'] == route[0].geojson['properties']['vertices'] == 6
+    assert properties['simplified_vertices'] == 2
+    assert simplified[0].timestamp == route[0].timestamp
+
+    with pytest.raises(HTTPException):
+        await drones.read_drone_route(current_user=user, drone_id=drone.id, max_points=1)
+    with pytest.raises(HTTPException):
+        await drones.read_drone_route(current_user=user, drone_id=drone.id, tolerance=-1)
+
+@pytest.mark.asyncio
+async def test_drone_update_batch():
+    """batch ingest tests
+    """
+    lat = float(os.getenv("DEMO_LAT"))
+    lon = float(os.getenv("DEMO_LONG"))
+    timestamp = datetime.datetime.utcnow()
+    updates = [DroneUpdateItem(timestamp=timestamp, lon=lon, lat=lat),
+               DroneUpdateItem(timestamp=timestamp, lon=lon, lat=100),
+               DroneUpdateItem(timestamp=timestamp - datetime.timedelta(hours=1), lon=lon, lat=lat)]
+    results = await store_drone_updates(1, updates)
+    assert [result['status'] for result in results] == ['stored', 'invalid', 'stored']
+
+    zone = zones_table.get_zone(results[0]['zone_id'])
+    tz_timestamp = timestamp.astimezone(pytz.timezone(TIMEZONE))
+    assert zone.last_update == tz_timestamp
+    latest = drone_updates_table.get_latest_update(1)
+    assert latest.timestamp == tz_timestamp
+
+def test_telemetry_retention():
+    """downsampled updates are still returned after they left drone_data.
+    """
+    lat = float(os.getenv("DEMO_LAT"))
+    lon = float(os.getenv("DEMO_LONG"))
+    horizon = datetime.datetime(2000, 1, 1, 0, 1)
+    updates = [(horizon - datetime.timedelta(seconds=seconds), lon, lat, 50, 50)
+               for seconds in range(10, 130, 10)]
+    drone_updates_table.create_drone_updates(1, updates)
+    before = drone_updates_table.get_drone_updates(drone_id=1, before=horizon)
+
+    assert telemetry_retention.archive_updates(horizon, 60) >= len(updates)
+    after = drone_updates_table.get_drone_updates(drone_id=1, before=horizon)
+    # one update per minute, the latest of each minute.
+    assert [update.timestamp for update in after] == [before[0].timestamp, before[6].timestamp]
+
+    # the ids of archived updates arent given to new updates.
+    drone_updates_table.create_drone_updates(1, [(datetime.datetime.utcnow(), lon, lat, 50, 50)])
+    archived = fetch_one('SELECT MAX(id) FROM drone_data_archive;')[0]
+    assert drone_updates_table.get_latest_update(1).id > archived
+
 
 @pytest.mark.asyncio
 async def test_users():
     """user api tests
     """
     adminmail = os.getenv("ADMIN_MAIL")
-    user = users.get_user(adminmail)
+    user = get_user(adminmail)
     first_name = f'{user.first_name}s'
     last_name = f'{user.last_name}s'
     email = 'Hans@admin.org'
@@ -230,11 +506,11 @@ async def test_users():
     except HTTPException:
         print('User already exists')
 
-    newuser = users.get_user(newmail)
+    newuser = get_user(newmail)
     await users.delete_users(newuser.id,user)
 
     await users.update_user_info(current_user=user,first_name=first_name,last_name=last_name)
-    updated = users.get_user(adminmail)
+    updated = get_user(adminmail)
     assert updated.first_name == first_name
     assert updated.last_name == last_name
 
@@ -245,7 +521,7 @@ async def test_users():
         email_verified=verified,#
         email=email
     )
-    updated = users.get_user(email)
+    updated = get_user(email)
     assert updated.first_name == first_name
     assert updated.last_name == last_name
     assert updated.email == email
@@ -255,3 +531,34 @@ async def test_users():
                                  email=adminmail,
                                  first_name='Admin',
                                  last_name='Admin')
+
+@pytest.mark.asyncio
+async def test_password_hasher():
+    """passwords are hashed and verified on the process pool of the password hasher.
+    """
+    hashed = await get_password_hash_async('password')
+    assert await verify_password_async('password', hashed)
+    assert not await verify_password_async('wrong password', hashed)
+    assert await users.authenticate_user(os.getenv("ADMIN_MAIL"), os.getenv("ADMIN_PASSWORD")) is not None
+    stats = password_hasher.stats()
+    assert stats['verifications'] >= 3
+    assert stats['in_flight'] == 0
+
+def test_password_hasher_event_loops():
+    """the password hasher can be used from several event loops, e.g. after a restart.
+    """
+    hasher = PasswordHasher(workers=1, concurrency=1)
+
+    async def hash_twice():
+        # the second hash waits for the semaphore.
+        return await asyncio.gather(hasher.hash('password'), hasher.hash('password'))
+
+    try:
+        hashed = asyncio.run(hash_twice())
+        assert len(asyncio.run(hash_twice())) == 2
+        hasher.close()
+        assert asyncio.run(hasher.verify('password', hashed[0]))
+        stats = hasher.stats()
+        assert stats['hashes'] == 4 and stats['waiting'] == 0 and stats['in_flight'] == 0
+    finally:
+        hasher.close()
@@ -1,23 +1,39 @@
 """database tests"""
 # setting path
+import asyncio
+import datetime
 import json
 import os
 import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
 from sqlite3 import IntegrityError
+import numpy
+import pytest
+import shapely
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from api.dependencies.authentication import get_password_hash
-from api.dependencies.classes import(Organization,
+from api.dependencies.classes import(EventType,
+                                    Organization,
+                                     RouteSimplification,
                                      UserWithSensitiveInfo,
                                      SettingsType)
-from database.database import create_table
+from api.dependencies.responses import MsgspecResponse
+from database.database import close_pools, connect, create_table, run_async
+import database.database as db
+from database.connection_pool import ConnectionPool, PoolTimeoutError
 from database.mail_verif_table import (check_token,
                                        get_mail_by_token,
                                        get_token_by_mail,
                                        store_token,
                                        CREATE_MAIL_VERIFY_TABLE
                                        )
-from database.users_table import get_user
+from database.users_table import UsrAttributes, UserCache, get_user, update_user
 from database.organizations_table import OrgAttributes, create_orga, get_orga, update_orga
-from database import settings_table, user_settings_table
+from database import (drone_events_table, drone_updates_table, epoch_timestamps, incidents,
+                      settings_table, user_settings_table, users_table, zone_locator, zone_risk_table, zones_table)
 
 
 MAIL = 'test3@mail.de'
@@ -119,3 +135,409 @@ def test_usersettings():
     user_settings_table.set_usersetting(2,user_id=user.id,value=json.dumps(test_json))
     usrsetting = user_settings_table.get_usersetting(2,user.id)
     assert usrsetting.value == test_json, 'Couldnt set value.'
+
+def test_user_cache():
+    """the cache returns the same user until it expires or the user is updated.
+    """
+    cache = UserCache(size=1, max_age=60)
+    user = cache.get_user(os.getenv("ADMIN_MAIL"))
+    assert user is not None
+    assert cache.get_user(os.getenv("ADMIN_MAIL")) is user
+    assert cache.get_user('unknown@kiwa.tech') is None
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'invalidations': 0, 'size': 1}
+
+    # the update invalidates the shared cache, a local cache is invalidated explicitly.
+    update_user(user.id, UsrAttributes.DISABLED, False)
+    cache.invalidate(user.id)
+    assert cache.stats()['size'] == 0
+    assert cache.get_user(os.getenv("ADMIN_MAIL")) is not user
+
+    cache.max_age = 0
+    assert cache.get_user(os.getenv("ADMIN_MAIL")) is not None
+    assert cache.stats()['misses'] == 4
+
+def test_user_cache_write(monkeypatch):
+    """a user fetched while the update is written isnt kept in the cache.
+    """
+    cache = UserCache(size=2, max_age=60)
+    user = user_one.copy(update={'id': 7})
+    monkeypatch.setattr(users_table, 'user_cache', cache)
+    monkeypatch.setattr(users_table, 'get_user', lambda email: user)
+
+    def update(_sql, _data):
+        # a request reads the old row before the update commits.
+        assert cache.get_user(MAIL) is user
+        return True
+    monkeypatch.setattr(db, 'update', update)
+    assert update_user(user.id, UsrAttributes.DISABLED, True)
+    assert cache.stats()['size'] == 0
+    assert users_table.update_user_withsql(user.id, 'disabled = ?', [True])
+    assert cache.stats()['size'] == 0
+    assert users_table.delete_user(user.id)
+    assert cache.stats() == {'hits': 0, 'misses': 3, 'invalidations': 3, 'size': 0}
+
+def test_connection_pool():
+    """tests for the connection pool.
+    """
+    pool = ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False),
+                          size=2,
+                          timeout=0.1)
+    with pool.connection() as conn_one:
+        with pool.connection() as conn_two:
+            assert conn_one is not conn_two
+            with pytest.raises(PoolTimeoutError):
+                pool.acquire()
+        conn_one.execute('CREATE TABLE test (id integer);')
+        conn_one.execute('INSERT INTO test VALUES (1);')
+
+    # open transaction got rolled back and the connection got reused.
+    with pool.connection() as conn:
+        assert conn in (conn_one, conn_two)
+    stats = pool.stats()
+    assert stats['creations'] == 2
+    assert stats['checkouts'] == 3
+    assert stats['timeouts'] == 1
+    assert stats['idle'] == 2 and stats['in_use'] == 0
+
+    # broken connections are discarded on return.
+    conn = pool.acquire()
+    conn.close()
+    pool.release(conn)
+    assert pool.stats()['discarded'] == 1
+
+    pool.close()
+    with pytest.raises(sqlite3.OperationalError):
+        pool.acquire()
+
+def test_pool_threads(tmp_path, monkeypatch):
+    """a pooled connection can be used by another thread after it was returned.
+    """
+    # python 3.10 reports the multi-thread mode, newer versions the serialized mode.
+    monkeypatch.setattr(sqlite3, 'threadsafety', 1)
+    pool = ConnectionPool(lambda: connect(str(tmp_path / 'threads.db')), size=1, timeout=1)
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE test (id integer);')
+        conn.commit()
+        first = conn
+
+    def insert():
+        with pool.connection() as conn:
+            conn.execute('INSERT INTO test VALUES (1);')
+            conn.commit()
+            return conn
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(insert).result() is first
+
+    with pool.connection() as conn:
+        assert conn is first
+        assert conn.execute('SELECT COUNT(*) FROM test;').fetchone()[0] == 1
+    pool.close()
+
+def test_run_async_after_close():
+    """the database executor is created again after close_pools.
+    """
+    assert asyncio.run(run_async(sum, [1, 2])) == 3
+    close_pools()
+    assert asyncio.run(run_async(sum, [1, 2])) == 3
+
+def test_epoch_timestamps():
+    """tests the ts column of epoch_timestamps.
+    """
+    conn = sqlite3.connect(':memory:')
+    # incidents of an older version, without ts and with the trigger that filled it.
+    conn.execute('''CREATE TABLE incidents (id integer PRIMARY KEY, drone_name text, location text,
+                    alarm_type text, notes text, timestamp timestamp);''')
+    conn.execute('''CREATE TRIGGER incidents_ts_insert AFTER INSERT ON incidents
+                    BEGIN SELECT 1; END;''')
+    aware = datetime.datetime(2023, 1, 1, 2, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+    naive = datetime.datetime(2023, 1, 1, 0, 0, 1, 500000)
+    conn.execute('''INSERT INTO incidents (drone_name, location, alarm_type, notes, timestamp)
+                    VALUES ('drone', 'location', 'alarm', 'notes', ?);''', (aware,))
+
+    # filled by the migration, the writers bind ts themselves.
+    epoch_timestamps.add_epoch_columns(conn)
+    conn.execute(incidents.INSERT_INCIDENT,
+                 ('drone', 'location', 'alarm', 'notes', naive, epoch_timestamps.to_epoch_ms(naive)))
+    # a second run changes nothing.
+    epoch_timestamps.add_epoch_columns(conn)
+    assert conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger';").fetchall() == []
+
+    fetched = conn.execute('SELECT ts FROM incidents ORDER BY id;').fetchall()
+    assert fetched == [(epoch_timestamps.to_epoch_ms(aware),), (epoch_timestamps.to_epoch_ms(naive),)]
+    assert fetched[0][0] == 1672531200000
+    assert epoch_timestamps.from_epoch_ms(fetched[1][0]) == naive.replace(tzinfo=datetime.timezone.utc)
+
+    # the indexes on ts only exist while the reads use them.
+    get_index = "SELECT name FROM sqlite_master WHERE type = 'index' AND name = 'incidents_AK_2';"
+    epoch_timestamps.set_epoch_indexes(conn, True)
+    assert conn.execute(get_index).fetchall() == [('incidents_AK_2',)]
+    epoch_timestamps.set_epoch_indexes(conn, False)
+    assert conn.execute(get_index).fetchall() == []
+    conn.close()
+
+def test_last_updates_mixed_timezones():
+    """timestamps with and without timezone are compared in UTC.
+    """
+    naive = datetime.datetime(2023, 1, 1, 12, 0)
+    aware = datetime.datetime(2023, 1, 1, 13, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+    later = datetime.datetime(2023, 1, 1, 12, 0, 1, tzinfo=datetime.timezone.utc)
+    last_updates = zones_table.get_last_updates([naive, aware, later, naive], [1, 1, 2, None])
+    assert last_updates == {1: naive, 2: datetime.datetime(2023, 1, 1, 12, 0, 1)}
+
+@pytest.fixture(name='risk_pool')
+def fixture_risk_pool(tmp_path, monkeypatch):
+    """database with zone_risk and the columns of drone_event it is computed from,
+    used by all functions of database.database.
+    """
+    pool = ConnectionPool(lambda: sqlite3.connect(str(tmp_path / 'risk.db'),
+                                                  check_same_thread=False,
+                                                  detect_types=sqlite3.PARSE_DECLTYPES))
+    with pool.connection() as conn:
+        conn.executescript(zone_risk_table.CREATE_ZONE_RISK_TABLE)
+        conn.execute('''CREATE TABLE drone_event (id integer PRIMARY KEY, zone_id integer,
+                        event_type integer, confidence integer, timestamp timestamp);''')
+    monkeypatch.setattr(db, 'get_pool', lambda path=None: pool)
+    yield pool
+    pool.close()
+
+def get_risk(pool: ConnectionPool, zone_id: int) -> tuple | None:
+    """max_smoke, max_fire, smoke_count, fire_count and oldest of the zone."""
+    with pool.connection() as conn:
+        return conn.execute('''SELECT max_smoke, max_fire, smoke_count, fire_count, oldest
+                                FROM zone_risk WHERE zone_id = ?;''', (zone_id,)).fetchone()
+
+def test_zone_risk_add_event(risk_pool):
+    """new events are added in UTC, events before the window dont count.
+    """
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    plus_two = datetime.timezone(datetime.timedelta(hours=2))
+    window_start = now - datetime.timedelta(hours=zone_risk_table.FIRE_RISK_WINDOW_HOURS)
+
+    assert zone_risk_table.add_event(None, EventType.FIRE, 99, now)
+    assert zone_risk_table.add_event(1, EventType.SMOKE, 80, now - datetime.timedelta(hours=1))
+    # in local time of +02:00 within the window, in UTC an hour before it.
+    before_window = (window_start - datetime.timedelta(hours=1)).replace(tzinfo=datetime.timezone.utc)
+    assert zone_risk_table.add_event(1, EventType.FIRE, 60, before_window.astimezone(plus_two))
+    inside_window = (now - datetime.timedelta(hours=2)).replace(tzinfo=datetime.timezone.utc)
+    assert zone_risk_table.add_event(1, EventType.FIRE.value, 50, inside_window.astimezone(plus_two))
+
+    assert get_risk(risk_pool, 1) == (80, 50, 1, 1, now - datetime.timedelta(hours=2))
+    assert get_risk(risk_pool, None) is None
+
+def test_zone_risk_rebuild_and_sweep(risk_pool, monkeypatch):
+    """rebuild recomputes all zones, the sweep ages out events that left the window.
+    """
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    events = [(1, EventType.SMOKE.value, 90, now - datetime.timedelta(hours=10)),
+              (1, EventType.FIRE.value, 40, now - datetime.timedelta(hours=1)),
+              (2, EventType.FIRE.value, 70, now - datetime.timedelta(hours=10)),
+              (None, EventType.FIRE.value, 100, now),
+              (3, EventType.FIRE.value, 100, now - datetime.timedelta(days=365))]
+    with risk_pool.connection() as conn:
+        conn.executemany('''INSERT INTO drone_event (zone_id, event_type, confidence, timestamp)
+                            VALUES (?, ?, ?, ?);''', events)
+        conn.execute('''INSERT INTO zone_risk (zone_id, max_fire, fire_count, oldest)
+                        VALUES (4, 10, 1, ?);''', (now,))
+        conn.commit()
+
+    assert zone_risk_table.rebuild()
+    assert get_risk(risk_pool, 1) == (90, 40, 1, 1, now - datetime.timedelta(hours=10))
+    assert get_risk(risk_pool, 2) == (0, 70, 0, 1, now - datetime.timedelta(hours=10))
+    assert get_risk(risk_pool, 3) is None
+    assert get_risk(risk_pool, 4) is None
+
+    monkeypatch.setattr(zone_risk_table, 'FIRE_RISK_WINDOW_HOURS', 5)
+    assert zone_risk_table.sweep()
+    assert get_risk(risk_pool, 1) == (0, 40, 0, 1, now - datetime.timedelta(hours=1))
+    assert get_risk(risk_pool, 2) is None
+
+def test_zone_risk_failed_rebuild(risk_pool, monkeypatch):
+    """a rebuild that fails after the delete keeps the old aggregates.
+    """
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    with risk_pool.connection() as conn:
+        conn.execute('''INSERT INTO zone_risk (zone_id, max_fire, fire_count, oldest)
+                        VALUES (4, 10, 1, ?);''', (now,))
+        conn.commit()
+    monkeypatch.setattr(zone_risk_table, 'RECOMPUTE', 'INSERT INTO missing_table {} VALUES (?);')
+    assert not zone_risk_table.rebuild()
+    assert not zone_risk_table.sweep()
+    assert get_risk(risk_pool, 4) == (0, 10, 0, 1, now)
+
+def test_msgspec_timestamps():
+    """the msgspec responses encode timestamps exactly like FastAPI encodes the pydantic classes.
+    """
+    utc = datetime.datetime(2023, 6, 1, 12, 0, tzinfo=datetime.timezone.utc)
+    berlin = datetime.datetime(2023, 6, 1, 14, 0, 0, 250000,
+                               tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+    updates = [(2, 7, berlin, 50.0, 50.0, 13.1, 52.1, 3), (1, 7, utc, 50.0, 50.0, 13.0, 52.0, 3)]
+    events = [(1, 7, utc, 13.0, 52.0, EventType.FIRE.value, 80, None, None, 3)]
+    zone = (3, 'zone', 'Brandenburg', 'Potsdam', '{"type": "Point", "coordinates": [13.0, 52.0]}',
+            13.0, 52.0, 1, utc, 1, 0, 80)
+    fetched = [(incidents.INCIDENT_DECODER.decode_all, [(1, 'drone', 'loc', 'fire', 'notes', utc)]),
+               (drone_updates_table.UPDATE_DECODER.decode_all, updates),
+               (drone_events_table.EVENT_DECODER.decode_all, events),
+               (drone_updates_table.get_routeobj_from_fetched, updates),
+               (lambda rows, as_struct: [zones_table.get_obj_from_fetched(row, events_by_zone={},
+                                                                          as_struct=as_struct)
+                                         for row in rows], [zone])]
+    for decode, rows in fetched:
+        body = MsgspecResponse(decode(rows, as_struct=True)).body
+        assert body == JSONResponse(jsonable_encoder(decode(rows, as_struct=False))).body
+        assert b'+00:00"' in body and b'Z"' not in body
+
+def test_build_routes():
+    """the routes of mixed rows of several drones, newest first, without the updates without coordinates.
+    """
+    start = datetime.datetime(2023, 6, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+    def row(update_id, drone_id, seconds, lon, lat):
+        return (update_id, drone_id, start - datetime.timedelta(seconds=seconds), 50.0, 50.0, lon, lat, 3)
+
+    # newest first per drone, the drones are mixed.
+    rows = [row(9, 2, 0, 13.3, 52.3),
+            row(8, 1, 0, 13.0, 52.0),
+            row(7, 2, 10, None, None),
+            row(6, 1, 10, 13.1, 52.1),
+            row(5, 3, 0, 14.0, 53.0),
+            row(4, 2, 20, 13.2, 52.2),
+            row(3, 1, 20, 13.2, 52.0),
+            row(2, 1, 30, 13.3, 52.1),
+            row(1, 1, 40, 13.4, 52.0),
+            row(0, 4, 0, None, None)]
+    routes = drone_updates_table.get_routeobj_from_fetched(rows)
+    assert [(route.id, route.drone_id) for route in routes] == [(9, 2), (8, 1), (5, 3), (0, 4)]
+    assert routes[3].geojson['geometry'] is None
+    routes = routes[:3]
+    assert [route.geojson['geometry']['type'] for route in routes] == ['LineString', 'LineString', 'Point']
+    assert routes[0].geojson['geometry']['coordinates'] == [[13.3, 52.3], [13.2, 52.2]]
+    assert routes[1].geojson['geometry']['coordinates'] == [[13.0, 52.0], [13.1, 52.1], [13.2, 52.0],
+                                                           [13.3, 52.1], [13.4, 52.0]]
+    assert routes[2].geojson['geometry']['coordinates'] == (14.0, 53.0)
+    assert [route.geojson['properties']['vertices'] for route in routes] == [2, 5, 1]
+
+    simplified = drone_updates_table.get_routeobj_from_fetched(
+        rows, simplification=RouteSimplification(max_points=2))
+    assert simplified[1].geojson['geometry']['coordinates'] == [[13.0, 52.0], [13.4, 52.0]]
+    assert [route.geojson['properties']['simplified_vertices'] for route in simplified] == [2, 2, 1, 0]
+    assert [route.geojson['properties']['vertices'] for route in simplified] == [2, 5, 1, 0]
+
+    # start is a multiple of 25 seconds, so the buckets are [0], [10, 20] and [30, 40] seconds before it.
+    # the newest point of every bucket and the oldest point are kept.
+    bucketed = drone_updates_table.get_routeobj_from_fetched(
+        rows, simplification=RouteSimplification(bucket_seconds=25))
+    assert bucketed[1].geojson['geometry']['coordinates'] == [[13.0, 52.0], [13.1, 52.1], [13.3, 52.1],
+                                                             [13.4, 52.0]]
+
+def test_simplify_to_max_points():
+    """every line is simplified to at most max_points, keeping its first and last point.
+    """
+    zigzag = shapely.LineString([(x, x % 2 * (1 + x / 10)) for x in range(10)])
+    short = shapely.LineString([(0, 0), (1, 1), (2, 0)])
+    lines = drone_updates_table.simplify_to_max_points(numpy.array([zigzag, short]), 4)
+    assert shapely.get_num_coordinates(lines).tolist() == [4, 3]
+    assert lines[1] is short
+    coords = shapely.get_coordinates(lines[0]).tolist()
+    assert coords[0] == [0, 0] and coords[-1] == [9, 1.9]
+    assert shapely.get_num_coordinates(
+        drone_updates_table.simplify_to_max_points(numpy.array([zigzag]), 2)).tolist() == [2]
+
+@pytest.fixture(name='locator_pool')
+def fixture_locator_pool(tmp_path, monkeypatch):
+    """database with the zone areas as plain geojson, used by all functions of database.database."""
+    pool = ConnectionPool(lambda: sqlite3.connect(str(tmp_path / 'zones.db'), check_same_thread=False))
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE zones (id integer PRIMARY KEY, area text);')
+        conn.commit()
+    monkeypatch.setattr(db, 'get_pool', lambda path=None: pool)
+    monkeypatch.setattr(zone_locator, 'GET_ZONE_AREAS', 'SELECT id, area FROM zones;')
+    yield pool
+    pool.close()
+
+def add_square_zone(pool: ConnectionPool, zone_id: int, lon: float, lat: float) -> None:
+    """stores a zone of one degree with its south west corner at lon, lat."""
+    square = [[lon, lat], [lon + 1, lat], [lon + 1, lat + 1], [lon, lat + 1], [lon, lat]]
+    with pool.connection() as conn:
+        conn.execute('INSERT INTO zones VALUES (?, ?);',
+                     (zone_id, json.dumps({'type': 'Polygon', 'coordinates': [square]})))
+        conn.commit()
+
+def count_refreshes(locator: zone_locator.ZoneLocator, delay: float = 0) -> list:
+    """counts the reloads of the locator, each one takes at least delay seconds."""
+    refreshes = []
+    refresh = locator._refresh  # pylint: disable=protected-access
+
+    def counted():
+        refreshes.append(1)
+        time.sleep(delay)
+        return refresh()
+    locator._refresh = counted  # pylint: disable=protected-access
+    return refreshes
+
+def test_zone_locator(locator_pool, monkeypatch):
+    """an empty zones table is a valid locator, an invalidate during a reload isnt lost.
+    """
+    locator = zone_locator.ZoneLocator()
+    refreshes = count_refreshes(locator)
+    assert locator.locate(13.5, 52.5) is None
+    assert locator.locate(13.5, 52.5) is None
+    assert len(refreshes) == 1
+
+    add_square_zone(locator_pool, 1, 13, 52)
+    locator.invalidate()
+    assert locator.locate(13.5, 52.5) == 1
+    assert locator.locate_many([13.5, 20.5], [52.5, 52.5]) == [1, None]
+    assert len(refreshes) == 2
+
+    # a zone is added while the zones are loaded.
+    prepare = shapely.prepare
+
+    def add_zone_while_loading(areas):
+        monkeypatch.setattr(shapely, 'prepare', prepare)
+        add_square_zone(locator_pool, 2, 20, 52)
+        locator.invalidate()
+        prepare(areas)
+    monkeypatch.setattr(shapely, 'prepare', add_zone_while_loading)
+    locator.invalidate()
+    assert locator.locate(20.5, 52.5) is None
+    assert locator.locate(20.5, 52.5) == 2
+    assert len(refreshes) == 4
+
+def test_zone_locator_threads(locator_pool):
+    """concurrent lookups load the zones once, later lookups use the old tree during a reload.
+    """
+    add_square_zone(locator_pool, 1, 13, 52)
+    locator = zone_locator.ZoneLocator()
+    refreshes = count_refreshes(locator, 0.2)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        zones = list(executor.map(lambda _: locator.locate(13.5, 52.5), range(8)))
+    assert zones == [1] * 8
+    assert len(refreshes) == 1
+
+    locator.invalidate()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        zones = list(executor.map(lambda _: locator.locate(13.5, 52.5), range(8)))
+    assert zones == [1] * 8
+    assert len(refreshes) == 2
+
+def test_update_timestamps_utc(monkeypatch):
+    """the single, the batch and the buffered writes store the timestamps in naive UTC.
+    """
+    written = []
+    stored = []
+    monkeypatch.setattr(db, 'insert', lambda sql, values: stored.append(values[1:3]) or 1)
+    monkeypatch.setattr(db, 'insertmany', lambda sql, rows: stored.extend(row[1:3] for row in rows) or len(rows))
+    monkeypatch.setattr(db, 'update', lambda sql, values: written.append(values[0]) or True)
+    monkeypatch.setattr(zone_locator.zone_locator, 'locate', lambda lon, lat: 3)
+    monkeypatch.setattr(zone_locator.zone_locator, 'locate_many', lambda lons, lats: [3] * len(lons))
+
+    utc = datetime.datetime(2023, 6, 1, 12, 0)
+    aware = datetime.datetime(2023, 6, 1, 14, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+    assert drone_updates_table.create_drone_update(1, aware, 13.0, 52.0, None, None)
+    assert zones_table.set_update_for_coordinate(13.0, 52.0, aware)
+    assert drone_updates_table.create_drone_updates(1, [(aware, 13.0, 52.0, None, None),
+                                                        (utc, 13.0, 52.0, None, None)]) == [3, 3]
+    # the updates are stored with their ts, see epoch_timestamps.
+    assert stored == [(utc, epoch_timestamps.to_epoch_ms(utc))] * 3
+    assert written == [utc]
@@ -0,0 +1,144 @@
+"""tests of the write-behind buffer for drone updates"""
+import asyncio
+import datetime
+import pytest
+from api.dependencies import ingest
+from api.dependencies.ingest import IngestBuffer
+
+TIMESTAMP = datetime.datetime(2023, 1, 1, 12, 0)
+
+# updates of this drone fail, like a drone_id that violates the foreign key.
+UNKNOWN_DRONE = -1
+
+
+class RecordingTables:
+    """records the writes of the buffer instead of storing them."""
+
+    def __init__(self):
+        self.batches = []
+        self.last_updates = []
+        # cleared to stall the writer.
+        self.writable = asyncio.Event()
+        self.writable.set()
+
+    async def create_drone_update_rows_async(self, updates):
+        """records the batch, fails the whole batch if it contains an unknown drone."""
+        await self.writable.wait()
+        if any(update[0] == UNKNOWN_DRONE for update in updates):
+            return None
+        self.batches.append(list(updates))
+        return [1 for _ in updates]
+
+    async def set_update_for_zones_async(self, last_updates):
+        """records the last updates of the zones."""
+        self.last_updates.append(last_updates)
+        return True
+
+
+@pytest.fixture(name='tables')
+def fixture_tables(monkeypatch):
+    """replaces the writes of the buffer with a RecordingTables."""
+    tables = RecordingTables()
+    monkeypatch.setattr(ingest.drone_updates_table, 'create_drone_update_rows_async',
+                        tables.create_drone_update_rows_async)
+    monkeypatch.setattr(ingest.zones_table, 'set_update_for_zones_async',
+                        tables.set_update_for_zones_async)
+    return tables
+
+async def put_updates(buffer: IngestBuffer, count: int, drone_id: int = 1) -> None:
+    """queues count valid updates."""
+    for second in range(count):
+        assert await buffer.put(drone_id, TIMESTAMP + datetime.timedelta(seconds=second),
+                                13.0, 52.0, 1.0, 2.0)
+
+@pytest.mark.asyncio
+async def test_flush_by_size(tables):
+    """a full batch is written without waiting for the deadline."""
+    buffer = IngestBuffer(batch_size=3, flush_ms=60_000, queue_size=100)
+    await buffer.start()
+    await put_updates(buffer, 7)
+    await asyncio.sleep(0.05)
+    assert [len(batch) for batch in tables.batches] == [3, 3]
+    await buffer.stop()
+    assert [len(batch) for batch in tables.batches] == [3, 3, 1]
+
+@pytest.mark.asyncio
+async def test_flush_by_deadline(tables):
+    """a partial batch is written after flush_ms."""
+    buffer = IngestBuffer(batch_size=100, flush_ms=20, queue_size=100)
+    await buffer.start()
+    await put_updates(buffer, 2)
+    await asyncio.sleep(0.2)
+    assert [len(batch) for batch in tables.batches] == [2]
+    assert buffer.running
+    await buffer.stop()
+    assert buffer.stats()['commits'] == 1
+
+@pytest.mark.asyncio
+async def test_flush_on_stop(tables):
+    """stop writes all queued updates."""
+    buffer = IngestBuffer(batch_size=100, flush_ms=60_000, queue_size=100)
+    await buffer.start()
+    await put_updates(buffer, 5)
+    await buffer.stop()
+    assert not buffer.running
+    assert sum(len(batch) for batch in tables.batches) == 5
+    assert buffer.stats()['written'] == 5
+
+@pytest.mark.asyncio
+async def test_back_pressure(tables):
+    """put waits while the queue is full."""
+    buffer = IngestBuffer(batch_size=1, flush_ms=60_000, queue_size=2)
+    await buffer.start()
+    tables.writable.clear()
+    # the writer takes the first update off the queue and stalls on its write.
+    await put_updates(buffer, 3)
+    blocked = asyncio.create_task(put_updates(buffer, 1))
+    await asyncio.sleep(0.05)
+    assert not blocked.done()
+    assert buffer.stats()['queue_depth'] == 2
+
+    tables.writable.set()
+    await blocked
+    await buffer.stop()
+    assert [len(batch) for batch in tables.batches] == [1, 1, 1, 1]
+
+@pytest.mark.asyncio
+async def test_failed_batch(tables):
+    """the updates of a failed batch are written one by one, invalid updates arent queued."""
+    buffer = IngestBuffer(batch_size=100, flush_ms=60_000, queue_size=100)
+    await buffer.start()
+    assert not await buffer.put(1, TIMESTAMP, 200.0, 52.0, None, None)
+    assert not await buffer.put(1, 'yesterday', 13.0, 52.0, None, None)
+    aware = datetime.datetime(2023, 1, 1, 14, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+    assert await buffer.put(1, aware, 13.0, 52.0, None, None)
+    await put_updates(buffer, 1, UNKNOWN_DRONE)
+    await put_updates(buffer, 1)
+    await buffer.stop()
+
+    assert [len(batch) for batch in tables.batches] == [1, 1]
+    assert tables.last_updates == [{1: TIMESTAMP}]
+    stats = buffer.stats()
+    assert stats['invalid'] == 2
+    assert stats['failed'] == 1
+    assert stats['written'] == 2
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('tables')
+async def test_writer_survives_errors(monkeypatch):
+    """an exception in a batch doesnt stop the writer."""
+    async def raise_error(_):
+        raise TypeError('broken batch')
+
+    buffer = IngestBuffer(batch_size=100, flush_ms=10, queue_size=100)
+    await buffer.start()
+    with monkeypatch.context() as patch:
+        patch.setattr(ingest.zones_table, 'set_update_for_zones_async', raise_error)
+        await put_updates(buffer, 2)
+        await asyncio.sleep(0.1)
+    assert buffer.running
+    assert buffer.stats()['failed'] == 2
+
+    await put_updates(buffer, 1)
+    await buffer.stop()
+    assert buffer.stats()['written'] == 1
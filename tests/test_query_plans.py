@@ -0,0 +1,163 @@
+"""query plan tests
+
+Runs EXPLAIN QUERY PLAN on every SQL constant of the database package
+and on the queries the table modules build for the hot paths.
+A statement fails if it reads a whole telemetry table, by a table scan or a scan of an index.
+"""
+import datetime
+import importlib
+import pkgutil
+import re
+import string
+import pytest
+import database
+import database.database as db
+from database import (area_cache_table,
+                      drone_events_table,
+                      drone_updates_table,
+                      epoch_timestamps,
+                      incidents,
+                      zone_risk_table)
+from database.drones_table import CREATE_DRONES_TABLE
+from database.organizations_table import CREATE_ORGANISATIONS_TABLE
+from database.territories_table import CREATE_TERRITORY_TABLE
+from database.territory_zones_table import CREATE_TERRITORYZONES_TABLE
+from database.users_table import CREATE_USER_TABLE
+from database.zones_table import CREATE_ZONE_TABLE
+
+TELEMETRY_TABLES = ['drone_data', 'drone_data_archive', 'drone_event']
+TELEMETRY_REGEX = r'\b(' + '|'.join(TELEMETRY_TABLES) + r')\b'
+
+# e.g. 'SCAN drone_data' or 'SCAN drone_data USING INDEX drone_data_AK_1',
+# a search has a constraint on the index: 'SEARCH drone_data USING INDEX drone_data_AK_2 (drone_id=?)'.
+FULL_SCAN_REGEX = r'^SCAN (' + '|'.join(TELEMETRY_TABLES) + r')\b'
+
+# constants that read the whole table on purpose.
+FULL_SCANS_ALLOWED = {
+    # migration, reads the latest update of every drone from the whole history.
+    'drone_updates_table.FILL_DRONE_LATEST',
+    # template, always filtered by the organization, see test_hot_queries.
+    'drone_events_table.GET_ENTRY',
+}
+
+STATEMENT_REGEX = r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b'
+
+# positional placeholders that arent a where clause, e.g. the column of a filter.
+TEMPLATE_ARGUMENTS = {
+    'zones_table.GET_ZONEJOINORGA': ('id',),
+}
+
+# in the order of main.main.
+SCHEMA = [
+    CREATE_ORGANISATIONS_TABLE,
+    CREATE_USER_TABLE,
+    CREATE_ZONE_TABLE,
+    CREATE_DRONES_TABLE,
+    drone_updates_table.CREATE_DRONE_DATA_TABLE,
+    drone_updates_table.CREATE_DRONE_LATEST_TABLE,
+    drone_updates_table.CREATE_DRONE_DATA_ARCHIVE_TABLE,
+    drone_events_table.CREATE_DRONE_EVENT_TABLE,
+    zone_risk_table.CREATE_ZONE_RISK_TABLE,
+    CREATE_TERRITORY_TABLE,
+    CREATE_TERRITORYZONES_TABLE,
+    area_cache_table.CREATE_AREA_CACHE_TABLE,
+    incidents.CREATE_INCIDENTS_TABLE,
+]
+
+
+class TemplateFormatter(string.Formatter):
+    """fills the placeholders of the sql templates,
+    {table} with the hot partition, the timestamp columns with TIMESTAMP_FIELDS and the rest with ''.
+    """
+    fields = {'table': drone_updates_table.HOT_TABLE, **epoch_timestamps.TIMESTAMP_FIELDS}
+
+    def get_value(self, key, args, kwargs):
+        if isinstance(key, int):
+            return args[key] if key < len(args) else ''
+        return self.fields.get(key, '')
+
+def resolve_template(sql: str, arguments: tuple = ()) -> str:
+    """formats the template until no placeholder is left, templates are formatted in stages.
+    """
+    formatter = TemplateFormatter()
+    for _ in range(3):
+        if '{' not in sql:
+            break
+        sql = formatter.format(sql, *arguments)
+        arguments = ()
+    return sql
+
+def collect_statements() -> list:
+    """the SQL constants of the database package that read or write a telemetry table.
+    """
+    statements = []
+    for module_info in pkgutil.iter_modules(database.__path__):
+        # the indexes on ts only exist if EPOCH_TIMESTAMPS is set.
+        if module_info.name == 'epoch_timestamps' and not epoch_timestamps.EPOCH_TIMESTAMPS:
+            continue
+        module = importlib.import_module(f'database.{module_info.name}')
+        for name, value in vars(module).items():
+            if not name.isupper() or not isinstance(value, str):
+                continue
+            if not re.match(STATEMENT_REGEX, value, re.IGNORECASE):
+                continue
+            constant = f'{module_info.name}.{name}'
+            sql = resolve_template(value, TEMPLATE_ARGUMENTS.get(constant, ()))
+            if re.search(TELEMETRY_REGEX, sql) and constant not in FULL_SCANS_ALLOWED:
+                statements.append(pytest.param(sql, id=constant))
+    return statements
+
+def get_full_scans(conn, sql: str, parameters: tuple = None) -> list[str]:
+    """runs EXPLAIN QUERY PLAN and returns the scans of telemetry tables.
+    Without parameters every ? is bound to None.
+    """
+    if parameters is None:
+        parameters = (None,) * sql.count('?')
+    plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}', parameters).fetchall()
+    return [row[3] for row in plan if re.match(FULL_SCAN_REGEX, row[3])]
+
+@pytest.fixture(scope='module', name='plan_conn')
+def fixture_plan_conn(tmp_path_factory):
+    """empty database with the current schema,
+    with the indexes on ts if EPOCH_TIMESTAMPS is set, like main.main creates it.
+    """
+    conn = db.connect(str(tmp_path_factory.mktemp('query_plans') / 'plans.db'))
+    conn.execute('SELECT InitSpatialMetaData(1);')
+    for create_sql in SCHEMA:
+        conn.executescript(create_sql)
+    epoch_timestamps.set_epoch_indexes(conn, epoch_timestamps.EPOCH_TIMESTAMPS)
+    conn.commit()
+    yield conn
+    conn.close()
+
+@pytest.mark.parametrize('sql', collect_statements())
+def test_sql_constants(plan_conn, sql):
+    """no SQL constant scans a whole telemetry table.
+    """
+    assert get_full_scans(plan_conn, sql) == []
+
+def test_hot_queries(plan_conn):
+    """the queries built for the pages of updates, routes, events and incidents use the indexes.
+    """
+    now = datetime.datetime.utcnow()
+    key = ('2023-01-01 00:00:00', 1)
+
+    # pages of the updates and routes.
+    for filters in ((None, 1, None, None, None, None, key),
+                    (None, 1, None, 1, now, now, key),
+                    (None, 1, 1, None, now, None, None)):
+        sql, parameters = drone_updates_table.span_partitions(*filters)
+        sql = f'{sql}\nORDER BY {drone_updates_table.ORDER_BY_PAGE};'
+        assert get_full_scans(plan_conn, sql, (*parameters, 10)) == [], sql
+
+    # pages of the events.
+    sql_arr, parameters = drone_updates_table.gernerate_drone_sql(None, 1, None, 1, now, None,
+                                                                  'drone_event', key)
+    sql = db.add_where_clause(drone_events_table.GET_ENTRY, sql_arr)
+    sql = sql.format(drone_events_table.LIMIT_CLAUSE)
+    assert get_full_scans(plan_conn, sql, (*parameters, 10)) == [], sql
+
+    # pages of the incidents.
+    sql = incidents.GET_INCIDENT.format('WHERE ' + db.create_keyset_clause(
+        epoch_timestamps.TIMESTAMP_COLUMN, 'id'))
+    assert get_full_scans(plan_conn, sql, (*key, 10)) == [], sql
@@ -0,0 +1,130 @@
+"""tests of the tile grid and the tile cache"""
+import numpy
+import pytest
+from database import vector_tiles
+from database.vector_tiles import (MERCATOR_MAX,
+                                   TileCache,
+                                   get_tile_bounds,
+                                   get_tile_of_coordinate,
+                                   is_valid_tile,
+                                   to_lonlat,
+                                   to_mercator)
+
+
+def test_tile_bounds():
+    """the tiles of a zoom level cover the mercator square and contain their coordinates."""
+    assert get_tile_bounds(0, 0, 0) == (-MERCATOR_MAX, -MERCATOR_MAX, MERCATOR_MAX, MERCATOR_MAX)
+    assert get_tile_bounds(1, 0, 0) == (-MERCATOR_MAX, 0.0, 0.0, MERCATOR_MAX)
+    assert get_tile_bounds(1, 1, 1) == (0.0, -MERCATOR_MAX, MERCATOR_MAX, 0.0)
+
+    assert is_valid_tile(0, 0, 0)
+    assert is_valid_tile(10, 1023, 1023)
+    assert not is_valid_tile(10, 1024, 0)
+    assert not is_valid_tile(1, 2, 0)
+    assert not is_valid_tile(-1, 0, 0)
+    assert not is_valid_tile(vector_tiles.MAX_ZOOM + 1, 0, 0)
+
+    lon, lat = 12.68895149, 52.07454738
+    for z in (0, 5, 10, 18):
+        x, y = get_tile_of_coordinate(lon, lat, z)
+        min_x, min_y, max_x, max_y = get_tile_bounds(z, x, y)
+        point_x, point_y = to_mercator(numpy.array([[lon, lat]]))[0]
+        assert min_x <= point_x <= max_x and min_y <= point_y <= max_y
+    assert get_tile_of_coordinate(lon, lat, 10) == (548, 337)
+
+    # coordinates outside of the mercator square are clamped to the border tiles.
+    assert get_tile_of_coordinate(180, 89.9, 3) == (7, 0)
+    assert get_tile_of_coordinate(-180, -89.9, 3) == (0, 7)
+    assert to_lonlat(*to_mercator(numpy.array([[lon, lat]]))[0]) == pytest.approx((lon, lat))
+
+
+class TileData:
+    """replaces the stamp and the tiles of the organizations, counts the built tiles."""
+
+    def __init__(self):
+        self.stamps = {}
+        self.built = []
+        self.queries = 0
+
+    def get_tile_stamp(self, orga_id):
+        """the stamp of the organization, None like a failed query if it isnt set."""
+        self.queries += 1
+        return self.stamps.get(orga_id)
+
+    def build_tile(self, orga_id, z, x, y, _detail):
+        """a tile with the stamp it was built with."""
+        self.built.append((orga_id, z, x, y))
+        return repr((orga_id, z, x, y, self.stamps.get(orga_id))).encode()
+
+
+@pytest.fixture(name='tile_data')
+def fixture_tile_data(monkeypatch):
+    """replaces get_tile_stamp and build_tile with a TileData."""
+    tile_data = TileData()
+    monkeypatch.setattr(vector_tiles, 'get_tile_stamp', tile_data.get_tile_stamp)
+    monkeypatch.setattr(vector_tiles, 'build_tile', tile_data.build_tile)
+    return tile_data
+
+def test_tile_cache(tile_data):
+    """tiles are rebuilt when the stamp of their organization changes."""
+    cache = TileCache(size=10, max_age=60, stamp_age=0)
+    tile_data.stamps = {1: ('a',), 2: ('b',)}
+    tile = cache.get_tile(1, 10, 548, 335)
+    assert cache.get_tile(1, 10, 548, 335) == tile
+    cache.get_tile(2, 10, 548, 335)
+    assert len(tile_data.built) == 2
+
+    # ingest in organization 2 doesnt invalidate the tiles of organization 1.
+    tile_data.stamps[2] = ('c',)
+    assert cache.get_tile(1, 10, 548, 335) == tile
+    assert cache.get_tile(2, 10, 548, 335) != tile
+    assert len(tile_data.built) == 3
+
+    tile_data.stamps[1] = ('d',)
+    assert cache.get_tile(1, 10, 548, 335) != tile
+    assert len(tile_data.built) == 4
+
+    cache.clear()
+    cache.get_tile(1, 10, 548, 335)
+    assert len(tile_data.built) == 5
+
+def test_tile_cache_limits(tile_data):
+    """the cache is bounded, tiles expire and arent cached if the stamp query failed."""
+    tile_data.stamps = {1: ('a',)}
+    cache = TileCache(size=2, max_age=60, stamp_age=0)
+    for x in range(3):
+        cache.get_tile(1, 10, x, 0)
+    # the least recently used tile was dropped.
+    cache.get_tile(1, 10, 2, 0)
+    cache.get_tile(1, 10, 0, 0)
+    assert tile_data.built == [(1, 10, 0, 0), (1, 10, 1, 0), (1, 10, 2, 0), (1, 10, 0, 0)]
+
+    cache.max_age = 0
+    cache.get_tile(1, 10, 0, 0)
+    assert len(tile_data.built) == 5
+
+    cache = TileCache(size=2, max_age=60, stamp_age=0)
+    cache.get_tile(3, 10, 0, 0)
+    cache.get_tile(3, 10, 0, 0)
+    assert tile_data.built[-2:] == [(3, 10, 0, 0), (3, 10, 0, 0)]
+
+def test_tile_stamp_reuse(tile_data):
+    """the stamp of an organization is queried once per stamp_age, failed queries arent reused."""
+    tile_data.stamps = {1: ('a',)}
+    cache = TileCache(size=10, max_age=60, stamp_age=60)
+    for x in range(5):
+        cache.get_tile(1, 10, x, 0)
+    assert tile_data.queries == 1
+
+    # a change is only seen after stamp_age.
+    tile_data.stamps[1] = ('b',)
+    tile = cache.get_tile(1, 10, 0, 0)
+    assert len(tile_data.built) == 5
+    cache.stamp_age = 0
+    assert cache.get_tile(1, 10, 0, 0) != tile
+    assert len(tile_data.built) == 6
+
+    cache.stamp_age = 60
+    cache.get_tile(2, 10, 0, 0)
+    cache.get_tile(2, 10, 0, 0)
+    assert tile_data.queries == 4